@@ -119,52 +119,10 @@ class SSHHighState(salt.state.BaseHighState):
         return ret
 
 
-def lowstate_file_refs(chunks, extras=''):
-    '''
-    Create a list of file ref objects to reconcile
-    '''
-    refs = {}
-    for chunk in chunks:
-        if not isinstance(chunk, dict):
-            continue
-        saltenv = 'base'
-        crefs = []
-        for state in chunk:
-            if state == '__env__':
-                saltenv = chunk[state]
-            elif state.startswith('__'):
-                continue
-            crefs.extend(salt_refs(chunk[state]))
-        if saltenv not in refs:
-            refs[saltenv] = []
-        if crefs:
-            refs[saltenv].append(crefs)
-    if extras:
-        extra_refs = extras.split(',')
-        if extra_refs:
-            for env in refs:
-                for x in extra_refs:
-                    refs[env].append([x])
-    return refs
-
-
-def salt_refs(data, ret=None):
-    '''
-    Pull salt file references out of the states
-    '''
-    proto = 'salt://'
-    if ret is None:
-        ret = []
-    if isinstance(data, six.string_types):
-        if data.startswith(proto) and data not in ret:
-            ret.append(data)
-    if isinstance(data, list):
-        for comp in data:
-            salt_refs(comp, ret)
-    if isinstance(data, dict):
-        for comp in data:
-            salt_refs(data[comp], ret)
-    return ret
+# The file references of the states are gathered by salt.state, which also
+# prefetches them before running the states on the minions
+lowstate_file_refs = salt.state.lowstate_file_refs
+salt_refs = salt.state.salt_refs
 
 
 def prep_trans_tar(file_client, chunks, file_refs, pillar=None, id_=None, roster_grains=None):
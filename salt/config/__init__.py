@@ -182,9 +182,14 @@ VALID_OPTS = immutabletypes.freeze({
     # The caching mechanism to use for the PKI key store. Can substantially decrease master publish
     # times. Available types:
     # 'maint': Runs on a schedule as a part of the maintanence process.
+    # 'shared': The maintenance process publishes the key changes to the other processes.
     # '': Disable the key cache [default]
     'key_cache': six.string_types,
 
+    # How often, in seconds, the maintenance process checks the key directories
+    # for changes when key_cache is 'shared'
+    'key_cache_interval': float,
+
     # The user under which the daemon should run
     'user': six.string_types,
 
@@ -229,6 +234,10 @@ VALID_OPTS = immutabletypes.freeze({
     # The pool size of unix sockets, it is necessary to avoid blocking waiting for zeromq and tcp communications.
     'sock_pool_size': int,
 
+    # Keep many requests in flight on each zeromq connection to the master,
+    # over a DEALER socket, rather than one at a time over a REQ socket
+    'zmq_req_multiplex': bool,
+
     # Specifies how the file server should backup files, if enabled. The backups
     # live in the cache dir.
     'backup_mode': six.string_types,
@@ -363,6 +372,13 @@ VALID_OPTS = immutabletypes.freeze({
     # before trying to generate a new process.
     'process_count_max_sleep_secs': int,
 
+    # Number of pre-forked processes running jobs on the minion, instead of forking a process
+    # per job. Jobs are forked as usual when all of them are busy. 0 disables the pool.
+    'job_worker_pool_size': int,
+
+    # Number of jobs after which a job worker process is replaced by a fresh one
+    'job_worker_pool_max_jobs': int,
+
     # Whether or not the salt minion should run scheduled mine updates
     'mine_enabled': bool,
 
@@ -454,6 +470,14 @@ VALID_OPTS = immutabletypes.freeze({
     # Tell the loader to attempt to import *.zip archives
     'enable_zip_modules': bool,
 
+    # Persist the listings of the module directories in the cachedir, so that
+    # new loaders do not need to scan the directories which did not change
+    'loader_manifest': bool,
+
+    # Cache the outcomes of the __virtual__ functions of the modules, in memory
+    # and in the cachedir
+    'virtual_cache': bool,
+
     # Tell the client to show minions that have timed out
     'show_timeout': bool,
 
@@ -484,6 +508,18 @@ VALID_OPTS = immutabletypes.freeze({
     # Fire events as state chunks are processed by the state compiler
     'state_events': bool,
 
+    # The number of states run at once, in their own processes, when their requisites are met
+    'state_concurrency': int,
+
+    # Reuse the compiled highstate until the rendered SLS files, top matches, pillar or grains change
+    'state_compile_cache': bool,
+
+    # The number of threads fetching and rendering the SLS files of the highstate
+    'state_render_workers': int,
+
+    # The number of threads downloading the salt:// files referenced by the states before running them
+    'state_prefetch_workers': int,
+
     # The number of seconds a minion should wait before retry when attempting authentication
     'acceptance_wait_time': float,
 
@@ -546,6 +582,13 @@ VALID_OPTS = immutabletypes.freeze({
     'return_retry_timer': int,
     'return_retry_timer_max': int,
 
+    # The number of seconds the minion waits for the returns of other jobs to
+    # send them to the master together. 0 sends each return on its own.
+    'return_batch_window': float,
+
+    # The maximum number of returns sent in one batch
+    'return_batch_size': int,
+
     # Specify one or more returners in which all events will be sent to. Requires that the returners
     # in question have an event_return(event) function!
     'event_return': (list, six.string_types),
@@ -604,6 +647,15 @@ VALID_OPTS = immutabletypes.freeze({
     # http://api.zeromq.org/3-2:zmq-setsockopt
     'pub_hwm': int,
 
+    # The number of publishes, and of bytes of publishes, the TCP publisher
+    # queues for a minion which doesn't read them fast enough, 0 for no limit
+    'tcp_pub_client_hwm': int,
+    'tcp_pub_client_hwm_bytes': int,
+
+    # What the TCP publisher does when a minion reaches its high water marks:
+    # drop_oldest, disconnect or coalesce
+    'tcp_pub_client_hwm_policy': six.string_types,
+
     # IPC buffer size
     # Refs https://github.com/saltstack/salt/issues/34215
     'ipc_write_buffer': int,
@@ -621,6 +673,18 @@ VALID_OPTS = immutabletypes.freeze({
     # the number of connected minions increases.
     'worker_threads': int,
 
+    # The maximum number of MWorker processes, when more than worker_threads.
+    # The master then starts and stops workers between the two with the load,
+    # checking it every worker_threads_interval seconds.
+    'worker_threads_max': int,
+    'worker_threads_interval': int,
+
+    # The number of MWorker processes dedicated to the auth, return, pillar and
+    # file requests of the minions, by lane, and the number of requests queued
+    # for the workers of a lane. Only supported by the zeromq transport.
+    'worker_lanes': dict,
+    'worker_lanes_hwm': int,
+
     # The port for the master to listen to returns on. The minion needs to connect to this port
     # to send returns.
     'ret_port': int,
@@ -864,6 +928,10 @@ VALID_OPTS = immutabletypes.freeze({
     # reply from executions.
     'minion_data_cache': bool,
 
+    # Maintain an inverted index of the grains and pillar in the minion data cache, used to
+    # resolve grain and pillar targets without fetching the cached data of every minion.
+    'minion_data_index': bool,
+
     # The number of seconds between AES key rotations on the master
     'publish_session': int,
 
@@ -979,6 +1047,13 @@ VALID_OPTS = immutabletypes.freeze({
     # The size of key that should be generated when creating new keys
     'keysize': int,
 
+    # The number of minion public keys each master worker keeps loaded
+    'minion_pub_cache_size': int,
+
+    # Let the minions encrypt their requests with AES-GCM instead of AES-CBC
+    # and HMAC-SHA256
+    'crypticle_aead': bool,
+
     # The transport system for this daemon. (i.e. zeromq, tcp, detect, etc)
     'transport': six.string_types,
 
@@ -1044,6 +1119,11 @@ VALID_OPTS = immutabletypes.freeze({
     # implications in large setups.
     'max_minions': int,
 
+    # The number of authentication requests a second the master handles, after
+    # a burst of as many. The minions signing in over the limit are told when
+    # to retry. 0 is unlimited.
+    'auth_rate_limit': float,
+
 
     'username': (type(None), six.string_types),
     'password': (type(None), six.string_types),
@@ -1258,6 +1338,7 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'conf_file': os.path.join(salt.syspaths.CONFIG_DIR, 'minion'),
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'minion'),
     'sock_pool_size': 1,
+    'zmq_req_multiplex': True,
     'backup_mode': '',
     'renderer': 'jinja|yaml',
     'renderer_whitelist': [],
@@ -1384,6 +1465,8 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'multiprocessing': True,
     'process_count_max': -1,
     'process_count_max_sleep_secs': 10,
+    'job_worker_pool_size': 0,
+    'job_worker_pool_max_jobs': 100,
     'mine_enabled': True,
     'mine_return_job': False,
     'mine_interval': 60,
@@ -1415,12 +1498,18 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'cython_enable': False,
     'enable_gpu_grains': True,
     'enable_zip_modules': False,
+    'loader_manifest': False,
+    'virtual_cache': False,
     'state_verbose': True,
     'state_output': 'full',
     'state_output_diff': False,
     'state_auto_order': True,
     'state_events': False,
     'state_aggregate': False,
+    'state_concurrency': 0,
+    'state_compile_cache': False,
+    'state_render_workers': 0,
+    'state_prefetch_workers': 0,
     'snapper_states': False,
     'snapper_states_config': 'root',
     'acceptance_wait_time': 10,
@@ -1441,6 +1530,8 @@ DEFAULT_MINION_OPTS = immutabletypes.freeze({
     'recon_randomize': True,
     'return_retry_timer': 5,
     'return_retry_timer_max': 10,
+    'return_batch_window': 0,
+    'return_batch_size': 100,
     'random_reauth_delay': 10,
     'winrepo_source_dir': 'salt://win/repo-ng/',
     'winrepo_dir': os.path.join(salt.syspaths.BASE_FILE_ROOTS_DIR, 'win', 'repo'),
@@ -1530,11 +1621,19 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'publish_port': 4505,
     'zmq_backlog': 1000,
     'pub_hwm': 1000,
+    'tcp_pub_client_hwm': 1000,
+    'tcp_pub_client_hwm_bytes': 67108864,
+    'tcp_pub_client_hwm_policy': 'drop_oldest',
     'auth_mode': 1,
     'user': _MASTER_USER,
     'worker_threads': 5,
+    'worker_threads_max': 0,
+    'worker_threads_interval': 5,
+    'worker_lanes': {},
+    'worker_lanes_hwm': 1000,
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'master'),
     'sock_pool_size': 1,
+    'zmq_req_multiplex': True,
     'ret_port': 4506,
     'timeout': 5,
     'keep_jobs': 24,
@@ -1542,6 +1641,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'root_dir': salt.syspaths.ROOT_DIR,
     'pki_dir': os.path.join(salt.syspaths.CONFIG_DIR, 'pki', 'master'),
     'key_cache': '',
+    'key_cache_interval': 1.0,
     'cachedir': os.path.join(salt.syspaths.CACHE_DIR, 'master'),
     'file_roots': {
         'base': [salt.syspaths.BASE_FILE_ROOTS_DIR,
@@ -1711,6 +1811,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'master_job_cache': 'local_cache',
     'job_cache_store_endtime': False,
     'minion_data_cache': True,
+    'minion_data_index': False,
     'enforce_mine_cache': False,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipc_write_buffer': _DFLT_IPC_WBUFFER,
@@ -1762,6 +1863,8 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'ssh_use_home_key': False,
     'cython_enable': False,
     'enable_gpu_grains': False,
+    'loader_manifest': False,
+    'virtual_cache': False,
     # XXX: Remove 'key_logfile' support in 2014.1.0
     'key_logfile': os.path.join(salt.syspaths.LOGS_DIR, 'key'),
     'verify_env': True,
@@ -1794,6 +1897,8 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'tcp_keepalive_intvl': -1,
     'sign_pub_messages': True,
     'keysize': 2048,
+    'minion_pub_cache_size': 1024,
+    'crypticle_aead': False,
     'transport': 'zeromq',
     'gather_job_timeout': 10,
     'syndic_event_forward_timeout': 0.5,
@@ -1816,6 +1921,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'queue_dirs': [],
     'cli_summary': False,
     'max_minions': 0,
+    'auth_rate_limit': 0,
     'master_sign_key_name': 'master_sign',
     'master_sign_pubkey': False,
     'master_pubkey_signature': 'master_pubkey_signature',
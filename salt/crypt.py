@@ -25,7 +25,6 @@ import getpass
 import tornado.gen
 
 # Import third party libs
-from salt.ext.six.moves import zip  # pylint: disable=import-error,redefined-builtin
 from salt.ext import six
 
 try:
@@ -57,6 +56,17 @@ if not HAS_M2 and not HAS_CDOME:
         # No need for crypt in local mode
         pass
 
+# The AEAD mode of Crypticle needs the GCM mode of PyCryptodome, which is also
+# used along with M2Crypto
+try:
+    from Cryptodome.Cipher import AES as AEAD_AES
+except ImportError:
+    try:
+        from Crypto.Cipher import AES as AEAD_AES
+    except ImportError:
+        AEAD_AES = None
+HAS_AEAD = AEAD_AES is not None and hasattr(AEAD_AES, 'MODE_GCM')
+
 # Import salt libs
 import salt.defaults.exitcodes
 import salt.payload
@@ -220,8 +230,13 @@ def get_rsa_pub_key(path):
 def sign_message(privkey_path, message, passphrase=None):
     '''
     Use Crypto.Signature.PKCS1_v1_5 to sign a message. Returns the signature.
+
+    privkey_path can also be a private key already loaded by get_rsa_key.
     '''
-    key = get_rsa_key(privkey_path, passphrase)
+    if isinstance(privkey_path, six.string_types):
+        key = get_rsa_key(privkey_path, passphrase)
+    else:
+        key = privkey_path
     log.debug('salt.crypt.sign_message: Signing message.')
     if HAS_M2:
         md = EVP.MessageDigest('sha1')
@@ -237,9 +252,14 @@ def verify_signature(pubkey_path, message, signature):
     '''
     Use Crypto.Signature.PKCS1_v1_5 to verify the signature on a message.
     Returns True for valid signature.
+
+    pubkey_path can also be a public key already loaded by get_rsa_pub_key.
     '''
-    log.debug('salt.crypt.verify_signature: Loading public key')
-    pubkey = get_rsa_pub_key(pubkey_path)
+    if isinstance(pubkey_path, six.string_types):
+        log.debug('salt.crypt.verify_signature: Loading public key')
+        pubkey = get_rsa_pub_key(pubkey_path)
+    else:
+        pubkey = pubkey_path
     log.debug('salt.crypt.verify_signature: Verifying signature')
     if HAS_M2:
         md = EVP.MessageDigest('sha1')
@@ -542,6 +562,13 @@ class AsyncAuth(object):
     def crypticle(self):
         return self._crypticle
 
+    @property
+    def aead(self):
+        '''
+        Whether the requests to the master are encrypted with AES-GCM
+        '''
+        return getattr(self, '_creds', {}).get('aead', False)
+
     @property
     def authenticated(self):
         return hasattr(self, '_authenticate_future') and \
@@ -606,6 +633,11 @@ class AsyncAuth(object):
                 except SaltClientError as exc:
                     error = exc
                     break
+                if creds == 'busy':
+                    wait = self.busy_wait()
+                    log.info('The master is busy, waiting %s seconds before retry.', wait)
+                    yield tornado.gen.sleep(wait)
+                    continue
                 if creds == 'retry':
                     if self.opts.get('detect_mode') is True:
                         error = SaltClientError('Detect mode is on')
@@ -746,6 +778,10 @@ class AsyncAuth(object):
                 # has the master returned that its maxed out with minions?
                 elif payload['load']['ret'] == 'full':
                     raise tornado.gen.Return('full')
+                # is the master turning the sign ins away for now?
+                elif payload['load']['ret'] == 'busy':
+                    self._retry_after = payload['load'].get('retry_after')
+                    raise tornado.gen.Return('busy')
                 else:
                     log.error(
                         'The Salt Master has cached the public key for this '
@@ -776,8 +812,24 @@ class AsyncAuth(object):
                 if salt.utils.crypt.pem_finger(m_pub_fn, sum_type=self.opts['hash_type']) != self.opts['master_finger']:
                     self._finger_fail(self.opts['master_finger'], m_pub_fn)
         auth['publish_port'] = payload['publish_port']
+        auth['aead'] = HAS_AEAD and payload.get('aead') == Crypticle.AEAD
+        auth['session'] = self.decrypt_session(payload)
         raise tornado.gen.Return(auth)
 
+    def busy_wait(self):
+        '''
+        Return the number of seconds to wait before signing in again, after
+        the master turned the sign in away.
+
+        The master tells each minion it turns away when to retry, spreading
+        them over time. The wait is drawn at random up to half again as long,
+        so that the minions told the same time don't sign in together again.
+        '''
+        retry_after = getattr(self, '_retry_after', None)
+        if not retry_after:
+            retry_after = self.opts['acceptance_wait_time']
+        return retry_after * random.uniform(1, 1.5)
+
     def get_keys(self):
         '''
         Return keypair object for the minion.
@@ -839,8 +891,40 @@ class AsyncAuth(object):
             pass
         with salt.utils.files.fopen(self.pub_path) as f:
             payload['pub'] = f.read()
+        # Ask for a session key for the private replies, see decrypt_session
+        payload['session'] = True
         return payload
 
+    def decrypt_session(self, payload):
+        '''
+        Return the session key the master sent to encrypt its private replies
+        to this minion, such as the pillar data, or None if the master sent
+        none or its signature did not verify.
+
+        :param dict payload: The auth reply of the master
+        '''
+        if 'session' not in payload or 'session_sig' not in payload:
+            return None
+        try:
+            key = self.get_keys()
+            if HAS_M2:
+                session = key.private_decrypt(payload['session'], RSA.pkcs1_oaep_padding)
+            else:
+                session = PKCS1_OAEP.new(key).decrypt(payload['session'])
+            mkey = get_rsa_pub_key(os.path.join(self.opts['pki_dir'], self.mpub))
+            if HAS_M2:
+                m_digest = public_decrypt(mkey, payload['session_sig'])
+            else:
+                m_digest = public_decrypt(mkey.publickey(), payload['session_sig'])
+        except Exception as exc:
+            log.warning('Unable to decrypt the session key of the master: %s', exc)
+            return None
+        digest = salt.utils.stringutils.to_bytes(hashlib.sha256(session).hexdigest())
+        if m_digest != digest:
+            log.warning('The signature of the session key of the master did not verify')
+            return None
+        return salt.utils.stringutils.to_str(session)
+
     def decrypt_aes(self, payload, master_pub=True):
         '''
         This function is used to decrypt the AES seed phrase returned from
@@ -1208,6 +1292,13 @@ class SAuth(AsyncAuth):
             self.authenticate()
         return self._crypticle
 
+    @property
+    def aead(self):
+        '''
+        Whether the requests to the master are encrypted with AES-GCM
+        '''
+        return self.creds.get('aead', False)
+
     def authenticate(self, _=None):  # TODO: remove unused var
         '''
         Authenticate with the master, this method breaks the functional
@@ -1226,6 +1317,11 @@ class SAuth(AsyncAuth):
         try:
             while True:
                 creds = self.sign_in(channel=channel)
+                if creds == 'busy':
+                    wait = self.busy_wait()
+                    log.info('The master is busy, waiting %s seconds before retry.', wait)
+                    time.sleep(wait)
+                    continue
                 if creds == 'retry':
                     if self.opts.get('caller'):
                         # We have a list of masters, so we should break
@@ -1328,6 +1424,10 @@ class SAuth(AsyncAuth):
                 # has the master returned that its maxed out with minions?
                 elif payload['load']['ret'] == 'full':
                     return 'full'
+                # is the master turning the sign ins away for now?
+                elif payload['load']['ret'] == 'busy':
+                    self._retry_after = payload['load'].get('retry_after')
+                    return 'busy'
                 else:
                     log.error(
                         'The Salt Master has cached the public key for this '
@@ -1361,6 +1461,8 @@ class SAuth(AsyncAuth):
                 if salt.utils.crypt.pem_finger(m_pub_fn, sum_type=self.opts['hash_type']) != self.opts['master_finger']:
                     self._finger_fail(self.opts['master_finger'], m_pub_fn)
         auth['publish_port'] = payload['publish_port']
+        auth['aead'] = HAS_AEAD and payload.get('aead') == Crypticle.AEAD
+        auth['session'] = self.decrypt_session(payload)
         return auth
 
 
@@ -1370,11 +1472,21 @@ class Crypticle(object):
 
     Encryption algorithm: AES-CBC
     Signing algorithm: HMAC-SHA256
+
+    With ``aead=True``, the messages are encrypted and authenticated in one
+    pass with AES-GCM instead. The master advertises the AEAD mode when
+    minions authenticate, and the minions which support it flag their
+    requests with ``'aead': 'aes-gcm'`` so that the master replies in the
+    same mode. Publications stay in AES-CBC, they are read by all the minions.
     '''
 
     PICKLE_PAD = b'pickle::'
     AES_BLOCK_SIZE = 16
     SIG_SIZE = hashlib.sha256().digest_size
+    # The name of the AEAD mode in the auth replies and the request payloads
+    AEAD = 'aes-gcm'
+    NONCE_SIZE = 12
+    TAG_SIZE = 16
 
     def __init__(self, opts, key_string, key_size=192):
         self.key_string = key_string
@@ -1391,6 +1503,13 @@ class Crypticle(object):
         # Return data must be a base64-encoded string, not a unicode type
         return b64key.replace('\n', '')
 
+    @classmethod
+    def generate_key_size(cls, key_size=192):
+        '''
+        Return the number of bytes of the keys of generate_key_string
+        '''
+        return key_size // 8 + cls.SIG_SIZE
+
     @classmethod
     def extract_keys(cls, key_string, key_size):
         if six.PY2:
@@ -1400,77 +1519,98 @@ class Crypticle(object):
         assert len(key) == key_size / 8 + cls.SIG_SIZE, 'invalid key'
         return key[:-cls.SIG_SIZE], key[-cls.SIG_SIZE:]
 
-    def encrypt(self, data):
+    def encrypt(self, data, aead=False):
         '''
-        encrypt data with AES-CBC and sign it with HMAC-SHA256
+        encrypt data with AES-CBC and sign it with HMAC-SHA256, or encrypt
+        and sign it with AES-GCM if aead is True
         '''
+        if aead:
+            return self._encrypt_aead(data)
         aes_key, hmac_key = self.keys
-        pad = self.AES_BLOCK_SIZE - len(data) % self.AES_BLOCK_SIZE
-        if six.PY2:
-            data = data + pad * chr(pad)
-        else:
-            data = data + salt.utils.stringutils.to_bytes(pad * chr(pad))
         iv_bytes = os.urandom(self.AES_BLOCK_SIZE)
         if HAS_M2:
-            cypher = EVP.Cipher(alg='aes_192_cbc', key=aes_key, iv=iv_bytes, op=1, padding=False)
+            # M2Crypto pads the data itself, the same way
+            cypher = EVP.Cipher(alg='aes_192_cbc', key=aes_key, iv=iv_bytes, op=1, padding=True)
             encr = cypher.update(data)
             encr += cypher.final()
         else:
+            pad = self.AES_BLOCK_SIZE - len(data) % self.AES_BLOCK_SIZE
+            if six.PY2:
+                data = data + pad * chr(pad)
+            else:
+                data = data + salt.utils.stringutils.to_bytes(pad * chr(pad))
             cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
             encr = cypher.encrypt(data)
         data = iv_bytes + encr
         sig = hmac.new(hmac_key, data, hashlib.sha256).digest()
         return data + sig
 
-    def decrypt(self, data):
+    def _encrypt_aead(self, data):
+        '''
+        encrypt and sign data with AES-GCM
         '''
-        verify HMAC-SHA256 signature and decrypt data with AES-CBC
+        if not HAS_AEAD:
+            raise AuthenticationError('AES-GCM is not available')
+        nonce = os.urandom(self.NONCE_SIZE)
+        cypher = AEAD_AES.new(self.keys[0], AEAD_AES.MODE_GCM, nonce=nonce)
+        encr, tag = cypher.encrypt_and_digest(data)
+        return b''.join((nonce, encr, tag))
+
+    def decrypt(self, data, aead=False):
         '''
+        verify HMAC-SHA256 signature and decrypt data with AES-CBC, or verify
+        and decrypt data with AES-GCM if aead is True
+        '''
+        if six.PY3 and not isinstance(data, bytes):
+            data = salt.utils.stringutils.to_bytes(data)
+        if aead:
+            return self._decrypt_aead(data)
         aes_key, hmac_key = self.keys
         sig = data[-self.SIG_SIZE:]
         data = data[:-self.SIG_SIZE]
-        if six.PY3 and not isinstance(data, bytes):
-            data = salt.utils.stringutils.to_bytes(data)
         mac_bytes = hmac.new(hmac_key, data, hashlib.sha256).digest()
-        if len(mac_bytes) != len(sig):
-            log.debug('Failed to authenticate message')
-            raise AuthenticationError('message authentication failed')
-        result = 0
-
-        if six.PY2:
-            for zipped_x, zipped_y in zip(mac_bytes, sig):
-                result |= ord(zipped_x) ^ ord(zipped_y)
-        else:
-            for zipped_x, zipped_y in zip(mac_bytes, sig):
-                result |= zipped_x ^ zipped_y
-        if result != 0:
+        if not hmac.compare_digest(mac_bytes, sig):
             log.debug('Failed to authenticate message')
             raise AuthenticationError('message authentication failed')
         iv_bytes = data[:self.AES_BLOCK_SIZE]
         data = data[self.AES_BLOCK_SIZE:]
         if HAS_M2:
-            cypher = EVP.Cipher(alg='aes_192_cbc', key=aes_key, iv=iv_bytes, op=0, padding=False)
+            cypher = EVP.Cipher(alg='aes_192_cbc', key=aes_key, iv=iv_bytes, op=0, padding=True)
             encr = cypher.update(data)
-            data = encr + cypher.final()
-        else:
-            cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
-            data = cypher.decrypt(data)
+            return encr + cypher.final()
+        cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
+        data = cypher.decrypt(data)
         if six.PY2:
             return data[:-ord(data[-1])]
         else:
             return data[:-data[-1]]
 
-    def dumps(self, obj):
+    def _decrypt_aead(self, data):
+        '''
+        verify and decrypt data with AES-GCM
+        '''
+        if not HAS_AEAD or len(data) < self.NONCE_SIZE + self.TAG_SIZE:
+            log.debug('Failed to authenticate message')
+            raise AuthenticationError('message authentication failed')
+        cypher = AEAD_AES.new(self.keys[0], AEAD_AES.MODE_GCM, nonce=data[:self.NONCE_SIZE])
+        try:
+            return cypher.decrypt_and_verify(data[self.NONCE_SIZE:-self.TAG_SIZE],
+                                             data[-self.TAG_SIZE:])
+        except ValueError:
+            log.debug('Failed to authenticate message')
+            raise AuthenticationError('message authentication failed')
+
+    def dumps(self, obj, aead=False):
         '''
         Serialize and encrypt a python object
         '''
-        return self.encrypt(self.PICKLE_PAD + self.serial.dumps(obj))
+        return self.encrypt(self.PICKLE_PAD + self.serial.dumps(obj), aead=aead)
 
-    def loads(self, data, raw=False):
+    def loads(self, data, raw=False, aead=False):
         '''
         Decrypt and un-serialize a python object
         '''
-        data = self.decrypt(data)
+        data = self.decrypt(data, aead=aead)
         # simple integrity check to verify that we got meaningful data
         if not data.startswith(self.PICKLE_PAD):
             return {}
@@ -474,6 +474,7 @@ class RemoteFuncs(object):
         self._serve_file = fs_.serve_file
         self._file_find = fs_._find_file
         self._file_hash = fs_.file_hash
+        self._file_hashes = fs_.file_hashes
         self._file_list = fs_.file_list
         self._file_list_emptydirs = fs_.file_list_emptydirs
         self._dir_list = fs_.dir_list
@@ -784,9 +785,12 @@ class RemoteFuncs(object):
                 pillar_override=load.get('pillar_override', {}))
         data = pillar.compile_pillar()
         if self.opts.get('minion_data_cache', False):
+            minion_data = {'grains': load['grains'], 'pillar': data}
             self.cache.store('minions/{0}'.format(load['id']),
                              'data',
-                             {'grains': load['grains'], 'pillar': data})
+                             minion_data)
+            if self.ckminions.index is not None:
+                self.ckminions.index.update(load['id'], minion_data)
             if self.opts.get('minion_data_cache_events') is True:
                 self.event.fire_event({'comment': 'Minion data cache refresh'}, salt.utils.event.tagify(load['id'], 'refresh', 'minion'))
         return data
@@ -204,6 +204,18 @@ class Client(object):
             ret.append(self.cache_file(path, saltenv, cachedir=cachedir))
         return ret
 
+    def hash_files(self, paths, saltenv='base'):
+        '''
+        Return the hashes of a list of files, by path. The files which are not
+        found are left out.
+        '''
+        ret = {}
+        for path in paths:
+            hsum = self.hash_file(path, saltenv)
+            if hsum:
+                ret[path] = hsum
+        return ret
+
     def cache_master(self, saltenv='base', cachedir=None):
         '''
         Download and cache all files on a master in a specified environment
@@ -1332,6 +1344,37 @@ class RemoteClient(Client):
         '''
         return self.__hash_and_stat_file(path, saltenv)
 
+    def hash_files(self, paths, saltenv='base'):
+        '''
+        Return the hashes of a list of files, by path, getting those on the
+        salt master file server in a single request. The files which are not
+        found are left out.
+        '''
+        ret = {}
+        remote = {}
+        for path in paths:
+            try:
+                remote[self._check_proto(path)] = path
+            except MinionError:
+                # Local file path
+                hsum = self.hash_file(path, saltenv)
+                if hsum:
+                    ret[path] = hsum
+        if not remote:
+            return ret
+        load = {'paths': list(remote),
+                'saltenv': saltenv,
+                'cmd': '_file_hashes'}
+        hashes = self.channel.send(load)
+        if not hashes or not isinstance(hashes, dict):
+            # None found, or a master without _file_hashes
+            ret.update(super(RemoteClient, self).hash_files(list(remote.values()), saltenv))
+            return ret
+        for path, hsum in six.iteritems(hashes):
+            if path in remote and hsum:
+                ret[remote[path]] = hsum
+        return ret
+
     def hash_and_stat_file(self, path, saltenv='base'):
         '''
         The same as hash_file, but also return the file's mode, or None if no
@@ -691,6 +691,24 @@ class Fileserver(object):
         except (IndexError, TypeError):
             return '', None
 
+    def file_hashes(self, load):
+        '''
+        Return the hashes of the given files, by path. The files which are not
+        found are left out.
+        '''
+        if 'env' in load:
+            # "env" is not supported; Use "saltenv".
+            load.pop('env')
+
+        if 'paths' not in load or 'saltenv' not in load:
+            return {}
+        ret = {}
+        for path in load['paths']:
+            hsum = self.file_hash({'path': path, 'saltenv': load['saltenv']})
+            if hsum:
+                ret[path] = hsum
+        return ret
+
     def clear_file_list_cache(self, load):
         '''
         Deletes the file_lists cache files
@@ -26,6 +26,7 @@ import salt.utils.files
 import salt.utils.json
 import salt.utils.kinds
 import salt.utils.master
+import salt.utils.minions
 import salt.utils.sdb
 import salt.utils.stringutils
 import salt.utils.user
@@ -443,9 +444,13 @@ class Key(object):
             cache = salt.cache.factory(self.opts)
             clist = cache.list(self.ACC)
             if clist:
+                flushed = []
                 for minion in clist:
                     if minion not in minions and minion not in preserve_minions:
                         cache.flush('{0}/{1}'.format(self.ACC, minion))
+                        flushed.append(minion)
+                if flushed and salt.utils.minions.MinionDataIndex.enabled(self.opts):
+                    salt.utils.minions.MinionDataIndex(self.opts).remove(*flushed)
 
     def check_master(self):
         '''
@@ -16,6 +16,7 @@ import inspect
 import tempfile
 import threading
 import functools
+import hashlib
 import threading
 import traceback
 import types
@@ -25,13 +26,16 @@ from zipimport import zipimporter
 import salt.config
 import salt.defaults.events
 import salt.defaults.exitcodes
+import salt.payload
 import salt.syspaths
+import salt.utils.atomicfile
 import salt.utils.args
 import salt.utils.context
 import salt.utils.data
 import salt.utils.dictupdate
 import salt.utils.event
 import salt.utils.files
+import salt.utils.json
 import salt.utils.lazy
 import salt.utils.odict
 import salt.utils.platform
@@ -95,6 +99,64 @@ else:
 PY3_PRE_EXT = \
     re.compile(r'\.cpython-{0}{1}(\.opt-[1-9])?'.format(*sys.version_info[:2]))
 
+# Manifest of the module directories, see LazyLoader._module_dir_manifest.
+# It maps '<module dir>\n<scan signature>' to the modules found in the
+# directory, along with the modification times they were found at.
+_LOADER_MANIFEST = {}
+# The persisted manifests already merged into _LOADER_MANIFEST
+_LOADER_MANIFEST_FILES = set()
+# Directories modified less than this many seconds before being listed are
+# not added to the manifest, as a change in the same mtime tick would go
+# unnoticed
+LOADER_MANIFEST_RACY_DELAY = 2
+
+# Outcomes of the __virtual__ functions, see LazyLoader._virtual_cache_key
+_VIRTUAL_CACHE = {}
+# The persisted __virtual__ caches already merged into _VIRTUAL_CACHE
+_VIRTUAL_CACHE_FILES = set()
+
+STATIC_VIRTUALNAME_RE = re.compile(
+    br'''^__virtualname__\s*=\s*['"](\w+)['"]\s*$''', re.M)
+
+
+def _static_virtualname(path):
+    '''
+    Return the __virtualname__ of the module at path if it is assigned a
+    string literal, else None
+    '''
+    try:
+        with salt.utils.files.fopen(path, 'rb') as fp_:
+            match = STATIC_VIRTUALNAME_RE.search(fp_.read())
+    except (IOError, OSError):
+        return None
+    if match is None:
+        return None
+    return salt.utils.stringutils.to_unicode(match.group(1))
+
+
+def clear_virtual_cache(opts=None):
+    '''
+    Forget the cached outcomes of the __virtual__ functions, so that the next
+    loaders run them again. This is needed when the dependencies of the
+    modules may have changed, for instance after installing packages.
+    '''
+    _VIRTUAL_CACHE.clear()
+    if opts and opts.get('virtual_cache') and opts.get('cachedir'):
+        try:
+            os.remove(os.path.join(opts['cachedir'], 'virtual_cache.p'))
+        except OSError:
+            pass
+
+
+def _mtime(path):
+    '''
+    Return the modification time of path, or None if it does not exist
+    '''
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
 # Because on the cloud drivers we do `from salt.cloud.libcloudfuncs import *`
 # which simplifies code readability, it adds some unsupported functions into
 # the driver's module scope.
@@ -1392,7 +1454,138 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         # create mapping of filename (without suffix) to (path, suffix)
         # The files are added in order of priority, so order *must* be retained.
         self.file_mapping = salt.utils.odict.OrderedDict()
+        # mapping of module name to the __virtualname__ found in its source
+        self.static_virtualnames = {}
+
+        manifest_file = self._cache_file('loader_manifest', 'loader_manifest.p')
+        self._merge_cache_file(manifest_file, _LOADER_MANIFEST, _LOADER_MANIFEST_FILES)
 
+        # The __virtual__ functions mostly depend on the grains
+        self._virtual_cache_grains = None
+        self._virtual_cache_changes = {}
+        self._virtual_cache_file = self._cache_file('virtual_cache', 'virtual_cache.p')
+        if self.opts.get('virtual_cache'):
+            try:
+                self._virtual_cache_grains = hashlib.sha1(
+                    salt.utils.stringutils.to_bytes(
+                        salt.utils.json.dumps(self.opts.get('grains', {}),
+                                              sort_keys=True,
+                                              default=repr)
+                    )
+                ).hexdigest()
+            except (TypeError, ValueError) as exc:
+                log.debug('Not caching the __virtual__ outcomes of %s '
+                          'modules: %s', self.tag, exc)
+            else:
+                self._merge_cache_file(self._virtual_cache_file,
+                                       _VIRTUAL_CACHE,
+                                       _VIRTUAL_CACHE_FILES)
+        # The listing of a directory depends on the suffixes and optimization
+        # levels allowed
+        signature = repr((sys.version_info[:2],
+                          sorted(self.suffix_map),
+                          self.opts.get('optimization_order')))
+        changed = {}
+
+        for mod_dir in self.module_dirs:
+            try:
+                entry = self._module_dir_manifest(
+                    mod_dir,
+                    signature,
+                    manifest_file is not None,
+                    changed)
+            except OSError:
+                continue  # Next mod_dir
+
+            for f_noext, filename, ext, opt_index, virtualname in entry['modules']:
+                if f_noext in self.disabled:
+                    log.trace(
+                        'Skipping %s, it is disabled by configuration',
+                        filename
+                    )
+                    continue  # Next filename
+                fpath = os.path.join(mod_dir, filename)
+
+                try:
+                    curr_ext = self.file_mapping[f_noext][1]
+                    curr_opt_index = self.file_mapping[f_noext][2]
+                except KeyError:
+                    pass
+                else:
+                    if '' in (curr_ext, ext) and curr_ext != ext:
+                        log.error(
+                            'Module/package collision: \'%s\' and \'%s\'',
+                            fpath,
+                            self.file_mapping[f_noext][0]
+                        )
+
+                    if six.PY3 and ext == '.pyc' and curr_ext == '.pyc':
+                        # Check the optimization level
+                        if opt_index >= curr_opt_index:
+                            # Module name match, but a higher-priority
+                            # optimization level was already matched, skipping.
+                            continue
+                    elif not curr_ext or self.suffix_order.index(ext) >= self.suffix_order.index(curr_ext):
+                        # Match found but a higher-priorty match already
+                        # exists, so skip this.
+                        continue
+
+                # Made it this far - add it
+                self.file_mapping[f_noext] = (fpath, ext, opt_index)
+                self.static_virtualnames.pop(f_noext, None)
+                if virtualname:
+                    self.static_virtualnames[f_noext] = virtualname
+
+        if changed and manifest_file is not None:
+            # Merge our changes with the ones other processes made since we
+            # read the manifest
+            manifest = self._read_cache_file(manifest_file)
+            manifest.update(changed)
+            self._write_cache_file(manifest_file, manifest)
+
+        for smod in self.static_modules:
+            f_noext = smod.split('.')[-1]
+            self.file_mapping[f_noext] = (smod, '.o', 0)
+
+    def _module_dir_manifest(self, mod_dir, signature, virtualnames, changed):
+        '''
+        Return the manifest entry of mod_dir. The directory is only listed
+        again if it, its __pycache__ or one of its packages was modified since
+        the entry was made, and the new entries are added to changed.
+
+        If virtualnames is True, the __virtualname__ of the modules is read
+        from their source.
+        '''
+        key = '{0}\n{1}'.format(mod_dir, signature)
+        mtimes = [_mtime(mod_dir), _mtime(os.path.join(mod_dir, '__pycache__'))]
+        entry = _LOADER_MANIFEST.get(key)
+        if entry is not None \
+                and entry['mtimes'] == mtimes \
+                and (entry['virtualnames'] or not virtualnames) \
+                and all(_mtime(path) == mtime
+                        for path, mtime in six.iteritems(entry['packages'])):
+            return entry
+
+        modules, packages = self._scan_module_dir(mod_dir, virtualnames)
+        entry = {'mtimes': mtimes,
+                 'packages': packages,
+                 'modules': modules,
+                 'virtualnames': virtualnames}
+        newest = max([x for x in mtimes + list(packages.values()) if x is not None]
+                     or [0])
+        if time.time() - newest >= LOADER_MANIFEST_RACY_DELAY:
+            _LOADER_MANIFEST[key] = entry
+            changed[key] = entry
+        return entry
+
+    def _scan_module_dir(self, mod_dir, virtualnames):
+        '''
+        List the modules of mod_dir, in order of precedence, as (name,
+        filename, ext, opt_index, virtualname) tuples. Return them along with
+        the modification times of the packages, as adding or removing the
+        __init__ of a package doesn't change the modification time of
+        mod_dir.
+        '''
         opt_match = []
 
         def _replace_pre_ext(obj):
@@ -1405,119 +1598,198 @@ class LazyLoader(salt.utils.lazy.LazyDict):
             opt_match.append(obj)
             return ''
 
-        for mod_dir in self.module_dirs:
+        # Make sure we have a sorted listdir in order to have
+        # expectable override results
+        files = sorted(
+            x for x in os.listdir(mod_dir) if x != '__pycache__'
+        )
+        if six.PY3:
             try:
-                # Make sure we have a sorted listdir in order to have
-                # expectable override results
-                files = sorted(
-                    x for x in os.listdir(mod_dir) if x != '__pycache__'
-                )
+                pycache_files = [
+                    os.path.join('__pycache__', x) for x in
+                    sorted(os.listdir(os.path.join(mod_dir, '__pycache__')))
+                ]
             except OSError:
-                continue  # Next mod_dir
-            if six.PY3:
-                try:
-                    pycache_files = [
-                        os.path.join('__pycache__', x) for x in
-                        sorted(os.listdir(os.path.join(mod_dir, '__pycache__')))
-                    ]
-                except OSError:
-                    pass
-                else:
-                    files.extend(pycache_files)
-
-            for filename in files:
-                try:
-                    dirname, basename = os.path.split(filename)
-                    if basename.startswith('_'):
-                        # skip private modules
-                        # log messages omitted for obviousness
-                        continue  # Next filename
-                    f_noext, ext = os.path.splitext(basename)
-                    if six.PY3:
-                        f_noext = PY3_PRE_EXT.sub(_replace_pre_ext, f_noext)
-                        try:
-                            opt_level = int(
-                                opt_match.pop().group(1).rsplit('-', 1)[-1]
-                            )
-                        except (AttributeError, IndexError, ValueError):
-                            # No regex match or no optimization level matched
-                            opt_level = 0
-                        try:
-                            opt_index = self.opts['optimization_order'].index(opt_level)
-                        except KeyError:
-                            log.trace(
-                                'Disallowed optimization level %d for module '
-                                'name \'%s\', skipping. Add %d to the '
-                                '\'optimization_order\' config option if you '
-                                'do not want to ignore this optimization '
-                                'level.', opt_level, f_noext, opt_level
-                            )
-                            continue
-                    else:
-                        # Optimization level not reflected in filename on PY2
-                        opt_index = 0
+                pass
+            else:
+                files.extend(pycache_files)
 
-                    # make sure it is a suffix we support
-                    if ext not in self.suffix_map:
-                        continue  # Next filename
-                    if f_noext in self.disabled:
-                        log.trace(
-                            'Skipping %s, it is disabled by configuration',
-                            filename
+        modules = []
+        packages = {}
+        for filename in files:
+            try:
+                dirname, basename = os.path.split(filename)
+                if basename.startswith('_'):
+                    # skip private modules
+                    # log messages omitted for obviousness
+                    continue  # Next filename
+                f_noext, ext = os.path.splitext(basename)
+                if six.PY3:
+                    f_noext = PY3_PRE_EXT.sub(_replace_pre_ext, f_noext)
+                    try:
+                        opt_level = int(
+                            opt_match.pop().group(1).rsplit('-', 1)[-1]
                         )
-                        continue  # Next filename
-                    fpath = os.path.join(mod_dir, filename)
-                    # if its a directory, lets allow us to load that
-                    if ext == '':
-                        # is there something __init__?
-                        subfiles = os.listdir(fpath)
-                        for suffix in self.suffix_order:
-                            if '' == suffix:
-                                continue  # Next suffix (__init__ must have a suffix)
-                            init_file = '__init__{0}'.format(suffix)
-                            if init_file in subfiles:
-                                break
-                        else:
-                            continue  # Next filename
-
+                    except (AttributeError, IndexError, ValueError):
+                        # No regex match or no optimization level matched
+                        opt_level = 0
                     try:
-                        curr_ext = self.file_mapping[f_noext][1]
-                        curr_opt_index = self.file_mapping[f_noext][2]
+                        opt_index = self.opts['optimization_order'].index(opt_level)
                     except KeyError:
-                        pass
-                    else:
-                        if '' in (curr_ext, ext) and curr_ext != ext:
-                            log.error(
-                                'Module/package collision: \'%s\' and \'%s\'',
-                                fpath,
-                                self.file_mapping[f_noext][0]
-                            )
-
-                        if six.PY3 and ext == '.pyc' and curr_ext == '.pyc':
-                            # Check the optimization level
-                            if opt_index >= curr_opt_index:
-                                # Module name match, but a higher-priority
-                                # optimization level was already matched, skipping.
-                                continue
-                        elif not curr_ext or self.suffix_order.index(ext) >= self.suffix_order.index(curr_ext):
-                            # Match found but a higher-priorty match already
-                            # exists, so skip this.
-                            continue
-
-                    if six.PY3 and not dirname and ext == '.pyc':
-                        # On Python 3, we should only load .pyc files from the
-                        # __pycache__ subdirectory (i.e. when dirname is not an
-                        # empty string).
+                        log.trace(
+                            'Disallowed optimization level %d for module '
+                            'name \'%s\', skipping. Add %d to the '
+                            '\'optimization_order\' config option if you '
+                            'do not want to ignore this optimization '
+                            'level.', opt_level, f_noext, opt_level
+                        )
                         continue
+                else:
+                    # Optimization level not reflected in filename on PY2
+                    opt_index = 0
 
-                    # Made it this far - add it
-                    self.file_mapping[f_noext] = (fpath, ext, opt_index)
+                # make sure it is a suffix we support
+                if ext not in self.suffix_map:
+                    continue  # Next filename
 
-                except OSError:
+                if six.PY3 and not dirname and ext == '.pyc':
+                    # On Python 3, we should only load .pyc files from the
+                    # __pycache__ subdirectory (i.e. when dirname is not an
+                    # empty string).
                     continue
-        for smod in self.static_modules:
-            f_noext = smod.split('.')[-1]
-            self.file_mapping[f_noext] = (smod, '.o', 0)
+
+                fpath = os.path.join(mod_dir, filename)
+                virtualname = None
+                # if its a directory, lets allow us to load that
+                if ext == '':
+                    # is there something __init__?
+                    mtime = _mtime(fpath)
+                    subfiles = os.listdir(fpath)
+                    packages[fpath] = mtime
+                    for suffix in self.suffix_order:
+                        if '' == suffix:
+                            continue  # Next suffix (__init__ must have a suffix)
+                        init_file = '__init__{0}'.format(suffix)
+                        if init_file in subfiles:
+                            break
+                    else:
+                        continue  # Next filename
+                    if virtualnames:
+                        virtualname = _static_virtualname(
+                            os.path.join(fpath, '__init__.py'))
+                elif virtualnames and ext == '.py':
+                    virtualname = _static_virtualname(fpath)
+
+                modules.append((f_noext, filename, ext, opt_index, virtualname))
+            except OSError:
+                continue
+        return modules, packages
+
+    def _cache_file(self, option, filename):
+        '''
+        Return the path of a cache persisted in the cachedir, or None if the
+        option enabling it is not set
+        '''
+        if not self.opts.get(option) or not self.opts.get('cachedir'):
+            return None
+        return os.path.join(self.opts['cachedir'], filename)
+
+    def _merge_cache_file(self, path, cache, merged):
+        '''
+        Add the entries of the cache persisted at path to cache, unless the
+        file is in merged, the set of the files already merged
+        '''
+        if path is None or path in merged:
+            return
+        merged.add(path)
+        for key, entry in six.iteritems(self._read_cache_file(path)):
+            cache.setdefault(key, entry)
+
+    def _read_cache_file(self, path):
+        '''
+        Return the cache persisted at path, or an empty dict
+        '''
+        try:
+            with salt.utils.files.fopen(path, 'rb') as fp_:
+                cache = salt.payload.Serial(self.opts).loads(fp_.read())
+        except (IOError, OSError):
+            return {}
+        except Exception as exc:
+            log.debug('Ignoring invalid loader cache %s: %s', path, exc)
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def _write_cache_file(self, path, cache):
+        '''
+        Persist the cache at path
+        '''
+        try:
+            with salt.utils.atomicfile.atomic_open(path, 'wb') as fp_:
+                fp_.write(salt.payload.Serial(self.opts).dumps(cache))
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the loader cache %s: %s', path, exc)
+
+    def _virtual_cache_key(self, name):
+        '''
+        Return the key of the cached __virtual__ outcome of the module name,
+        or None if it is not cached. The outcomes of the packages and of the
+        static modules are not cached, as their modification time doesn't
+        reflect their changes.
+        '''
+        if self._virtual_cache_grains is None or not self.virtual_enable:
+            return None
+        fpath, suffix = self.file_mapping[name][:2]
+        if suffix in ('', '.o'):
+            return None
+        return '\n'.join([self.tag, fpath] + list(self.virtual_funcs))
+
+    def _get_virtual_cache(self, name):
+        '''
+        Return the cached __virtual__ outcome of the module name, or None if
+        there is none or the module or the grains changed since
+        '''
+        key = self._virtual_cache_key(name)
+        if key is None:
+            return None
+        entry = _VIRTUAL_CACHE.get(key)
+        if entry is None \
+                or entry['grains'] != self._virtual_cache_grains \
+                or entry['mtime'] != _mtime(self.file_mapping[name][0]):
+            return None
+        return entry
+
+    def _set_virtual_cache(self, name, virtual, virtualname, error):
+        '''
+        Cache the __virtual__ outcome of the module name
+        '''
+        key = self._virtual_cache_key(name)
+        if key is None:
+            return
+        mtime = _mtime(self.file_mapping[name][0])
+        if mtime is None or time.time() - mtime < LOADER_MANIFEST_RACY_DELAY:
+            return
+        entry = {'grains': self._virtual_cache_grains,
+                 'mtime': mtime,
+                 'virtual': virtual,
+                 'name': virtualname,
+                 'error': error if error is None else six.text_type(error)}
+        _VIRTUAL_CACHE[key] = entry
+        self._virtual_cache_changes[key] = entry
+
+    def _save_virtual_cache(self):
+        '''
+        Persist the __virtual__ outcomes cached since the last save
+        '''
+        if not self._virtual_cache_changes:
+            return
+        if self._virtual_cache_file is not None:
+            # Merge our changes with the ones other processes made
+            cache = self._read_cache_file(self._virtual_cache_file)
+            cache.update(self._virtual_cache_changes)
+            self._write_cache_file(self._virtual_cache_file, cache)
+        self._virtual_cache_changes = {}
 
     def clear(self):
         '''
@@ -1571,6 +1843,18 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         if mod_name in self.file_mapping:
             yield mod_name
 
+        # do we have a module whose __virtualname__ matches?
+        for k, virtualname in six.iteritems(self.static_virtualnames):
+            if virtualname == mod_name:
+                yield k
+
+        # or one whose __virtual__ renamed it to mod_name before?
+        if self._virtual_cache_grains is not None:
+            for k in self.file_mapping:
+                entry = _VIRTUAL_CACHE.get(self._virtual_cache_key(k))
+                if entry and entry['virtual'] and entry['name'] == mod_name:
+                    yield k
+
         # do we have a partial match?
         for k in self.file_mapping:
             if mod_name in k:
@@ -1598,6 +1882,12 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         mod = None
         fpath, suffix = self.file_mapping[name][:2]
         self.loaded_files.add(name)
+        cached = self._get_virtual_cache(name)
+        if cached is not None and not cached['virtual'] \
+                and name not in self.missing_modules:
+            # The __virtual__ function already refused to load the module
+            self.missing_modules[name] = cached['error']
+            return False
         fpath_dirname = os.path.dirname(fpath)
         try:
             sys.path.append(fpath_dirname)
@@ -1770,7 +2060,9 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     # If a module has information about why it could not be loaded, record it
                     self.missing_modules[module_name] = virtual_err
                     self.missing_modules[name] = virtual_err
+                    self._set_virtual_cache(name, False, None, virtual_err)
                     return False
+            self._set_virtual_cache(name, True, module_name, None)
         else:
             virtual_aliases = ()
 
@@ -1898,6 +2190,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                         self._refresh_file_mapping()
                         reloaded = True
                     continue
+            self._save_virtual_cache()
 
         return ret
 
@@ -1911,6 +2204,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     continue
                 self._load_module(name)
 
+            self._save_virtual_cache()
             self.loaded = True
 
     def reload_modules(self):
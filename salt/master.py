@@ -195,6 +195,8 @@ class Maintenance(salt.utils.process.SignalHandlingMultiprocessingProcess):
                                                      runner_client.functions_dict(),
                                                      returners=self.returners)
         self.ckminions = salt.utils.minions.CkMinions(self.opts)
+        # The key lists published for the other processes
+        self.key_cache = salt.utils.minions.KeyCache(self.opts)
         # Make Event bus for firing
         self.event = salt.utils.event.get_master_event(self.opts, self.opts['sock_dir'], listen=False)
         # Init any values needed by the git ext pillar
@@ -242,14 +244,34 @@ class Maintenance(salt.utils.process.SignalHandlingMultiprocessingProcess):
             self.handle_key_rotate(now)
             salt.utils.verify.check_max_open_files(self.opts)
             last = now
+            self.sleep()
+
+    def sleep(self):
+        '''
+        Sleep until the next maintenance run. When the key cache is shared, the
+        key changes are published in the meantime.
+        '''
+        if self.opts['key_cache'] != 'shared':
             time.sleep(self.loop_interval)
+            return
+        wake = time.time() + self.loop_interval
+        # Don't spin on the key directories with a null interval
+        interval = max(0.1, self.opts['key_cache_interval'])
+        while True:
+            remaining = wake - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, interval))
+            self.handle_key_cache()
 
     def handle_key_cache(self):
         '''
         Evaluate accepted keys and create a msgpack file
         which contains a list
         '''
-        if self.opts['key_cache'] == 'sched':
+        if self.opts['key_cache'] == 'shared':
+            self.key_cache.refresh()
+        elif self.opts['key_cache'] == 'sched':
             keys = []
             #TODO DRY from CKMinions
             if self.opts['transport'] in ('zeromq', 'tcp'):
@@ -822,6 +844,167 @@ class Halite(salt.utils.process.SignalHandlingMultiprocessingProcess):
         halite.start(self.hopts)
 
 
+class MWorkerPool(object):
+    '''
+    Start and stop the MWorker processes of a ReqServer with their load,
+    between worker_threads and worker_threads_max workers.
+
+    The workers record the time they spend handling requests in a shared
+    array, and the pool checks it every worker_threads_interval seconds. When
+    the workers were busy most of the time, the requests are queueing up for
+    them, and the pool starts more workers right away. When one less worker
+    would still have been mostly idle for several checks in a row, it retires
+    an idle worker, which exits once it has no request left to handle.
+    '''
+    # The slots of each worker in the load array: the start time of the
+    # request it is handling, or 0, the seconds it spent handling requests,
+    # the number of requests it handled, and 1 once it must retire
+    SLOTS = 4
+    # Start workers when they were busy more than this part of the time
+    HIGH = 0.75
+    # Stop a worker when the others would have been busy less than this part
+    # of the time, for SHRINK_CHECKS checks in a row
+    LOW = 0.5
+    SHRINK_CHECKS = 6
+    # Terminate the retired workers still running after this many seconds
+    RETIRE_TIMEOUT = 60
+
+    def __init__(self, opts, process_manager, start_worker):
+        '''
+        :param dict opts: The salt options
+        :param ProcessManager process_manager: The manager of the workers
+        :param start_worker: The function starting the worker of an index,
+                             given the index and the load array
+        '''
+        self.opts = opts
+        self.process_manager = process_manager
+        self.start_worker = start_worker
+        self.minimum = int(opts['worker_threads'])
+        self.maximum = max(self.minimum, int(opts['worker_threads_max']))
+        self.interval = opts['worker_threads_interval']
+        self.load = multiprocessing.Array(ctypes.c_double, self.SLOTS * self.maximum, lock=False)
+        # The indexes of the running workers, and their busy seconds and
+        # requests at the last check
+        self.workers = set()
+        self.busy = [0.0] * self.maximum
+        self.requests = [0.0] * self.maximum
+        self.last_check = time.time()
+        self.low_checks = 0
+        # The processes of the retired workers still running, and when they
+        # were retired, by index
+        self.retiring = {}
+
+    @staticmethod
+    def name(index):
+        return 'MWorker-{0}'.format(index)
+
+    def _retire(self, index):
+        '''
+        Tell a worker to exit once it has no request left to handle, instead
+        of stopping it with the requests queued for it
+        '''
+        self.load[index * self.SLOTS + 3] = 1.0
+        self.workers.discard(index)
+        process = self.process_manager.release_process(self.name(index))
+        if process is not None:
+            self.retiring[index] = (process, time.time())
+
+    def _reap(self):
+        '''
+        Collect the retired workers which exited, and terminate the ones
+        taking too long to
+        '''
+        now = time.time()
+        for index, (process, retired) in list(self.retiring.items()):
+            if process.is_alive():
+                if now - retired < self.RETIRE_TIMEOUT:
+                    continue
+                log.warning('%s did not exit %ds after being retired, terminating it',
+                            self.name(index), self.RETIRE_TIMEOUT)
+                process.terminate()
+            process.join(1)
+            del self.retiring[index]
+
+    def _start(self, index):
+        slot = index * self.SLOTS
+        self.load[slot:slot + self.SLOTS] = [0.0] * self.SLOTS
+        self.busy[index] = self.requests[index] = 0.0
+        self.start_worker(index, self.load)
+        self.workers.add(index)
+
+    def start(self):
+        '''
+        Start the minimum number of workers
+        '''
+        for index in range(self.minimum):
+            self._start(index)
+
+    def check(self):
+        '''
+        Check the load of the workers since the last check, and start or stop
+        workers
+        '''
+        self._reap()
+        now = time.time()
+        elapsed = now - self.last_check
+        self.last_check = now
+        if elapsed <= 0 or not self.workers:
+            return
+        busy = requests = 0.0
+        idle = []
+        for index in self.workers:
+            slot = index * self.SLOTS
+            start, busy_total, requests_total = self.load[slot:slot + 3]
+            if start:
+                # Handling a request since start
+                busy_total += now - start
+            else:
+                idle.append(index)
+            busy += max(0.0, busy_total - self.busy[index])
+            requests += max(0.0, requests_total - self.requests[index])
+            self.busy[index] = busy_total
+            self.requests[index] = requests_total
+
+        size = len(self.workers)
+        utilization = min(1.0, busy / (elapsed * size))
+        latency = busy / requests if requests else 0.0
+        if utilization >= self.HIGH and size < self.maximum:
+            self.low_checks = 0
+            grow = min(self.maximum - size, max(1, size // 2))
+            log.info(
+                'The %d MWorkers were busy %d%% of the time, handling %d '
+                'requests in %.3fs on average, starting %d more',
+                size, utilization * 100, requests, latency, grow
+            )
+            free = [index for index in range(self.maximum)
+                    if index not in self.workers and index not in self.retiring]
+            for index in free[:grow]:
+                self._start(index)
+        elif size > self.minimum and idle and utilization * size / (size - 1) < self.LOW:
+            self.low_checks += 1
+            if self.low_checks >= self.SHRINK_CHECKS:
+                self.low_checks = 0
+                # Retire the last started worker, unless it is busy
+                index = max(idle)
+                log.info(
+                    'The %d MWorkers were busy %d%% of the time, retiring %s',
+                    size, utilization * 100, self.name(index)
+                )
+                self._retire(index)
+        else:
+            self.low_checks = 0
+
+    def run(self):
+        '''
+        Keep the workers running, and check their load
+        '''
+        salt.utils.process.appendproctitle(self.process_manager.name)
+        while True:
+            self.process_manager.check_children()
+            time.sleep(self.interval)
+            self.check()
+
+
 class ReqServer(salt.utils.process.SignalHandlingMultiprocessingProcess):
     '''
     Starts up the master request server, minions send results to this
@@ -901,12 +1084,26 @@ class ReqServer(salt.utils.process.SignalHandlingMultiprocessingProcess):
 
         req_channels = []
         tcp_only = True
+        zeromq_only = True
         for transport, opts in iter_transport_opts(self.opts):
             chan = salt.transport.server.ReqServerChannel.factory(opts)
             chan.pre_fork(self.process_manager)
             req_channels.append(chan)
             if transport != 'tcp':
                 tcp_only = False
+            if transport != 'zeromq':
+                zeromq_only = False
+
+        lanes = {}
+        if self.opts.get('worker_lanes'):
+            if zeromq_only:
+                import salt.transport.zeromq
+                lanes = salt.transport.zeromq.worker_lanes(self.opts)
+            else:
+                # The other transports balance the connections of the minions
+                # over the workers, they can't route each request
+                log.warning('The worker lanes are only supported by the zeromq '
+                            'transport, ignoring them')
 
         kwargs = {}
         if salt.utils.platform.is_windows():
@@ -920,21 +1117,45 @@ class ReqServer(salt.utils.process.SignalHandlingMultiprocessingProcess):
                             'when using Python 2.')
                 self.opts['worker_threads'] = 1
 
-        # Reset signals to default ones before adding processes to the process
-        # manager. We don't want the processes being started to inherit those
-        # signal handlers
-        with salt.utils.process.default_signals(signal.SIGINT, signal.SIGTERM):
-            for ind in range(int(self.opts['worker_threads'])):
-                name = 'MWorker-{0}'.format(ind)
+        def start_worker(index, worker_load=None, lane=None):
+            if lane is None:
+                name = MWorkerPool.name(index)
+            else:
+                name = 'MWorker-{0}-{1}'.format(lane, index)
+            worker_kwargs = dict(kwargs)
+            if worker_load is not None:
+                worker_kwargs['worker_load'] = worker_load
+                worker_kwargs['worker_index'] = index
+            if lane is not None:
+                worker_kwargs['lane'] = lane
+            # Reset signals to default ones before adding processes to the
+            # process manager. We don't want the processes being started to
+            # inherit those signal handlers
+            with salt.utils.process.default_signals(signal.SIGINT, signal.SIGTERM):
                 self.process_manager.add_process(MWorker,
                                                  args=(self.opts,
                                                        self.master_key,
                                                        self.key,
                                                        req_channels,
                                                        name),
-                                                 kwargs=kwargs,
+                                                 kwargs=worker_kwargs,
                                                  name=name)
-        self.process_manager.run()
+
+        # The workers of the lanes are a fixed number, the MWorkerPool only
+        # manages the workers of the default lane
+        for lane in sorted(lanes):
+            for ind in range(lanes[lane]):
+                start_worker(ind, lane=lane)
+
+        if int(self.opts['worker_threads_max']) > int(self.opts['worker_threads']):
+            # The workers are forked from this process as they are needed
+            pool = MWorkerPool(self.opts, self.process_manager, start_worker)
+            pool.start()
+            pool.run()
+        else:
+            for ind in range(int(self.opts['worker_threads'])):
+                start_worker(ind)
+            self.process_manager.run()
 
     def run(self):
         '''
@@ -963,6 +1184,9 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
                  key,
                  req_channels,
                  name,
+                 worker_load=None,
+                 worker_index=None,
+                 lane=None,
                  **kwargs):
         '''
         Create a salt master worker process
@@ -970,6 +1194,10 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
         :param dict opts: The salt options
         :param dict mkey: The user running the salt master and the AES key
         :param dict key: The user running the salt master and the RSA key
+        :param worker_load: The load array of the MWorkerPool, if any
+        :param int worker_index: The index of the worker in the MWorkerPool
+        :param str lane: The worker lane to handle the requests of, if not the
+                         default one
 
         :rtype: MWorker
         :return: Master worker
@@ -979,6 +1207,9 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
         super(MWorker, self).__init__(**kwargs)
         self.opts = opts
         self.req_channels = req_channels
+        self.worker_load = worker_load
+        self.worker_index = worker_index
+        self.lane = lane
 
         self.mkey = mkey
         self.key = key
@@ -1002,6 +1233,9 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
         self.mkey = state['mkey']
         self.key = state['key']
         self.k_mtime = state['k_mtime']
+        self.worker_load = state['worker_load']
+        self.worker_index = state['worker_index']
+        self.lane = state['lane']
         SMaster.secrets = state['secrets']
 
     def __getstate__(self):
@@ -1011,6 +1245,9 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
             'mkey': self.mkey,
             'key': self.key,
             'k_mtime': self.k_mtime,
+            'worker_load': self.worker_load,
+            'worker_index': self.worker_index,
+            'lane': self.lane,
             'secrets': SMaster.secrets,
             'log_queue': self.log_queue,
             'log_queue_level': self.log_queue_level
@@ -1029,8 +1266,15 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
         install_zmq()
         self.io_loop = ZMQDefaultLoop()
         self.io_loop.make_current()
+        kwargs = {}
+        if self.lane is not None:
+            # Only set up for the zeromq transport
+            kwargs['lane'] = self.lane
         for req_channel in self.req_channels:
-            req_channel.post_fork(self._handle_payload, io_loop=self.io_loop)  # TODO: cleaner? Maybe lazily?
+            req_channel.post_fork(self._handle_payload, io_loop=self.io_loop, **kwargs)  # TODO: cleaner? Maybe lazily?
+        if self.worker_load is not None:
+            self._retire_callback = tornado.ioloop.PeriodicCallback(self._check_retire, 500)
+            self._retire_callback.start()
         try:
             self.io_loop.start()
         except (KeyboardInterrupt, SystemExit):
@@ -1061,10 +1305,40 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
         '''
         key = payload['enc']
         load = payload['load']
-        ret = {'aes': self._handle_aes,
-               'clear': self._handle_clear}[key](load)
+        if self.worker_load is None:
+            ret = {'aes': self._handle_aes,
+                   'clear': self._handle_clear}[key](load)
+            raise tornado.gen.Return(ret)
+
+        # Record the time spent on the request for the MWorkerPool
+        slot = self.worker_index * MWorkerPool.SLOTS
+        start = time.time()
+        self.worker_load[slot] = start
+        try:
+            ret = {'aes': self._handle_aes,
+                   'clear': self._handle_clear}[key](load)
+        finally:
+            self.worker_load[slot] = 0.0
+            self.worker_load[slot + 1] += time.time() - start
+            self.worker_load[slot + 2] += 1
         raise tornado.gen.Return(ret)
 
+    def _check_retire(self):
+        '''
+        Exit once the MWorkerPool retired this worker and it has no request
+        left to handle, nor reply to send
+        '''
+        slot = self.worker_index * MWorkerPool.SLOTS
+        if not self.worker_load[slot + 3] or self.worker_load[slot]:
+            return
+        if not all(channel.idle() for channel in self.req_channels):
+            return
+        log.info('%s is retiring', self.name)
+        self._retire_callback.stop()
+        for channel in self.req_channels:
+            channel.close()
+        self.io_loop.stop()
+
     def _post_stats(self, stats):
         '''
         Fire events with stat info if it's time
@@ -1132,6 +1406,9 @@ class MWorker(salt.utils.process.SignalHandlingMultiprocessingProcess):
         Start a Master Worker
         '''
         salt.utils.process.appendproctitle(self.name)
+        if self.worker_load is not None:
+            # Not busy with the request a previous worker died handling
+            self.worker_load[self.worker_index * MWorkerPool.SLOTS] = 0.0
         self.clear_funcs = ClearFuncs(
            self.opts,
            self.key,
@@ -1161,6 +1438,9 @@ class AESFuncs(object):
         self.event = salt.utils.event.get_master_event(self.opts, self.opts['sock_dir'], listen=False)
         self.serial = salt.payload.Serial(opts)
         self.ckminions = salt.utils.minions.CkMinions(opts)
+        # The loaded public keys of the minions, least recently used first,
+        # see __get_minion_pub
+        self.minion_pubs = collections.OrderedDict()
         # Make a client
         self.local = salt.client.get_local_client(self.opts['conf_file'])
         # Create the master minion to access the external job cache
@@ -1184,12 +1464,37 @@ class AESFuncs(object):
         self._file_find = self.fs_._find_file
         self._file_hash = self.fs_.file_hash
         self._file_hash_and_stat = self.fs_.file_hash_and_stat
+        self._file_hashes = self.fs_.file_hashes
         self._file_list = self.fs_.file_list
         self._file_list_emptydirs = self.fs_.file_list_emptydirs
         self._dir_list = self.fs_.dir_list
         self._symlink_list = self.fs_.symlink_list
         self._file_envs = self.fs_.file_envs
 
+    def __get_minion_pub(self, id_):
+        '''
+        Return the public key of a minion and the set of the tokens verified
+        with it. The key is only read again when its file changed since it was
+        loaded, the file is stat'ed on each call so that the requests are
+        denied as soon as the key is no longer accepted.
+
+        :param str id_: A minion ID
+
+        :rtype: tuple
+        :return: The public key and the set of the verified tokens
+        '''
+        pub_path = os.path.join(self.opts['pki_dir'], 'minions', id_)
+        pub_stat = os.stat(pub_path)
+        stamp = (pub_stat.st_ino, pub_stat.st_size, pub_stat.st_mtime)
+        cached = self.minion_pubs.pop(id_, None)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, salt.crypt.get_rsa_pub_key(pub_path), set())
+        if self.opts['minion_pub_cache_size'] > 0:
+            self.minion_pubs[id_] = cached
+            while len(self.minion_pubs) > self.opts['minion_pub_cache_size']:
+                self.minion_pubs.popitem(last=False)
+        return cached[1], cached[2]
+
     def __verify_minion(self, id_, token):
         '''
         Take a minion id and a string signed with the minion private key
@@ -1203,10 +1508,9 @@ class AESFuncs(object):
         '''
         if not salt.utils.verify.valid_id(self.opts, id_):
             return False
-        pub_path = os.path.join(self.opts['pki_dir'], 'minions', id_)
 
         try:
-            pub = salt.crypt.get_rsa_pub_key(pub_path)
+            pub, tokens = self.__get_minion_pub(id_)
         except (IOError, OSError):
             log.warning(
                 'Salt minion claiming to be %s attempted to communicate with '
@@ -1215,9 +1519,16 @@ class AESFuncs(object):
             )
             return False
         except (ValueError, IndexError, TypeError) as err:
-            log.error('Unable to load public key "%s": %s', pub_path, err)
+            log.error('Unable to load public key of minion %s: %s', id_, err)
+            return False
+        # The token of a minion is the same until its key changes
+        if token in tokens:
+            return True
         try:
             if salt.crypt.public_decrypt(pub, token) == b'salt':
+                if len(tokens) >= 16:
+                    tokens.clear()
+                tokens.add(token)
                 return True
         except ValueError as err:
             log.error('Unable to decrypt token: %s', err)
@@ -1540,10 +1851,12 @@ class AESFuncs(object):
         data = pillar.compile_pillar()
         self.fs_.update_opts()
         if self.opts.get('minion_data_cache', False):
+            minion_data = {'grains': load['grains'], 'pillar': data}
             self.masterapi.cache.store('minions/{0}'.format(load['id']),
                                        'data',
-                                       {'grains': load['grains'],
-                                        'pillar': data})
+                                       minion_data)
+            if self.ckminions.index is not None:
+                self.ckminions.index.update(load['id'], minion_data)
             if self.opts.get('minion_data_cache_events') is True:
                 self.event.fire_event({'Minion data cache refresh': load['id']}, tagify(load['id'], 'refresh', 'minion'))
         return data
@@ -1604,18 +1917,65 @@ class AESFuncs(object):
 
         :param dict load: The minion payload
         '''
+        if not self.__verify_minion_sig(load, '_return'):
+            return False
+
+        try:
+            salt.utils.job.store_job(
+                self.opts, load, event=self.event, mminion=self.mminion)
+        except salt.exceptions.SaltCacheError:
+            log.error('Could not store job information for load: %s', load)
+
+    def _return_batch(self, load):
+        '''
+        Handle a batch of returns sent by a minion in a single request.
+
+        The signature of the batch is verified once, then the returns are
+        handled like the ones sent on their own.
+
+        :param dict load: The minion payload, with the returns in ``returns``
+        '''
+        if 'id' not in load or not isinstance(load.get('returns'), list):
+            return False
+        if not self.__verify_minion_sig(load, '_return_batch'):
+            return False
+
+        for ret in load['returns']:
+            if not isinstance(ret, dict) or ret.get('id') != load['id']:
+                log.warning(
+                    'Dropping an invalid return from the batch sent by %s',
+                    load['id']
+                )
+                continue
+            try:
+                salt.utils.job.store_job(
+                    self.opts, ret, event=self.event, mminion=self.mminion)
+            except salt.exceptions.SaltCacheError:
+                log.error('Could not store job information for load: %s', ret)
+
+    def __verify_minion_sig(self, load, cmd):
+        '''
+        Verify the signature of a payload sent by a minion, if the master
+        requires minions to sign their messages or the payload is signed
+
+        :param dict load: The minion payload
+        :param str cmd: The command of the payload, for logging
+
+        :rtype: bool
+        :return: Whether the payload should be handled
+        '''
         if self.opts['require_minion_sign_messages'] and 'sig' not in load:
             log.critical(
-                '_return: Master is requiring minions to sign their '
+                '%s: Master is requiring minions to sign their '
                 'messages, but there is no signature in this payload from '
-                '%s.', load['id']
+                '%s.', cmd, load['id']
             )
             return False
 
         if 'sig' in load:
             log.trace('Verifying signed event publish from minion')
             sig = load.pop('sig')
-            this_minion_pubkey = os.path.join(self.opts['pki_dir'], 'minions/{0}'.format(load['id']))
+            this_minion_pubkey, _ = self.__get_minion_pub(load['id'])
             serialized_load = salt.serializers.msgpack.serialize(load)
             if not salt.crypt.verify_signature(this_minion_pubkey, serialized_load, sig):
                 log.info('Failed to verify event signature from minion %s.', load['id'])
@@ -1628,12 +1988,7 @@ class AESFuncs(object):
                 else:
                     log.info('But \'drop_message_signature_fail\' is disabled, so message is still accepted.')
             load['sig'] = sig
-
-        try:
-            salt.utils.job.store_job(
-                self.opts, load, event=self.event, mminion=self.mminion)
-        except salt.exceptions.SaltCacheError:
-            log.error('Could not store job information for load: %s', load)
+        return True
 
     def _syndic_return(self, load):
         '''
@@ -1848,7 +2203,7 @@ class AESFuncs(object):
             return False, {'fun': 'send'}
         # Don't encrypt the return value for the _return func
         # (we don't care about the return value, so why encrypt it?)
-        if func == '_return':
+        if func in ('_return', '_return_batch'):
             return ret, {'fun': 'send'}
         if func == '_pillar' and 'id' in load:
             if load.get('ver') != '2' and self.opts['pillar_version'] == 1:
@@ -2162,7 +2517,7 @@ class ClearFuncs(object):
 
         # Send it!
         self._send_ssh_pub(payload, ssh_minions=ssh_minions)
-        self._send_pub(payload)
+        self._send_pub(payload, minions)
 
         return {
             'enc': 'clear',
@@ -2216,13 +2571,14 @@ class ClearFuncs(object):
             return {'error': msg}
         return jid
 
-    def _send_pub(self, load):
+    def _send_pub(self, load, minions=None):
         '''
-        Take a load and send it across the network to connected minions
+        Take a load and send it across the network to connected minions, the
+        minions matching its target if they are already resolved
         '''
         for transport, opts in iter_transport_opts(self.opts):
             chan = salt.transport.server.PubServerChannel.factory(opts)
-            chan.publish(load)
+            chan.publish(load, minions=minions)
 
     @property
     def ssh_client(self):
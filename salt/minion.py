@@ -1116,6 +1116,169 @@ class MinionManager(MinionBase):
             minion.destroy()
 
 
+class JobWorker(SignalHandlingMultiprocessingProcess):
+    '''
+    A pre-forked process running minion jobs sent over a pipe.
+
+    The worker is forked from the minion process once its modules are
+    loaded, so jobs run with warm ``minion_mods``, returners and executors
+    instead of paying a fork per job. It exits after ``max_jobs`` jobs, or
+    when it receives ``None``.
+    '''
+    def __init__(self, minion, conn, max_jobs, **kwargs):
+        super(JobWorker, self).__init__(**kwargs)
+        self.minion = minion
+        self.conn = conn
+        self.max_jobs = max_jobs
+
+    def run(self):
+        salt.utils.process.appendproctitle(self.__class__.__name__)
+        # Jobs must not daemonize away from the worker, see _thread_return
+        self.minion.in_job_worker = True
+        if self.minion.job_pool is not None:
+            # Drop the inherited pipes of the other workers
+            for worker in self.minion.job_pool.workers:
+                worker[1].close()
+            self.minion.job_pool = None
+        # The jobs append their jid to the process title, each job starts
+        # from the title of the worker
+        title = salt.utils.process.getproctitle()
+        jobs = 0
+        while self.max_jobs <= 0 or jobs < self.max_jobs:
+            try:
+                msg = self.conn.recv()
+            except (EOFError, IOError, OSError):
+                break
+            if msg is None:
+                break
+            data, connected = msg
+            jobs += 1
+            self.minion.connected = connected
+            try:
+                self.minion._target(self.minion, self.minion.opts, data, connected)
+            except Exception:
+                log.exception('Job %s failed in the job worker', data.get('jid'))
+            finally:
+                salt.utils.process.resetproctitle(title)
+                # The return normally clears the proc file, make sure a
+                # failed return doesn't leave the job running in appearance
+                # for as long as this worker lives
+                fn_ = os.path.join(self.minion.proc_dir, data['jid'])
+                try:
+                    os.remove(fn_)
+                except (OSError, IOError):
+                    pass
+            try:
+                self.conn.send(data['jid'])
+            except (IOError, OSError):
+                break
+
+
+class JobWorkerPool(object):
+    '''
+    A bounded pool of JobWorker processes.
+
+    Jobs are handed to an idle worker, and when all the workers are busy
+    the caller falls back to forking a process for the job, so that long
+    running jobs never delay the others. Workers are forked on demand and
+    retired after ``job_worker_pool_max_jobs`` jobs or when the minion
+    reloads its modules, so that the next ones are forked with the fresh
+    modules.
+    '''
+    def __init__(self, minion, size, max_jobs):
+        self.minion = minion
+        self.size = size
+        self.max_jobs = max_jobs
+        # Each worker is a [process, parent end of the pipe, busy, jobs] list
+        self.workers = []
+        self.retired = []
+
+    def _reap(self):
+        '''
+        Collect the workers which finished a job, and the dead ones
+        '''
+        for worker in list(self.workers):
+            process, conn = worker[:2]
+            try:
+                while conn.poll():
+                    conn.recv()
+                    worker[2] = False
+            except (EOFError, IOError, OSError):
+                worker[2] = True
+            if not process.is_alive():
+                process.join()
+                conn.close()
+                self.workers.remove(worker)
+        for process in list(self.retired):
+            if not process.is_alive():
+                process.join()
+                self.retired.remove(process)
+
+    def _spawn(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = JobWorker(self.minion, child_conn, self.max_jobs)
+        process.start()
+        # The child end is only used by the worker
+        child_conn.close()
+        worker = [process, parent_conn, False, 0]
+        self.workers.append(worker)
+        return worker
+
+    def dispatch(self, data, connected):
+        '''
+        Hand a job to an idle worker. Return False if all the workers are
+        busy.
+        '''
+        self._reap()
+        for worker in self.workers:
+            if not worker[2]:
+                break
+        else:
+            if len(self.workers) >= self.size:
+                return False
+            worker = self._spawn()
+        try:
+            worker[1].send((data, connected))
+        except (IOError, OSError) as exc:
+            log.debug('Unable to send job %s to job worker %s: %s',
+                      data['jid'], worker[0].pid, exc)
+            return False
+        worker[2] = True
+        worker[3] += 1
+        if 0 < self.max_jobs <= worker[3]:
+            # The worker exits after this job, it must not be handed another
+            # one it would never read
+            self.workers.remove(worker)
+            worker[1].close()
+            self.retired.append(worker[0])
+        return True
+
+    def recycle(self):
+        '''
+        Retire all the workers. Busy ones exit after their current job.
+        '''
+        for process, conn, _, _ in self.workers:
+            try:
+                conn.send(None)
+            except (IOError, OSError):
+                pass
+            conn.close()
+            self.retired.append(process)
+        self.workers = []
+
+    def stop(self):
+        '''
+        Retire all the workers and wait for them to exit
+        '''
+        self.recycle()
+        for process in self.retired:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.retired = []
+
+
 class Minion(MinionBase):
     '''
     This class instantiates a minion, runs connections for a minion,
@@ -1132,6 +1295,10 @@ class Minion(MinionBase):
 
         self._running = None
         self.win_proc = []
+        self.job_pool = None
+        # Returns waiting to be sent in a _return_batch request
+        self.return_batch = []
+        self._return_batch_timeout = None
         self.loaded_base_name = loaded_base_name
         self.connected = False
         self.restart = False
@@ -1532,9 +1699,12 @@ class Minion(MinionBase):
 
         if isinstance(data['fun'], six.string_types):
             if data['fun'] == 'sys.reload_modules':
+                salt.loader.clear_virtual_cache(self.opts)
                 self.functions, self.returners, self.function_errors, self.executors = self._load_modules()
                 self.schedule.functions = self.functions
                 self.schedule.returners = self.returners
+                if self.job_pool is not None:
+                    self.job_pool.recycle()
 
         process_count_max = self.opts.get('process_count_max')
         process_count_max_sleep_secs = self.opts.get('process_count_max_sleep_secs')
@@ -1549,12 +1719,24 @@ class Minion(MinionBase):
                 yield tornado.gen.sleep(process_count_max_sleep_secs)
                 process_count = len(salt.utils.minion.running(self.opts))
 
+        multiprocessing_enabled = self.opts.get('multiprocessing', True)
+        if multiprocessing_enabled \
+                and self.opts.get('job_worker_pool_size', 0) > 0 \
+                and not salt.utils.platform.is_windows():
+            if self.job_pool is None:
+                self.job_pool = JobWorkerPool(self,
+                                              self.opts['job_worker_pool_size'],
+                                              self.opts.get('job_worker_pool_max_jobs', 0))
+            if self.job_pool.dispatch(data, self.connected):
+                return
+            log.debug('All the job workers are busy, forking a process '
+                      'for job %s', data['jid'])
+
         # We stash an instance references to allow for the socket
         # communication in Windows. You can't pickle functions, and thus
         # python needs to be able to reconstruct the reference on the other
         # side.
         instance = self
-        multiprocessing_enabled = self.opts.get('multiprocessing', True)
         if multiprocessing_enabled:
             if sys.platform.startswith('win'):
                 # let python reconstruct the minion on the other side if we're
@@ -1643,7 +1825,8 @@ class Minion(MinionBase):
         '''
         fn_ = os.path.join(minion_instance.proc_dir, data['jid'])
 
-        if opts['multiprocessing'] and not salt.utils.platform.is_windows():
+        if opts['multiprocessing'] and not salt.utils.platform.is_windows() \
+                and not getattr(minion_instance, 'in_job_worker', False):
             # Shutdown the multiprocessing before daemonizing
             salt.log.setup.shutdown_multiprocessing_logging()
 
@@ -1866,7 +2049,8 @@ class Minion(MinionBase):
         '''
         fn_ = os.path.join(minion_instance.proc_dir, data['jid'])
 
-        if opts['multiprocessing'] and not salt.utils.platform.is_windows():
+        if opts['multiprocessing'] and not salt.utils.platform.is_windows() \
+                and not getattr(minion_instance, 'in_job_worker', False):
             # Shutdown the multiprocessing before daemonizing
             salt.log.setup.shutdown_multiprocessing_logging()
 
@@ -2041,6 +2225,11 @@ class Minion(MinionBase):
         if not self.opts['pub_ret']:
             return ''
 
+        if sync and ret_cmd == '_return' \
+                and self.opts.get('return_batch_window', 0) > 0 \
+                and self._queue_return(load):
+            return ''
+
         def timeout_handler(*_):
             log.warning(
                'The minion failed to return the job information for job %s. '
@@ -2063,6 +2252,49 @@ class Minion(MinionBase):
         log.trace('ret_val = %s', ret_val)  # pylint: disable=no-member
         return ret_val
 
+    def _queue_return(self, load):
+        '''
+        Hand a job return over to the minion process, which sends the returns
+        of the jobs finishing together to the master in a single request.
+        Return False if the return could not be handed over.
+        '''
+        try:
+            with salt.utils.event.get_event('minion', opts=self.opts, listen=False) as evt:
+                return evt.fire_event({'master': self.opts['master'], 'load': load},
+                                      '__return_batch')
+        except Exception as exc:
+            log.debug('Unable to queue the return of job %s: %s',
+                      load.get('jid'), exc)
+            return False
+
+    def _flush_return_batch(self):
+        '''
+        Send the queued job returns to the master
+        '''
+        if self._return_batch_timeout is not None:
+            self.io_loop.remove_timeout(self._return_batch_timeout)
+            self._return_batch_timeout = None
+        if not self.return_batch:
+            return
+        load = {'cmd': '_return_batch',
+                'id': self.opts['id'],
+                'returns': self.return_batch}
+        self.return_batch = []
+        log.debug('Returning information for %d jobs', len(load['returns']))
+
+        def timeout_handler(*_):
+            log.warning(
+               'The minion failed to return the job information for jobs %s. '
+               'This is often due to the master being shut down or '
+               'overloaded. If the master is running, consider increasing '
+               'the worker_threads value.',
+               ', '.join(six.text_type(ret.get('jid')) for ret in load['returns'])
+            )
+            return True
+
+        with tornado.stack_context.ExceptionStackContext(timeout_handler):
+            self._send_req_async(load, timeout=self._return_retry_timer(), callback=lambda f: None)  # pylint: disable=unexpected-keyword-arg
+
     def _return_pub_multi(self, rets, ret_cmd='_return', timeout=60, sync=True):
         '''
         Return the data from the executed command to the master server
@@ -2217,10 +2449,14 @@ class Minion(MinionBase):
         Refresh the functions and returners.
         '''
         log.debug('Refreshing modules. Notify=%s', notify)
+        salt.loader.clear_virtual_cache(self.opts)
         self.functions, self.returners, _, self.executors = self._load_modules(force_refresh, notify=notify)
 
         self.schedule.functions = self.functions
         self.schedule.returners = self.returners
+        if self.job_pool is not None:
+            # Fork the next workers with the fresh modules
+            self.job_pool.recycle()
 
     def beacons_refresh(self):
         '''
@@ -2631,6 +2867,21 @@ class Minion(MinionBase):
                 )
         self._return_pub(data, ret_cmd='_return', sync=False)
 
+    def _handle_tag_return_batch(self, tag, data):
+        '''
+        Handle a __return_batch event, queuing a job return for the next batch
+        of returns sent to the master
+        '''
+        if data.get('master') != self.opts['master']:
+            # The job came from another master
+            return
+        self.return_batch.append(data['load'])
+        if len(self.return_batch) >= self.opts['return_batch_size']:
+            self._flush_return_batch()
+        elif self._return_batch_timeout is None:
+            self._return_batch_timeout = self.io_loop.call_later(
+                self.opts['return_batch_window'], self._flush_return_batch)
+
     def _handle_tag_salt_error(self, tag, data):
         '''
         Handle a _salt_error event
@@ -2676,6 +2927,7 @@ class Minion(MinionBase):
                          'salt/auth/creds': self._handle_tag_salt_auth_creds,
                          '_salt_error': self._handle_tag_salt_error,
                          '__schedule_return': self._handle_tag_schedule_return,
+                         '__return_batch': self._handle_tag_return_batch,
                          master_event(type='disconnected'): self._handle_tag_master_disconnected_failback,
                          master_event(type='failback'): self._handle_tag_master_disconnected_failback,
                          master_event(type='connected'): self._handle_tag_master_connected,
@@ -2941,6 +3193,9 @@ class Minion(MinionBase):
             return
 
         self._running = False
+        if getattr(self, 'job_pool', None) is not None:
+            self.job_pool.stop()
+            self.job_pool = None
         if hasattr(self, 'schedule'):
             del self.schedule
         if hasattr(self, 'pub_channel') and self.pub_channel is not None:
@@ -44,6 +44,11 @@ RETURN_P = 'return.p'
 OUT_P = 'out.p'
 # endtime is the end time for a job, not stored as msgpack
 ENDTIME = 'endtime'
+# the jids are also listed in an index file per hour, named after the number of
+# hours since the epoch at which they were prepared, so that the old jobs can be
+# found without walking through the job cache. This marker tells that all the
+# jobs of the cache are indexed.
+INDEX_COMPLETE = '.complete'
 
 
 def _job_dir():
@@ -53,6 +58,115 @@ def _job_dir():
     return os.path.join(__opts__['cachedir'], 'jobs')
 
 
+def _index_dir():
+    '''
+    Return the directory of the index of the jids
+    '''
+    return os.path.join(__opts__['cachedir'], 'jobs_index')
+
+
+def _index_jid(jid, ctime=None):
+    '''
+    Add a jid to the index file of the hour it was prepared in. Return False
+    if it could not be indexed.
+    '''
+    if ctime is None:
+        ctime = time.time()
+    index_dir = _index_dir()
+    try:
+        try:
+            os.makedirs(index_dir)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+        index_file = os.path.join(index_dir, six.text_type(int(ctime // 3600)))
+        # Appending a line is atomic, no need to lock the file
+        with salt.utils.files.fopen(index_file, 'a') as ifh:
+            ifh.write(salt.utils.stringutils.to_str(jid + '\n'))
+    except (IOError, OSError) as exc:
+        log.warning(
+            'Could not index job %s, the job cache will be walked through '
+            'to clean it: %s', jid, exc
+        )
+        try:
+            os.remove(os.path.join(index_dir, INDEX_COMPLETE))
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def _index_hours():
+    '''
+    Return the hours of the index files, oldest first, or None if some jobs of
+    the cache are not indexed
+    '''
+    index_dir = _index_dir()
+    if not os.path.isfile(os.path.join(index_dir, INDEX_COMPLETE)):
+        return None
+    hours = []
+    for name in os.listdir(index_dir):
+        try:
+            hours.append(int(name))
+        except ValueError:
+            continue
+    return sorted(hours)
+
+
+def _read_index(hour):
+    '''
+    Return the jids of an index file
+    '''
+    index_file = os.path.join(_index_dir(), six.text_type(hour))
+    try:
+        with salt.utils.files.fopen(index_file, 'r') as ifh:
+            return [salt.utils.stringutils.to_unicode(line).strip()
+                    for line in ifh if line.strip()]
+    except IOError as exc:
+        salt.utils.files.process_read_exception(exc, index_file)
+        return []
+
+
+def _indexed_jobs(hours):
+    '''
+    Yield the jids and loads of the jobs listed in the index files of hours
+    '''
+    serial = salt.payload.Serial(__opts__)
+    seen = set()
+    for hour in hours:
+        for jid in _read_index(hour):
+            if jid in seen:
+                continue
+            seen.add(jid)
+            jid_dir = salt.utils.jid.jid_dir(jid, _job_dir(), __opts__['hash_type'])
+            load_path = os.path.join(jid_dir, LOAD_P)
+            if not os.path.isfile(load_path):
+                continue
+            with salt.utils.files.fopen(load_path, 'rb') as rfh:
+                try:
+                    job = serial.load(rfh)
+                except Exception:
+                    log.exception('Failed to deserialize %s', load_path)
+                    continue
+            if not job:
+                log.error('Deserialization of job succeded but there is no data in %s', load_path)
+                continue
+            yield jid, job
+
+
+def _list_jobs():
+    '''
+    Yield the jids and loads of all the jobs, from the index if it is complete
+    '''
+    hours = _index_hours()
+    if hours is not None:
+        for jid, job in _indexed_jobs(hours):
+            yield jid, job
+    else:
+        for jid, job, _, _ in _walk_through(_job_dir()):
+            yield jid, job
+
+
 def _walk_through(job_dir):
     '''
     Walk though the jid dir and look for jobs
@@ -113,6 +227,8 @@ def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
             time.sleep(0.1)
             if passed_jid is None:
                 return prep_jid(nocache=nocache, recurse_count=recurse_count+1)
+        else:
+            _index_jid(jid)
 
     try:
         with salt.utils.files.fopen(os.path.join(jid_dir, 'jid'), 'wb+') as fn_:
@@ -206,6 +322,7 @@ def save_load(jid, clear_load, minions=None, recurse_count=0):
     try:
         if not os.path.exists(jid_dir):
             os.makedirs(jid_dir)
+            _index_jid(jid)
     except OSError as exc:
         if exc.errno == errno.EEXIST:
             # rarely, the directory can be already concurrently created between
@@ -258,6 +375,7 @@ def save_minions(jid, minions, syndic_id=None):
     try:
         if not os.path.exists(jid_dir):
             os.makedirs(jid_dir)
+            _index_jid(jid)
     except OSError as exc:
         if exc.errno == errno.EEXIST:
             # rarely, the directory can be already concurrently created between
@@ -376,7 +494,7 @@ def get_jids():
     Return a dict mapping all job ids to job information
     '''
     ret = {}
-    for jid, job, _, _ in _walk_through(_job_dir()):
+    for jid, job in _list_jobs():
         ret[jid] = salt.utils.jid.format_jid_instance(jid, job)
 
         if __opts__.get('job_cache_store_endtime'):
@@ -393,6 +511,22 @@ def get_jids_filter(count, filter_find_job=True):
     :param int count: show not more than the count of most recent jobs
     :param bool filter_find_jobs: filter out 'saltutil.find_job' jobs
     '''
+    hours = _index_hours()
+    if hours is not None:
+        # Read the index files from the most recent one, until they list
+        # enough jobs
+        jobs = []
+        for hour in reversed(hours):
+            for jid, job in _indexed_jobs([hour]):
+                job = salt.utils.jid.format_jid_instance_ext(jid, job)
+                if filter_find_job and job['Function'] == 'saltutil.find_job':
+                    continue
+                jobs.append(job)
+            if len(jobs) >= count:
+                break
+        jobs.sort(key=lambda job: job['JID'])
+        return jobs[-count:] if count else []
+
     keys = []
     ret = []
     for jid, job, _, _ in _walk_through(_job_dir()):
@@ -420,50 +554,106 @@ def clean_old_jobs():
         if not os.path.exists(jid_root):
             return
 
-        # Keep track of any empty t_path dirs that need to be removed later
-        dirs_to_remove = set()
+        hours = _index_hours()
+        if hours is None:
+            _walk_through_clean_old_jobs(jid_root)
+            return
+
+        # Drop the index files whose jobs are all old enough
+        horizon = time.time() - __opts__['keep_jobs'] * 3600
+        for hour in hours:
+            if (hour + 1) * 3600 > horizon:
+                break
+            for jid in _read_index(hour):
+                f_path = salt.utils.jid.jid_dir(jid, jid_root, __opts__['hash_type'])
+                if os.path.exists(f_path):
+                    try:
+                        shutil.rmtree(f_path)
+                    except OSError as err:
+                        log.error('Unable to remove %s: %s', f_path, err)
+            try:
+                os.remove(os.path.join(_index_dir(), six.text_type(hour)))
+            except OSError as err:
+                log.error('Unable to remove the job index of hour %s: %s', hour, err)
 
+        # Remove the empty JID dirs which are old enough, rmdir fails on the
+        # others without having to list them
         for top in os.listdir(jid_root):
             t_path = os.path.join(jid_root, top)
+            try:
+                if os.stat(t_path).st_ctime < horizon:
+                    os.rmdir(t_path)
+            except OSError:
+                pass
 
-            if not os.path.exists(t_path):
-                continue
 
-            # Check if there are any stray/empty JID t_path dirs
-            t_path_dirs = os.listdir(t_path)
-            if not t_path_dirs and t_path not in dirs_to_remove:
-                dirs_to_remove.add(t_path)
-                continue
+def _walk_through_clean_old_jobs(jid_root):
+    '''
+    Clean out the old jobs from the job cache by walking through it, and index
+    the jobs which are kept so that the next cleanups can use the index
+    '''
+    indexed = True
 
-            for final in t_path_dirs:
-                f_path = os.path.join(t_path, final)
-                jid_file = os.path.join(f_path, 'jid')
-                if not os.path.isfile(jid_file) and os.path.exists(f_path):
-                    # No jid file means corrupted cache entry, scrub it
-                    # by removing the entire f_path directory
-                    shutil.rmtree(f_path)
-                elif os.path.isfile(jid_file):
-                    jid_ctime = os.stat(jid_file).st_ctime
-                    hours_difference = (time.time() - jid_ctime) / 3600.0
-                    if hours_difference > __opts__['keep_jobs'] and os.path.exists(t_path):
-                        # Remove the entire f_path from the original JID dir
-                        try:
-                            shutil.rmtree(f_path)
-                        except OSError as err:
-                            log.error('Unable to remove %s: %s', f_path, err)
-
-        # Remove empty JID dirs from job cache, if they're old enough.
-        # JID dirs may be empty either from a previous cache-clean with the bug
-        # Listed in #29286 still present, or the JID dir was only recently made
-        # And the jid file hasn't been created yet.
-        if dirs_to_remove:
-            for t_path in dirs_to_remove:
-                # Checking the time again prevents a possible race condition where
-                # t_path JID dirs were created, but not yet populated by a jid file.
-                t_path_ctime = os.stat(t_path).st_ctime
-                hours_difference = (time.time() - t_path_ctime) / 3600.0
-                if hours_difference > __opts__['keep_jobs']:
-                    shutil.rmtree(t_path)
+    # Keep track of any empty t_path dirs that need to be removed later
+    dirs_to_remove = set()
+
+    for top in os.listdir(jid_root):
+        t_path = os.path.join(jid_root, top)
+
+        if not os.path.exists(t_path):
+            continue
+
+        # Check if there are any stray/empty JID t_path dirs
+        t_path_dirs = os.listdir(t_path)
+        if not t_path_dirs and t_path not in dirs_to_remove:
+            dirs_to_remove.add(t_path)
+            continue
+
+        for final in t_path_dirs:
+            f_path = os.path.join(t_path, final)
+            jid_file = os.path.join(f_path, 'jid')
+            if not os.path.isfile(jid_file) and os.path.exists(f_path):
+                # No jid file means corrupted cache entry, scrub it
+                # by removing the entire f_path directory
+                shutil.rmtree(f_path)
+            elif os.path.isfile(jid_file):
+                jid_ctime = os.stat(jid_file).st_ctime
+                hours_difference = (time.time() - jid_ctime) / 3600.0
+                if hours_difference > __opts__['keep_jobs'] and os.path.exists(t_path):
+                    # Remove the entire f_path from the original JID dir
+                    try:
+                        shutil.rmtree(f_path)
+                    except OSError as err:
+                        log.error('Unable to remove %s: %s', f_path, err)
+                elif indexed:
+                    try:
+                        with salt.utils.files.fopen(jid_file, 'rb') as jfh:
+                            jid = salt.utils.stringutils.to_unicode(jfh.read()).strip()
+                    except IOError:
+                        indexed = False
+                    else:
+                        indexed = _index_jid(jid, jid_ctime)
+
+    # Remove empty JID dirs from job cache, if they're old enough.
+    # JID dirs may be empty either from a previous cache-clean with the bug
+    # Listed in #29286 still present, or the JID dir was only recently made
+    # And the jid file hasn't been created yet.
+    if dirs_to_remove:
+        for t_path in dirs_to_remove:
+            # Checking the time again prevents a possible race condition where
+            # t_path JID dirs were created, but not yet populated by a jid file.
+            t_path_ctime = os.stat(t_path).st_ctime
+            hours_difference = (time.time() - t_path_ctime) / 3600.0
+            if hours_difference > __opts__['keep_jobs']:
+                shutil.rmtree(t_path)
+
+    if indexed:
+        # The jobs prepared since the walk started were indexed when prepared
+        try:
+            with salt.utils.files.fopen(os.path.join(_index_dir(), INDEX_COMPLETE), 'w'):
+                pass
+        except (IOError, OSError) as exc:
+            log.warning('Could not mark the job index complete: %s', exc)
 
 
 def update_endtime(jid, time):
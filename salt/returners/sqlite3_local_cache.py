@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+'''
+Keep the master job cache in a SQLite database, instead of the directories
+of the default :mod:`local_cache <salt.returners.local_cache>`.
+
+.. versionadded:: Neon
+
+The default job cache creates a directory and writes several files for each
+return, which makes for a lot of filesystem metadata operations on masters
+receiving many returns. This job cache stores the jobs and their returns in
+the rows of a single database, looked up by their jid, and uses the write
+ahead log of SQLite so that the writes of the master workers are synced to
+the disk in batches, when the log is checkpointed.
+
+:depends:       sqlite3
+:platform:      all
+
+To use it as the master job cache, set the following in the master config:
+
+.. code-block:: yaml
+
+    master_job_cache: sqlite3_local_cache
+
+The database is kept in ``jobs.sqlite3`` under the ``cachedir`` of the
+master. The number of hours the jobs are kept is set by the ``keep_jobs``
+option, as for the default job cache.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import logging
+import os
+import threading
+import time
+
+# Import salt libs
+import salt.payload
+import salt.utils.jid
+import salt.utils.minions
+import salt.exceptions
+
+# Import third party libs
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+
+log = logging.getLogger(__name__)
+
+__virtualname__ = 'sqlite3_local_cache'
+
+# The open connections, by process, thread and database path. The connections
+# must not be shared by threads, nor by forked processes.
+_CONNECTIONS = {}
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS jids ('
+    ' jid TEXT PRIMARY KEY,'
+    ' load BLOB,'
+    ' nocache INTEGER NOT NULL DEFAULT 0,'
+    ' endtime TEXT,'
+    ' created REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS jids_created ON jids (created)',
+    'CREATE TABLE IF NOT EXISTS minions ('
+    ' jid TEXT NOT NULL,'
+    ' syndic_id TEXT NOT NULL,'
+    ' minions BLOB NOT NULL,'
+    ' PRIMARY KEY (jid, syndic_id))',
+    'CREATE TABLE IF NOT EXISTS returns ('
+    ' jid TEXT NOT NULL,'
+    ' id TEXT NOT NULL,'
+    ' ret BLOB NOT NULL,'
+    ' out BLOB,'
+    ' PRIMARY KEY (jid, id))',
+)
+
+
+def __virtual__():
+    if not HAS_SQLITE3:
+        return (False, 'Could not import sqlite3; sqlite3_local_cache disabled')
+    return __virtualname__
+
+
+def _db_path():
+    '''
+    Return the path of the job cache database
+    '''
+    return os.path.join(__opts__['cachedir'], 'jobs.sqlite3')
+
+
+def _get_conn():
+    '''
+    Return the connection to the job cache database of this process
+    '''
+    path = _db_path()
+    key = (os.getpid(), threading.current_thread().ident, path)
+    conn = _CONNECTIONS.get(key)
+    if conn is not None:
+        return conn
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # Created concurrently
+            pass
+    try:
+        # The master workers all write to the database, wait for each other
+        conn = sqlite3.connect(path, timeout=60)
+        # Only the checkpoints of the write ahead log are synced to the disk
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+    except sqlite3.Error as exc:
+        raise salt.exceptions.SaltCacheError(
+            'Unable to open the job cache database {0}: {1}'.format(path, exc)
+        )
+    _CONNECTIONS[key] = conn
+    return conn
+
+
+def _dumps(data):
+    return sqlite3.Binary(salt.payload.Serial(__opts__).dumps(data))
+
+
+def _loads(data):
+    return salt.payload.Serial(__opts__).loads(bytes(data))
+
+
+def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
+    '''
+    Return a job id and register it in the job cache.
+
+    Generated jids are retried until they don't collide with an existing job.
+    '''
+    if recurse_count >= 5:
+        err = 'prep_jid could not store a jid after {0} tries.'.format(recurse_count)
+        log.error(err)
+        raise salt.exceptions.SaltCacheError(err)
+    if passed_jid is None:  # this can be a None or an empty string.
+        jid = salt.utils.jid.gen_jid(__opts__)
+    else:
+        jid = passed_jid
+
+    conn = _get_conn()
+    with conn:
+        cur = conn.execute(
+            'INSERT OR IGNORE INTO jids (jid, nocache, created) VALUES (?, ?, ?)',
+            (jid, int(bool(nocache)), time.time())
+        )
+        if not cur.rowcount:
+            if passed_jid is None:
+                # Someone else is using this jid
+                return prep_jid(nocache=nocache, recurse_count=recurse_count + 1)
+            if nocache:
+                conn.execute('UPDATE jids SET nocache = 1 WHERE jid = ?', (jid,))
+    return jid
+
+
+def returner(load):
+    '''
+    Return data to the job cache
+    '''
+    # if a minion is returning a standalone job, get a jobid
+    if load['jid'] == 'req':
+        load['jid'] = prep_jid(nocache=load.get('nocache', False))
+
+    conn = _get_conn()
+    row = conn.execute(
+        'SELECT nocache FROM jids WHERE jid = ?', (load['jid'],)
+    ).fetchone()
+    if row is None:
+        log.error(
+            'An inconsistency occurred, a job was received with a job id '
+            '(%s) that is not present in the local cache', load['jid']
+        )
+        return False
+    if row[0]:
+        return
+
+    ret = dict((key, load[key]) for key in ['return', 'retcode', 'success'] if key in load)
+    try:
+        with conn:
+            conn.execute(
+                'INSERT INTO returns (jid, id, ret, out) VALUES (?, ?, ?, ?)',
+                (load['jid'],
+                 load['id'],
+                 _dumps(ret),
+                 _dumps(load['out']) if 'out' in load else None)
+            )
+    except sqlite3.IntegrityError:
+        # Minion has already returned this jid and it should be dropped
+        log.error(
+            'An extra return was detected from minion %s, please verify '
+            'the minion, this could be a replay attack', load['id']
+        )
+        return False
+
+
+def save_load(jid, clear_load, minions=None):
+    '''
+    Save the load to the specified jid
+
+    minions argument is to provide a pre-computed list of matched minions for
+    the job, for cases when this function can't compute that list itself (such
+    as for salt-ssh)
+    '''
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            'INSERT OR IGNORE INTO jids (jid, created) VALUES (?, ?)',
+            (jid, time.time())
+        )
+        conn.execute(
+            'UPDATE jids SET load = ? WHERE jid = ?',
+            (_dumps(clear_load), jid)
+        )
+
+    # if you have a tgt, save that for the UI etc
+    if 'tgt' in clear_load and clear_load['tgt'] != '':
+        if minions is None:
+            ckminions = salt.utils.minions.CkMinions(__opts__)
+            # Retrieve the minions list
+            _res = ckminions.check_minions(
+                    clear_load['tgt'],
+                    clear_load.get('tgt_type', 'glob')
+                    )
+            minions = _res['minions']
+        # save the minions to a cache so we can see in the UI
+        save_minions(jid, minions)
+
+
+def save_minions(jid, minions, syndic_id=None):
+    '''
+    Save/update the list of minions for a given job
+    '''
+    # Ensure we have a list for Python 3 compatability
+    minions = list(minions)
+
+    log.debug(
+        'Adding minions for job %s%s: %s',
+        jid,
+        ' from syndic master \'{0}\''.format(syndic_id) if syndic_id else '',
+        minions
+    )
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO minions (jid, syndic_id, minions) '
+            'VALUES (?, ?, ?)',
+            (jid, syndic_id or '', _dumps(minions))
+        )
+
+
+def get_load(jid):
+    '''
+    Return the load data that marks a specified jid
+    '''
+    conn = _get_conn()
+    row = conn.execute('SELECT load FROM jids WHERE jid = ?', (jid,)).fetchone()
+    if row is None or row[0] is None:
+        return {}
+    ret = _loads(row[0]) or {}
+
+    all_minions = set()
+    for minions, in conn.execute('SELECT minions FROM minions WHERE jid = ?', (jid,)):
+        all_minions.update(_loads(minions))
+    if all_minions:
+        ret['Minions'] = sorted(all_minions)
+
+    return ret
+
+
+def get_jid(jid):
+    '''
+    Return the information returned when the specified job id was executed
+    '''
+    ret = {}
+    cur = _get_conn().execute(
+        'SELECT id, ret, out FROM returns WHERE jid = ?', (jid,)
+    )
+    for minion_id, ret_data, out in cur:
+        ret[minion_id] = _loads(ret_data)
+        if out is not None:
+            ret[minion_id]['out'] = _loads(out)
+    return ret
+
+
+def _iter_jobs(order=''):
+    '''
+    Yield the jids and loads of the jobs
+    '''
+    cur = _get_conn().execute(
+        'SELECT jid, load, endtime FROM jids WHERE load IS NOT NULL ' + order
+    )
+    for jid, load, endtime in cur:
+        try:
+            job = _loads(load)
+        except Exception:
+            log.exception('Failed to deserialize the load of job %s', jid)
+            continue
+        if not job:
+            continue
+        yield jid, job, endtime
+
+
+def get_jids():
+    '''
+    Return a dict mapping all job ids to job information
+    '''
+    ret = {}
+    for jid, job, endtime in _iter_jobs():
+        ret[jid] = salt.utils.jid.format_jid_instance(jid, job)
+
+        if __opts__.get('job_cache_store_endtime') and endtime:
+            ret[jid]['EndTime'] = endtime
+
+    return ret
+
+
+def get_jids_filter(count, filter_find_job=True):
+    '''
+    Return a list of all jobs information filtered by the given criteria.
+    :param int count: show not more than the count of most recent jobs
+    :param bool filter_find_jobs: filter out 'saltutil.find_job' jobs
+    '''
+    ret = []
+    for jid, job, _ in _iter_jobs('ORDER BY jid DESC'):
+        if len(ret) >= count:
+            break
+        job = salt.utils.jid.format_jid_instance_ext(jid, job)
+        if filter_find_job and job['Function'] == 'saltutil.find_job':
+            continue
+        ret.append(job)
+    ret.reverse()
+    return ret
+
+
+def clean_old_jobs():
+    '''
+    Clean out the old jobs from the job cache
+    '''
+    if __opts__['keep_jobs'] == 0:
+        return
+    if not os.path.exists(_db_path()):
+        return
+    cutoff = time.time() - __opts__['keep_jobs'] * 3600
+    conn = _get_conn()
+    with conn:
+        old_jids = 'SELECT jid FROM jids WHERE created < ?'
+        conn.execute(
+            'DELETE FROM returns WHERE jid IN ({0})'.format(old_jids), (cutoff,))
+        conn.execute(
+            'DELETE FROM minions WHERE jid IN ({0})'.format(old_jids), (cutoff,))
+        conn.execute('DELETE FROM jids WHERE created < ?', (cutoff,))
+    # Keep the write ahead log from growing
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def update_endtime(jid, time):
+    '''
+    Update (or store) the end time for a given job
+    '''
+    conn = _get_conn()
+    with conn:
+        conn.execute('UPDATE jids SET endtime = ? WHERE jid = ?', (time, jid))
+
+
+def get_endtime(jid):
+    '''
+    Retrieve the stored endtime for a given job
+
+    Returns False if no endtime is present
+    '''
+    row = _get_conn().execute(
+        'SELECT endtime FROM jids WHERE jid = ?', (jid,)
+    ).fetchone()
+    if row is None or row[0] is None:
+        return False
+    return row[0]
@@ -26,6 +26,8 @@ import re
 import time
 import random
 import collections
+import threading
+from multiprocessing.pool import ThreadPool
 
 # Import salt libs
 import salt.loader
@@ -41,6 +43,7 @@ import salt.utils.event
 import salt.utils.files
 import salt.utils.hashutils
 import salt.utils.immutabletypes as immutabletypes
+import salt.utils.json
 import salt.utils.msgpack as msgpack
 import salt.utils.platform
 import salt.utils.process
@@ -133,6 +136,56 @@ STATE_RUNTIME_KEYWORDS = frozenset([
 
 STATE_INTERNAL_KEYWORDS = STATE_REQUISITE_KEYWORDS.union(STATE_REQUISITE_IN_KEYWORDS).union(STATE_RUNTIME_KEYWORDS)
 
+# Whether fnmatch compares the strings without glob characters as they are
+_FNMATCH_CASE = os.path.normcase('A/b') == 'A/b'
+_GLOB_MAGIC = re.compile(r'[*?[]')
+
+# The requisites ordering a chunk after others, in the order call_chunk runs
+# the chunks they refer to. A prereq runs before the chunks it refers to, these
+# refer back to it with prerequired.
+_ORDER_REQUISITES = (
+    'require',
+    'require_any',
+    'watch',
+    'watch_any',
+    'onfail',
+    'onfail_any',
+    'onfail_all',
+    'onchanges',
+    'onchanges_any',
+    'prerequired',
+)
+
+# The renderers rendering an SLS file without side effects on the rendering
+# of the other SLS files, which _prerender_states can run in threads
+_PRERENDER_RENDERERS = frozenset([
+    'cheetah',
+    'genshi',
+    'gpg',
+    'hjson',
+    'jinja',
+    'json',
+    'json5',
+    'mako',
+    'msgpack',
+    'nacl',
+    'wempy',
+    'yaml',
+    'yamlex',
+])
+
+# The chunk arguments which make the chunk wait for all the chunks running
+# concurrently, and be run before the next ones are started
+_CONCURRENCY_BARRIERS = (
+    'prereq',
+    'prerequired',
+    '__prereq__',
+    'reload_modules',
+    'reload_pillar',
+    'reload_grains',
+    'force_reload_modules',
+)
+
 
 def _odict_hashable(self):
     return id(self)
@@ -232,15 +285,19 @@ def state_args(id_, state, high):
     return args
 
 
-def find_name(name, state, high):
+def find_name(name, state, high, index=None):
     '''
     Scan high data for the id referencing the given name and return a list of (IDs, state) tuples that match
 
     Note: if `state` is sls, then we are looking for all IDs that match the given SLS
+
+    If a HighIndex of the high data is passed, it is looked up instead.
     '''
     ext_id = []
     if name in high:
         ext_id.append((name, state))
+    elif index is not None:
+        ext_id.extend(index.find_name(name, state))
     # if we are requiring an entire SLS, then we need to add ourselves to everything in that SLS
     elif state == 'sls':
         for nid, item in six.iteritems(high):
@@ -262,10 +319,14 @@ def find_name(name, state, high):
     return ext_id
 
 
-def find_sls_ids(sls, high):
+def find_sls_ids(sls, high, index=None):
     '''
     Scan for all ids in the given sls and return them in a dict; {name: state}
+
+    If a HighIndex of the high data is passed, it is looked up instead.
     '''
+    if index is not None:
+        return list(index.sls_ids.get(sls, ()))
     ret = []
     for nid, item in six.iteritems(high):
         try:
@@ -286,6 +347,200 @@ def find_sls_ids(sls, high):
     return ret
 
 
+class HighIndex(object):
+    '''
+    Index the high data by SLS and by the values of the state arguments, for
+    requisite_in to look the requisites up with the same results as
+    find_name and find_sls_ids, instead of scanning the high data for each.
+    '''
+    def __init__(self, high):
+        # (state, argument value) -> the IDs, once for each matching argument
+        self.args = {}
+        # SLS -> the (ID, first key) and the (ID, state) tuples of its IDs
+        self.sls = {}
+        self.sls_ids = {}
+        for nid, item in six.iteritems(high):
+            if not isinstance(item, dict):
+                continue
+            if '__sls__' in item:
+                self.sls.setdefault(item['__sls__'], []).append((nid, next(iter(item))))
+                self.sls_ids.setdefault(item['__sls__'], []).extend(
+                    (nid, st_) for st_ in item if not st_.startswith('__'))
+            for state, args in six.iteritems(item):
+                if not isinstance(args, list):
+                    continue
+                for arg in args:
+                    if not isinstance(arg, dict) or len(arg) != 1:
+                        continue
+                    try:
+                        self.args.setdefault((state, arg[next(iter(arg))]), []).append(nid)
+                    except TypeError:
+                        # Unhashable, can't be a name
+                        pass
+
+    def find_name(self, name, state):
+        '''
+        Return the (ID, state) tuples find_name returns for a name which is
+        not an ID
+        '''
+        if state == 'sls':
+            return list(self.sls.get(name, ()))
+        try:
+            return [(nid, state) for nid in self.args.get((state, name), ())]
+        except TypeError:
+            return []
+
+
+class ChunkIndex(object):
+    '''
+    Index the low chunks of a run by their ID, name and SLS, for the
+    requisites to find the chunks they refer to without scanning all the
+    chunks. Glob patterns are matched against the distinct IDs, names and
+    SLS of the chunks, once per pattern.
+    '''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.size = len(chunks)
+        self.fields = {'__id__': {}, 'name': {}, '__sls__': {}}
+        for pos, chunk in enumerate(chunks):
+            for field, index in six.iteritems(self.fields):
+                try:
+                    index.setdefault(chunk[field], []).append(pos)
+                except (KeyError, TypeError):
+                    # Missing or unhashable, nothing refers to it
+                    pass
+        self.globs = {}
+
+    def _match(self, field, pattern):
+        '''
+        Return the positions of the chunks whose field matches a glob, in
+        order
+        '''
+        index = self.fields[field]
+        if _FNMATCH_CASE and not _GLOB_MAGIC.search(pattern):
+            return index.get(pattern, ())
+        key = (field, pattern)
+        if key not in self.globs:
+            self.globs[key] = sorted(
+                pos for value, positions in six.iteritems(index)
+                if isinstance(value, six.string_types) and fnmatch.fnmatch(value, pattern)
+                for pos in positions)
+        return self.globs[key]
+
+    def find(self, req_key, req_val):
+        '''
+        Return the chunks a requisite refers to, in the order of the run
+        '''
+        if req_key == 'sls':
+            # Allow requisite tracking of entire sls files
+            return [self.chunks[pos] for pos in self._match('__sls__', req_val)]
+        positions = set(self._match('__id__', req_val))
+        positions.update(self._match('name', req_val))
+        return [self.chunks[pos] for pos in sorted(positions)
+                if req_key == 'id' or self.chunks[pos]['state'] == req_key]
+
+    def first(self, value):
+        '''
+        Return the first chunk with the given ID or name, or None
+        '''
+        positions = []
+        for field in ('__id__', 'name'):
+            try:
+                positions.extend(self.fields[field].get(value, ())[:1])
+            except TypeError:
+                return None
+        if not positions:
+            return None
+        return self.chunks[min(positions)]
+
+
+class ThreadFileClients(object):
+    '''
+    Hand each thread of a pool a file client of its own, as the file clients
+    can't be used by several threads at once. The given clients are handed
+    out first, and new_client is called for the other threads. All the
+    clients are destroyed on close.
+    '''
+    def __init__(self, new_client, clients=()):
+        self.new_client = new_client
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.idle = list(clients)
+        self.clients = list(clients)
+
+    def get(self):
+        '''
+        Return the file client of the current thread
+        '''
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            with self.lock:
+                client = self.idle.pop() if self.idle else None
+            if client is None:
+                client = self.new_client()
+                with self.lock:
+                    self.clients.append(client)
+            self.local.client = client
+        return client
+
+    def close(self):
+        '''
+        Destroy the file clients
+        '''
+        for client in self.clients:
+            if hasattr(client, 'destroy'):
+                client.destroy()
+        self.clients = self.idle = []
+
+
+def lowstate_file_refs(chunks, extras=''):
+    '''
+    Create a list of file ref objects to reconcile
+    '''
+    refs = {}
+    for chunk in chunks:
+        if not isinstance(chunk, dict):
+            continue
+        saltenv = 'base'
+        crefs = []
+        for state in chunk:
+            if state == '__env__':
+                saltenv = chunk[state]
+            elif state.startswith('__'):
+                continue
+            crefs.extend(salt_refs(chunk[state]))
+        if saltenv not in refs:
+            refs[saltenv] = []
+        if crefs:
+            refs[saltenv].append(crefs)
+    if extras:
+        extra_refs = extras.split(',')
+        if extra_refs:
+            for env in refs:
+                for x in extra_refs:
+                    refs[env].append([x])
+    return refs
+
+
+def salt_refs(data, ret=None):
+    '''
+    Pull salt file references out of the states
+    '''
+    proto = 'salt://'
+    if ret is None:
+        ret = []
+    if isinstance(data, six.string_types):
+        if data.startswith(proto) and data not in ret:
+            ret.append(data)
+    if isinstance(data, list):
+        for comp in data:
+            salt_refs(comp, ret)
+    if isinstance(data, dict):
+        for comp in data:
+            salt_refs(data[comp], ret)
+    return ret
+
+
 def format_log(ret):
     '''
     Format the state into a log message
@@ -758,6 +1013,7 @@ class State(object):
         self.active = set()
         self.mod_init = set()
         self.pre = {}
+        self._chunk_index = None
         self.__run_num = 0
         self.jid = jid
         self.instance_id = six.text_type(id(self))
@@ -1047,6 +1303,8 @@ class State(object):
         Refresh all the modules
         '''
         log.debug('Refreshing modules...')
+        # The dependencies of the modules may have been installed
+        salt.loader.clear_virtual_cache(self.opts)
         if self.opts['grains'].get('os') != 'MacOS':
             # In case a package has been installed into the current python
             # process 'site-packages', the 'site' module needs to be reloaded in
@@ -1578,6 +1836,7 @@ class State(object):
         disabled_reqs = self.opts.get('disabled_requisites', [])
         if not isinstance(disabled_reqs, list):
             disabled_reqs = [disabled_reqs]
+        index = HighIndex(high)
         for id_, body in six.iteritems(high):
             if not isinstance(body, dict):
                 continue
@@ -1672,7 +1931,7 @@ class State(object):
                                 pname = ind[pstate]
                                 if pstate == 'sls':
                                     # Expand hinges here
-                                    hinges = find_sls_ids(pname, high)
+                                    hinges = find_sls_ids(pname, high, index)
                                 else:
                                     hinges.append((pname, pstate))
                                 if '.' in pstate:
@@ -1702,7 +1961,7 @@ class State(object):
                                                 )
                                     if key == 'prereq':
                                         # Add prerequired to prereqs
-                                        ext_ids = find_name(name, _state, high)
+                                        ext_ids = find_name(name, _state, high, index)
                                         for ext_id, _req_state in ext_ids:
                                             if ext_id not in extend:
                                                 extend[ext_id] = OrderedDict()
@@ -1715,7 +1974,7 @@ class State(object):
                                     if key == 'use_in':
                                         # Add the running states args to the
                                         # use_in states
-                                        ext_ids = find_name(name, _state, high)
+                                        ext_ids = find_name(name, _state, high, index)
                                         for ext_id, _req_state in ext_ids:
                                             if not ext_id:
                                                 continue
@@ -1742,7 +2001,7 @@ class State(object):
                                     if key == 'use':
                                         # Add the use state's args to the
                                         # running state
-                                        ext_ids = find_name(name, _state, high)
+                                        ext_ids = find_name(name, _state, high, index)
                                         for ext_id, _req_state in ext_ids:
                                             if not ext_id:
                                                 continue
@@ -1804,6 +2063,7 @@ class State(object):
 
         tag = _gen_tag(low)
         try:
+            self.format_slots(cdata)
             ret = self.states[cdata['full']](*cdata['args'],
                                              **cdata['kwargs'])
         except Exception as exc:
@@ -2253,6 +2513,66 @@ class State(object):
             validated_retry_data = retry_defaults
         return validated_retry_data
 
+    def prefetch_files(self, chunks, workers):
+        '''
+        Cache the salt:// files referenced by the chunks before they are
+        called. The hashes of the files are requested at once for each
+        saltenv, and the files missing from the cache or changed are then
+        downloaded by a pool of threads.
+        '''
+        paths = {}
+        for saltenv, crefs in six.iteritems(lowstate_file_refs(chunks)):
+            for refs in crefs:
+                for ref in refs:
+                    path, senv = salt.utils.url.parse(ref)
+                    if not path:
+                        continue
+                    paths.setdefault(senv or saltenv, set()).add(
+                        salt.utils.url.create(path))
+        if not paths:
+            return
+
+        client = salt.fileclient.get_file_client(self.opts)
+        clients = ThreadFileClients(
+            lambda: salt.fileclient.get_file_client(self.opts), [client])
+        try:
+            stale = []
+            for saltenv, env_paths in six.iteritems(paths):
+                try:
+                    hashes = client.hash_files(sorted(env_paths), saltenv)
+                except Exception as exc:
+                    log.debug('Unable to get the hashes of the files of '
+                              'saltenv %s: %s', saltenv, exc)
+                    continue
+                for path, hsum in six.iteritems(hashes):
+                    dest = client.is_cached(path, saltenv)
+                    if dest and hsum.get('hash_type') and \
+                            salt.utils.hashutils.get_hash(
+                                dest, hsum['hash_type']) == hsum.get('hsum'):
+                        continue
+                    stale.append((path, saltenv))
+            if not stale:
+                return
+
+            def _fetch(args):
+                path, saltenv = args
+                try:
+                    clients.get().cache_file(path, saltenv)
+                except Exception as exc:
+                    # The state fetches the file again when it runs
+                    log.debug('Unable to prefetch %s from saltenv %s: %s',
+                              path, saltenv, exc)
+
+            log.debug('Prefetching %d files with %d threads', len(stale), workers)
+            pool = ThreadPool(min(workers, len(stale)))
+            try:
+                pool.map(_fetch, stale)
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            clients.close()
+
     def call_chunks(self, chunks):
         '''
         Iterate over a list of chunks and call them, checking for requires.
@@ -2280,6 +2600,13 @@ class State(object):
                         self.__run_num += 1
                         chunks.remove(low)
                         break
+        # Look the requisites of the chunks up in an index of them
+        self._requisite_index(chunks)
+        concurrency = self.opts.get('state_concurrency', 0)
+        if concurrency > 1 and self.jid:
+            # The results of the concurrent chunks are kept under the jid
+            running = self.call_chunks_concurrently(chunks, concurrency)
+            return dict(list(disabled.items()) + list(running.items()))
         running = {}
         for low in chunks:
             if '__FAILHARD__' in running:
@@ -2302,6 +2629,171 @@ class State(object):
         ret = dict(list(disabled.items()) + list(running.items()))
         return ret
 
+    def call_chunks_concurrently(self, chunks, concurrency):
+        '''
+        Call the chunks as soon as the chunks they require are done, each in
+        its own process, running up to ``concurrency`` of them at once. The
+        results are numbered in the order call_chunks would run the chunks.
+        '''
+        index = self._requisite_index(chunks)
+        disabled_reqs = self.opts.get('disabled_requisites', [])
+        if not isinstance(disabled_reqs, list):
+            disabled_reqs = [disabled_reqs]
+        agg_opt = self.functions['config.option']('state_aggregate')
+        deps = {}
+        for low in chunks:
+            deps[_gen_tag(low)] = self._chunk_requisites(low, index, disabled_reqs)
+        run_num_start = self.__run_num
+        running = {}
+        # The chunks running in their own process, by tag
+        procs = {}
+        pending = list(chunks)
+        stop = False
+        while pending or procs:
+            self.reconcile_procs(running)
+            for tag in [tag for tag in procs if 'proc' not in running[tag]]:
+                low = procs.pop(tag)
+                # The modules to refresh are those of this process
+                self.check_refresh(low, running[tag])
+            if stop:
+                pending = []
+            in_flight = len([ret for ret in six.itervalues(running) if 'proc' in ret])
+            progress = False
+            for low in list(pending):
+                tag = _gen_tag(low)
+                if tag in running:
+                    # Run as the requisite of a previous chunk
+                    pending.remove(low)
+                    continue
+                barrier = self._chunk_is_barrier(low, agg_opt)
+                if barrier:
+                    if in_flight or low is not pending[0]:
+                        break
+                elif in_flight >= concurrency:
+                    break
+                elif any(dep not in running or dep in procs or 'proc' in running[dep]
+                         for dep in deps[tag]):
+                    continue
+                pending.remove(low)
+                action = self.check_pause(low)
+                if action == 'kill':
+                    stop = True
+                    break
+                if barrier or not low.get('parallel', True) or low.get('retry') \
+                        or low.get('watch') or low.get('watch_any'):
+                    # Run here, the state run needs the changes to go on
+                    running = self.call_chunk(low, running, chunks)
+                else:
+                    running = self.call_chunk(dict(low, parallel=True), running, chunks)
+                    if 'proc' in running.get(tag, {}):
+                        procs[tag] = low
+                        in_flight += 1
+                self.active = set()
+                progress = True
+                if running.pop('__FAILHARD__', False) or self.check_failhard(low, running):
+                    stop = True
+                    break
+                if barrier:
+                    break
+            if not progress:
+                if pending and not in_flight:
+                    # The requisites can't be met in order, let call_chunk
+                    # report them
+                    low = pending.pop(0)
+                    if _gen_tag(low) not in running:
+                        running = self.call_chunk(low, running, chunks)
+                        self.active = set()
+                        if running.pop('__FAILHARD__', False) or self.check_failhard(low, running):
+                            stop = True
+                else:
+                    time.sleep(0.01)
+        while True:
+            if self.reconcile_procs(running):
+                break
+            time.sleep(0.01)
+        # Number the results in the order the chunks would be run in, from
+        # the first number of this run
+        order = self._chunk_run_order(chunks, deps)
+        tags = [tag for tag in running if '__run_num__' in running[tag]]
+        tags.sort(key=lambda tag: (order.get(tag, len(order)), running[tag]['__run_num__']))
+        for run_num, tag in enumerate(tags, run_num_start):
+            running[tag]['__run_num__'] = run_num
+        return running
+
+    def _chunk_is_barrier(self, low, agg_opt):
+        '''
+        Return True if the chunk must be run alone, after the chunks before it
+        are done and before the chunks after it are started
+        '''
+        if any(low.get(key) for key in _CONCURRENCY_BARRIERS):
+            return True
+        if low.get('failhard', self.opts['failhard']):
+            return True
+        agg_opt = low.get('aggregate', agg_opt)
+        if agg_opt is True or (isinstance(agg_opt, list) and low['state'] in agg_opt):
+            return '{0}.mod_aggregate'.format(low['state']) in self.states
+        return False
+
+    @staticmethod
+    def _chunk_requisites(low, index, disabled_reqs):
+        '''
+        Return the tags of the chunks the chunk must be run after, in the order
+        call_chunk would run them
+        '''
+        tags = []
+        for requisite in _ORDER_REQUISITES:
+            if requisite in disabled_reqs or not low.get(requisite):
+                continue
+            for req in low[requisite]:
+                if isinstance(req, six.string_types):
+                    req = {'id': req}
+                if not isinstance(req, dict) or not req:
+                    continue
+                req = trim_req(req)
+                req_key = next(iter(req))
+                req_val = req[req_key]
+                if not isinstance(req_val, six.string_types):
+                    # call_chunk reports the invalid requisites
+                    continue
+                for chunk in index.find(req_key, req_val):
+                    tag = _gen_tag(chunk)
+                    if tag not in tags:
+                        tags.append(tag)
+        return tags
+
+    @staticmethod
+    def _chunk_run_order(chunks, deps):
+        '''
+        Return the positions of the chunks in the order call_chunks runs them,
+        by tag: in order, after the chunks they require
+        '''
+        order = {}
+        for low in chunks:
+            stack = [(_gen_tag(low), False)]
+            visiting = set()
+            while stack:
+                tag, visited = stack.pop()
+                if visited:
+                    order.setdefault(tag, len(order))
+                    continue
+                if tag in order or tag in visiting:
+                    continue
+                visiting.add(tag)
+                stack.append((tag, True))
+                stack.extend((dep, False) for dep in reversed(deps.get(tag, ())))
+        return order
+
+    def _requisite_index(self, chunks):
+        '''
+        Return the index of the chunks of the run, indexing them again if they
+        are not the chunks last indexed
+        '''
+        index = self._chunk_index
+        if index is None or index.chunks is not chunks or index.size != len(chunks):
+            index = ChunkIndex(chunks)
+            self._chunk_index = index
+        return index
+
     def check_failhard(self, low, running):
         '''
         Check if the low data chunk should send a failhard signal
@@ -2360,12 +2852,15 @@ class State(object):
                 return 'run'
         return 'run'
 
-    def reconcile_procs(self, running):
+    def reconcile_procs(self, running, tags=None):
         '''
-        Check the running dict for processes and resolve them
+        Check the running dict for processes and resolve them, only those of
+        the given tags if any
         '''
         retset = set()
-        for tag in running:
+        for tag in running if tags is None else tags:
+            if tag not in running:
+                continue
             proc = running[tag].get('proc')
             if proc:
                 if not proc.is_alive():
@@ -2452,6 +2947,7 @@ class State(object):
                 'onchanges_any': []}
         if pre:
             reqs['prerequired'] = []
+        index = self._requisite_index(chunks)
         for r_state in reqs:
             if r_state in low and low[r_state] is not None:
                 if r_state in disabled_reqs:
@@ -2461,40 +2957,19 @@ class State(object):
                     if isinstance(req, six.string_types):
                         req = {'id': req}
                     req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                found = True
-                                reqs[r_state].append(chunk)
-                            continue
-                        try:
-                            if isinstance(req_val, six.string_types):
-                                if (fnmatch.fnmatch(chunk['name'], req_val) or
-                                    fnmatch.fnmatch(chunk['__id__'], req_val)):
-                                    if req_key == 'id' or chunk['state'] == req_key:
-                                        found = True
-                                        reqs[r_state].append(chunk)
-                            else:
-                                raise KeyError
-                        except KeyError as exc:
-                            raise SaltRenderError(
-                                'Could not locate requisite of [{0}] present in state with name [{1}]'.format(
-                                    req_key, chunk['name']))
-                        except TypeError:
-                            # On Python 2, the above req_val, being an OrderedDict, will raise a KeyError,
-                            # however on Python 3 it will raise a TypeError
-                            # This was found when running tests.unit.test_state.StateCompilerTestCase.test_render_error_on_invalid_requisite
-                            raise SaltRenderError(
-                                'Could not locate requisite of [{0}] present in state with name [{1}]'.format(
-                                    req_key, chunk['name']))
+                    req_key = next(iter(req))
+                    req_val = req[req_key]
+                    if req_val is None:
+                        return 'unmet', ()
+                    if req_key != 'sls' and chunks \
+                            and not isinstance(req_val, six.string_types):
+                        raise SaltRenderError(
+                            'Could not locate requisite of [{0}] present in state with name [{1}]'.format(
+                                req_key, chunks[0]['name']))
+                    found = index.find(req_key, req_val)
                     if not found:
                         return 'unmet', ()
+                    reqs[r_state].extend(found)
         fun_stats = set()
         for r_state, chunks in six.iteritems(reqs):
             req_stats = set()
@@ -2503,8 +2978,10 @@ class State(object):
             else:
                 run_dict = running
 
+            # Only wait for the requisites running in parallel
+            req_tags = [_gen_tag(chunk) for chunk in chunks]
             while True:
-                if self.reconcile_procs(run_dict):
+                if self.reconcile_procs(run_dict, req_tags):
                     break
                 time.sleep(0.01)
 
@@ -2645,6 +3122,7 @@ class State(object):
         if status == 'unmet':
             lost = {}
             reqs = []
+            index = self._requisite_index(chunks)
             for requisite in requisites:
                 lost[requisite] = []
                 if requisite not in low:
@@ -2656,26 +3134,14 @@ class State(object):
                     found = False
                     req_key = next(iter(req))
                     req_val = req[req_key]
-                    for chunk in chunks:
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                reqs.append(chunk)
-                                found = True
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if req_key == 'id' or chunk['state'] == req_key:
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                elif requisite == 'prerequired':
-                                    chunk['__prerequired__'] = True
-                                reqs.append(chunk)
-                                found = True
+                    if req_val is not None:
+                        for chunk in index.find(req_key, req_val):
+                            if requisite == 'prereq':
+                                chunk['__prereq__'] = True
+                            elif requisite == 'prerequired' and req_key != 'sls':
+                                chunk['__prerequired__'] = True
+                            reqs.append(chunk)
+                            found = True
                     if not found:
                         lost[requisite].append(req)
             if lost['require'] or lost['watch'] or lost['prereq'] \
@@ -2862,22 +3328,31 @@ class State(object):
                 for l_in in chunk['listen_in']:
                     for key, val in six.iteritems(l_in):
                         listeners.append({(key, val, 'lookup'): [{chunk['state']: chunk['__id__']}]})
+        # The crefs referenced by a state and one of the items of the cref
+        lookup = {}
+        for cref in crefs:
+            for item in set(cref):
+                lookup.setdefault((cref[0], item), []).append(cref)
+
+        def _refs(state, item):
+            try:
+                return lookup.get((state, item), [])
+            except TypeError:
+                return []
+
+        index = self._requisite_index(chunks)
         mod_watchers = []
         errors = {}
         for l_dict in listeners:
             for key, val in six.iteritems(l_dict):
                 for listen_to in val:
                     if not isinstance(listen_to, dict):
-                        found = False
-                        for chunk in chunks:
-                            if chunk['__id__'] == listen_to or \
-                               chunk['name'] == listen_to:
-                                listen_to = {chunk['state']: chunk['__id__']}
-                                found = True
-                        if not found:
+                        chunk = index.first(listen_to)
+                        if chunk is None:
                             continue
+                        listen_to = {chunk['state']: chunk['__id__']}
                     for lkey, lval in six.iteritems(listen_to):
-                        if not any(lkey == cref[0] and lval in cref for cref in crefs):
+                        if not _refs(lkey, lval):
                             rerror = {_l_tag(lkey, lval):
                                       {
                                           'comment': 'Referenced state {0}: {1} does not exist'.format(lkey, lval),
@@ -2887,14 +3362,12 @@ class State(object):
                                       }}
                             errors.update(rerror)
                             continue
-                        to_tags = [
-                            _gen_tag(data) for cref, data in six.iteritems(crefs) if lkey == cref[0] and lval in cref
-                        ]
+                        to_tags = [_gen_tag(crefs[cref]) for cref in _refs(lkey, lval)]
                         for to_tag in to_tags:
                             if to_tag not in running:
                                 continue
                             if running[to_tag]['changes']:
-                                if not any(key[0] == cref[0] and key[1] in cref for cref in crefs):
+                                if not _refs(key[0], key[1]):
                                     rerror = {_l_tag(key[0], key[1]):
                                                  {'comment': 'Referenced state {0}: {1} does not exist'.format(key[0], key[1]),
                                                   'name': 'listen_{0}:{1}'.format(key[0], key[1]),
@@ -2903,7 +3376,7 @@ class State(object):
                                     errors.update(rerror)
                                     continue
 
-                                new_chunks = [data for cref, data in six.iteritems(crefs) if key[0] == cref[0] and key[1] in cref]
+                                new_chunks = [crefs[cref] for cref in _refs(key[0], key[1])]
                                 for chunk in new_chunks:
                                     low = chunk.copy()
                                     low['sfun'] = chunk['fun']
@@ -2968,6 +3441,9 @@ class State(object):
         # the low data chunks
         if errors:
             return errors
+        prefetch_workers = self.opts.get('state_prefetch_workers', 0)
+        if prefetch_workers > 0:
+            self.prefetch_files(chunks, prefetch_workers)
         ret = self.call_chunks(chunks)
         ret = self.call_listen(chunks, ret)
 
@@ -3119,6 +3595,11 @@ class BaseHighState(object):
         self.avail = self.__gather_avail()
         self.serial = salt.payload.Serial(self.opts)
         self.building_highstate = OrderedDict()
+        # The (saltenv, salt:// URL) of the files rendered, when recorded for
+        # the compile cache
+        self._rendered_files = None
+        # The SLS files rendered ahead by _prerender_states, by (saltenv, sls)
+        self._prerendered = None
 
     def __gather_avail(self):
         '''
@@ -3634,9 +4115,21 @@ class BaseHighState(object):
         Render a state file and retrieve all of the include states
         '''
         errors = []
+        render_kwargs = {}
+        prerendered = None
         if not local:
-            state_data = self.client.get_state(sls, saltenv)
+            if self._prerendered:
+                prerendered = self._prerendered.pop((saltenv, sls), None)
+            if prerendered:
+                state_data = prerendered['state_data']
+            else:
+                state_data = self.client.get_state(sls, saltenv)
             fn_ = state_data.get('dest', False)
+            if fn_ and self._rendered_files is not None:
+                self._rendered_files.append((saltenv, state_data['source']))
+                if prerendered:
+                    self._rendered_files.extend(prerendered['rendered_files'] or ())
+                render_kwargs['rendered_files'] = self._rendered_files
         else:
             fn_ = sls
             if not os.path.isfile(fn_):
@@ -3653,15 +4146,19 @@ class BaseHighState(object):
             )
         else:
             try:
-                state = compile_template(fn_,
-                                         self.state.rend,
-                                         self.state.opts['renderer'],
-                                         self.state.opts['renderer_blacklist'],
-                                         self.state.opts['renderer_whitelist'],
-                                         saltenv,
-                                         sls,
-                                         rendered_sls=mods
-                                         )
+                if prerendered:
+                    state = prerendered['state']
+                else:
+                    state = compile_template(fn_,
+                                             self.state.rend,
+                                             self.state.opts['renderer'],
+                                             self.state.opts['renderer_blacklist'],
+                                             self.state.opts['renderer_whitelist'],
+                                             saltenv,
+                                             sls,
+                                             rendered_sls=mods,
+                                             **render_kwargs
+                                             )
             except SaltRenderError as exc:
                 msg = 'Rendering SLS \'{0}:{1}\' failed: {2}'.format(
                     saltenv, sls, exc
@@ -3703,109 +4200,22 @@ class BaseHighState(object):
                 self._handle_state_decls(state, sls, saltenv, errors)
 
                 for inc_sls in include:
-                    # inc_sls may take the form of:
-                    #   'sls.to.include' <- same as {<saltenv>: 'sls.to.include'}
-                    #   {<env_key>: 'sls.to.include'}
-                    #   {'_xenv': 'sls.to.resolve'}
-                    xenv_key = '_xenv'
-
-                    if isinstance(inc_sls, dict):
-                        env_key, inc_sls = inc_sls.popitem()
-                    else:
-                        env_key = saltenv
-
-                    if env_key not in self.avail:
-                        msg = ('Nonexistent saltenv \'{0}\' found in include '
-                               'of \'{1}\' within SLS \'{2}:{3}\''
-                               .format(env_key, inc_sls, saltenv, sls))
-                        log.error(msg)
-                        errors.append(msg)
-                        continue
-
-                    if inc_sls.startswith('.'):
-                        match = re.match(r'^(\.+)(.*)$', inc_sls)
-                        if match:
-                            levels, include = match.groups()
-                        else:
-                            msg = ('Badly formatted include {0} found in include '
-                                    'in SLS \'{2}:{3}\''
-                                    .format(inc_sls, saltenv, sls))
-                            log.error(msg)
-                            errors.append(msg)
-                            continue
-                        level_count = len(levels)
-                        p_comps = sls.split('.')
-                        if state_data.get('source', '').endswith('/init.sls'):
-                            p_comps.append('init')
-                        if level_count > len(p_comps):
-                            msg = ('Attempted relative include of \'{0}\' '
-                                   'within SLS \'{1}:{2}\' '
-                                   'goes beyond top level package '
-                                   .format(inc_sls, saltenv, sls))
-                            log.error(msg)
-                            errors.append(msg)
-                            continue
-                        inc_sls = '.'.join(p_comps[:-level_count] + [include])
-
-                    if env_key != xenv_key:
-                        if matches is None:
-                            matches = []
-                        # Resolve inc_sls in the specified environment
-                        if env_key in matches or fnmatch.filter(self.avail[env_key], inc_sls):
-                            resolved_envs = [env_key]
-                        else:
-                            resolved_envs = []
-                    else:
-                        # Resolve inc_sls in the subset of environment matches
-                        resolved_envs = [
-                            aenv for aenv in matches
-                            if fnmatch.filter(self.avail[aenv], inc_sls)
-                        ]
-
-                    # An include must be resolved to a single environment, or
-                    # the include must exist in the current environment
-                    if len(resolved_envs) == 1 or saltenv in resolved_envs:
-                        # Match inc_sls against the available states in the
-                        # resolved env, matching wildcards in the process. If
-                        # there were no matches, then leave inc_sls as the
-                        # target so that the next recursion of render_state
-                        # will recognize the error.
-                        sls_targets = fnmatch.filter(
-                            self.avail[saltenv],
-                            inc_sls
-                        ) or [inc_sls]
-
-                        for sls_target in sls_targets:
-                            r_env = resolved_envs[0] if len(resolved_envs) == 1 else saltenv
-                            mod_tgt = '{0}:{1}'.format(r_env, sls_target)
-                            if mod_tgt not in mods:
-                                nstate, err = self.render_state(
-                                    sls_target,
-                                    r_env,
-                                    mods,
-                                    matches
-                                )
-                                if nstate:
-                                    self.merge_included_states(state, nstate, errors)
-                                    state.update(nstate)
-                                if err:
-                                    errors.extend(err)
-                    else:
-                        msg = ''
-                        if not resolved_envs:
-                            msg = ('Unknown include: Specified SLS {0}: {1} is not available on the salt '
-                                   'master in saltenv(s): {2} '
-                                   ).format(env_key,
-                                            inc_sls,
-                                            ', '.join(matches) if env_key == xenv_key else env_key)
-                        elif len(resolved_envs) > 1:
-                            msg = ('Ambiguous include: Specified SLS {0}: {1} is available on the salt master '
-                                   'in multiple available saltenvs: {2}'
-                                   ).format(env_key,
-                                            inc_sls,
-                                            ', '.join(resolved_envs))
-                        log.critical(msg)
-                        errors.append(msg)
+                    for r_env, sls_target in self._include_targets(
+                            inc_sls, saltenv, sls, state_data.get('source', ''),
+                            matches, errors):
+                        mod_tgt = '{0}:{1}'.format(r_env, sls_target)
+                        if mod_tgt not in mods:
+                            nstate, err = self.render_state(
+                                sls_target,
+                                r_env,
+                                mods,
+                                matches
+                            )
+                            if nstate:
+                                self.merge_included_states(state, nstate, errors)
+                                state.update(nstate)
+                            if err:
+                                errors.extend(err)
                 try:
                     self._handle_iorder(state)
                 except TypeError:
@@ -3814,6 +4224,97 @@ class BaseHighState(object):
             state = {}
         return state, errors
 
+    def _include_targets(self, inc_sls, saltenv, sls, source, matches, errors=None):
+        '''
+        Return the (saltenv, sls) of the SLS an include of an SLS refers to.
+        The include errors are logged and added to the errors, if given.
+        '''
+        def _error(msg, level=logging.ERROR):
+            if errors is not None:
+                log.log(level, msg)
+                errors.append(msg)
+            return []
+
+        # inc_sls may take the form of:
+        #   'sls.to.include' <- same as {<saltenv>: 'sls.to.include'}
+        #   {<env_key>: 'sls.to.include'}
+        #   {'_xenv': 'sls.to.resolve'}
+        xenv_key = '_xenv'
+
+        if isinstance(inc_sls, dict):
+            env_key, inc_sls = next(six.iteritems(inc_sls))
+        else:
+            env_key = saltenv
+
+        if env_key not in self.avail:
+            return _error('Nonexistent saltenv \'{0}\' found in include '
+                          'of \'{1}\' within SLS \'{2}:{3}\''
+                          .format(env_key, inc_sls, saltenv, sls))
+
+        if inc_sls.startswith('.'):
+            match = re.match(r'^(\.+)(.*)$', inc_sls)
+            if match:
+                levels, include = match.groups()
+            else:
+                return _error('Badly formatted include {0} found in include '
+                              'in SLS \'{2}:{3}\''
+                              .format(inc_sls, saltenv, sls))
+            level_count = len(levels)
+            p_comps = sls.split('.')
+            if source.endswith('/init.sls'):
+                p_comps.append('init')
+            if level_count > len(p_comps):
+                return _error('Attempted relative include of \'{0}\' '
+                              'within SLS \'{1}:{2}\' '
+                              'goes beyond top level package '
+                              .format(inc_sls, saltenv, sls))
+            inc_sls = '.'.join(p_comps[:-level_count] + [include])
+
+        if matches is None:
+            matches = []
+        if env_key != xenv_key:
+            # Resolve inc_sls in the specified environment
+            if env_key in matches or fnmatch.filter(self.avail[env_key], inc_sls):
+                resolved_envs = [env_key]
+            else:
+                resolved_envs = []
+        else:
+            # Resolve inc_sls in the subset of environment matches
+            resolved_envs = [
+                aenv for aenv in matches
+                if fnmatch.filter(self.avail[aenv], inc_sls)
+            ]
+
+        # An include must be resolved to a single environment, or
+        # the include must exist in the current environment
+        if len(resolved_envs) == 1 or saltenv in resolved_envs:
+            # Match inc_sls against the available states in the
+            # resolved env, matching wildcards in the process. If
+            # there were no matches, then leave inc_sls as the
+            # target so that the next recursion of render_state
+            # will recognize the error.
+            sls_targets = fnmatch.filter(
+                self.avail[saltenv],
+                inc_sls
+            ) or [inc_sls]
+            r_env = resolved_envs[0] if len(resolved_envs) == 1 else saltenv
+            return [(r_env, sls_target) for sls_target in sls_targets]
+
+        msg = ''
+        if not resolved_envs:
+            msg = ('Unknown include: Specified SLS {0}: {1} is not available on the salt '
+                   'master in saltenv(s): {2} '
+                   ).format(env_key,
+                            inc_sls,
+                            ', '.join(matches) if env_key == xenv_key else env_key)
+        elif len(resolved_envs) > 1:
+            msg = ('Ambiguous include: Specified SLS {0}: {1} is available on the salt master '
+                   'in multiple available saltenvs: {2}'
+                   ).format(env_key,
+                            inc_sls,
+                            ', '.join(resolved_envs))
+        return _error(msg, logging.CRITICAL)
+
     def _handle_iorder(self, state):
         '''
         Take a state and apply the iorder system
@@ -3961,6 +4462,21 @@ class BaseHighState(object):
         highstate = self.building_highstate
         all_errors = []
         mods = set()
+        workers = self.opts.get('state_render_workers', 0)
+        if workers > 1:
+            self._prerendered = self._prerender_states(matches, workers)
+        try:
+            self._render_matches(matches, highstate, mods, all_errors)
+        finally:
+            self._prerendered = None
+
+        self.clean_duplicate_extends(highstate)
+        return highstate, all_errors
+
+    def _render_matches(self, matches, highstate, mods, all_errors):
+        '''
+        Render the matched SLS files in order, merging them into the highstate
+        '''
         statefiles = []
         for saltenv, states in six.iteritems(matches):
             for sls_match in states:
@@ -3999,8 +4515,121 @@ class BaseHighState(object):
                                     'in env \'{1}\''.format(sls_match, saltenv))
                     all_errors.extend(errors)
 
-        self.clean_duplicate_extends(highstate)
-        return highstate, all_errors
+    def _prerender_client(self):
+        '''
+        Return a file client for a thread of _prerender_states, or None if the
+        SLS files can't be fetched concurrently
+        '''
+        return None
+
+    def _prerender_states(self, matches, workers):
+        '''
+        Fetch and render the matched SLS files and the SLS files they include
+        with a pool of threads, each SLS file as soon as the SLS file including
+        it is rendered. render_state then merges them in its own order, so that
+        the highstate is the same as when they are rendered one at a time.
+        Return the rendered SLS files by (saltenv, sls).
+        '''
+        client = self._prerender_client()
+        if client is None:
+            return None
+        results = {}
+        lock = threading.Lock()
+        clients = ThreadFileClients(self._prerender_client, [client])
+        # The SLS files submitted and not rendered yet, and the seeding
+        outstanding = [1]
+        finished = threading.Event()
+        pool = ThreadPool(workers)
+
+        def _done():
+            with lock:
+                outstanding[0] -= 1
+                if not outstanding[0]:
+                    finished.set()
+
+        def _submit(saltenv, sls):
+            with lock:
+                if (saltenv, sls) in results:
+                    return
+                results[(saltenv, sls)] = None
+                outstanding[0] += 1
+            pool.apply_async(_render, (saltenv, sls))
+
+        def _render(saltenv, sls):
+            try:
+                result = self._prerender_state(clients.get(), saltenv, sls)
+                if result is None:
+                    return
+                with lock:
+                    results[(saltenv, sls)] = result
+                state = result['state']
+                if isinstance(state, dict) and isinstance(state.get('include'), list):
+                    for inc_sls in state['include']:
+                        for target in self._include_targets(
+                                inc_sls, saltenv, sls,
+                                result['state_data'].get('source', ''), matches):
+                            _submit(*target)
+            except Exception as exc:
+                # Left for render_state to render, and report
+                log.debug('Unable to render SLS %s:%s ahead: %s', saltenv, sls, exc)
+            finally:
+                _done()
+
+        try:
+            for saltenv, states in six.iteritems(matches):
+                avail = self.avail.get(saltenv, self.avail.get('__env__'))
+                if avail is None:
+                    continue
+                for sls_match in states:
+                    for sls in fnmatch.filter(avail, sls_match) or [sls_match]:
+                        _submit(saltenv, sls)
+            _done()
+            finished.wait()
+        finally:
+            pool.close()
+            pool.join()
+            clients.close()
+        return dict((key, result) for key, result in six.iteritems(results) if result)
+
+    def _prerender_state(self, client, saltenv, sls):
+        '''
+        Fetch and render an SLS file in a thread of _prerender_states. Return
+        None if it must be rendered by render_state, such as when a renderer
+        of the SLS file renders its includes itself. Rendering errors are
+        raised, and the SLS file is then rendered again by render_state, as
+        they may come from the functions called by the renderers not
+        supporting to run in several threads.
+        '''
+        state_data = client.get_state(sls, saltenv)
+        fn_ = state_data.get('dest', False)
+        if not fn_:
+            return None
+        with salt.utils.files.fopen(fn_, 'r') as fp_:
+            line = fp_.readline().strip()
+        if line.startswith('#!') and not line.startswith('#!/'):
+            pipe = line[2:]
+        else:
+            pipe = self.state.opts['renderer']
+        for renderer in pipe.split('|'):
+            if renderer.strip().split(' ')[0] not in _PRERENDER_RENDERERS:
+                return None
+        rendered_files = None
+        render_kwargs = {}
+        if self._rendered_files is not None:
+            rendered_files = render_kwargs['rendered_files'] = []
+        state = compile_template(fn_,
+                                 self.state.rend,
+                                 self.state.opts['renderer'],
+                                 self.state.opts['renderer_blacklist'],
+                                 self.state.opts['renderer_whitelist'],
+                                 saltenv,
+                                 sls,
+                                 rendered_sls=set(),
+                                 **render_kwargs
+                                 )
+        return {'state_data': state_data,
+                'state': state,
+                'rendered_files': rendered_files}
 
     def clean_duplicate_extends(self, highstate):
         if '__extend__' in highstate:
@@ -4117,7 +4746,23 @@ class BaseHighState(object):
             err += ['Pillar failed to render with the following messages:']
             err += self.state.opts['pillar']['_errors']
         else:
-            high, errors = self.render_highstate(matches)
+            high = None
+            cache_key = None
+            if self.opts.get('state_compile_cache'):
+                cache_key = self._compile_cache_key(matches)
+            if cache_key:
+                high = self._load_compiled(cache_name, cache_key)
+            if high is None:
+                if cache_key:
+                    self._rendered_files = []
+                try:
+                    high, errors = self.render_highstate(matches)
+                    if cache_key and not errors:
+                        self._store_compiled(cache_name, cache_key, high)
+                finally:
+                    self._rendered_files = None
+            else:
+                errors = []
             if exclude:
                 if isinstance(exclude, six.string_types):
                     exclude = exclude.split(',')
@@ -4149,6 +4794,94 @@ class BaseHighState(object):
 
         return self.state.call_high(high, orchestration_jid)
 
+    def _compile_cache_key(self, matches):
+        '''
+        Return the digest of what the rendering of the matched SLS depends on,
+        besides the contents of the files rendered, or None if it can't be
+        computed
+        '''
+        data = {
+            'matches': matches,
+            'avail': self.avail,
+            'saltenv': self.opts.get('saltenv'),
+            'pillarenv': self.opts.get('pillarenv'),
+            'grains': self.state.opts.get('grains', {}),
+            'pillar': self.state.opts.get('pillar', {}),
+        }
+        try:
+            return salt.utils.hashutils.sha256_digest(
+                salt.utils.json.dumps(data, sort_keys=True, default=repr))
+        except (TypeError, ValueError) as exc:
+            log.debug('Unable to compute the state compile cache key: %s', exc)
+            return None
+
+    def _hash_rendered_files(self, files):
+        '''
+        Return the hashes of the rendered files on the fileserver, by saltenv
+        and URL
+        '''
+        hashes = {}
+        for saltenv, path in files:
+            if path in hashes.get(saltenv, {}):
+                continue
+            hashes.setdefault(saltenv, {})[path] = self.client.hash_file(path, saltenv)
+        return hashes
+
+    def _load_compiled(self, cache_name, cache_key):
+        '''
+        Return the cached high data of the highstate, if it was compiled from
+        the same inputs and the rendered files didn't change since
+        '''
+        cfn = os.path.join(
+                self.opts['cachedir'],
+                '{0}.compiled.p'.format(cache_name)
+        )
+        if not os.path.isfile(cfn):
+            return None
+        try:
+            with salt.utils.files.fopen(cfn, 'rb') as fp_:
+                data = self.serial.load(fp_)
+        except Exception as exc:
+            log.debug('Unable to read the state compile cache %s: %s', cfn, exc)
+            return None
+        if not isinstance(data, dict) or data.get('key') != cache_key:
+            return None
+        files = [(saltenv, path)
+                 for saltenv, paths in six.iteritems(data['files'])
+                 for path in paths]
+        if self._hash_rendered_files(files) != data['files']:
+            log.debug('The rendered SLS files changed, compiling the highstate')
+            return None
+        log.debug('Using the highstate compiled in %s', cfn)
+        return data['high']
+
+    def _store_compiled(self, cache_name, cache_key, high):
+        '''
+        Cache the high data of the highstate, with the hashes of the files it
+        was rendered from
+        '''
+        cfn = os.path.join(
+                self.opts['cachedir'],
+                '{0}.compiled.p'.format(cache_name)
+        )
+        files = self._hash_rendered_files(self._rendered_files)
+        if not all(all(six.itervalues(paths)) for paths in six.itervalues(files)):
+            # A rendered file is gone already
+            return
+        data = {'key': cache_key, 'files': files, 'high': high}
+        with salt.utils.files.set_umask(0o077):
+            try:
+                with salt.utils.files.fopen(cfn, 'w+b') as fp_:
+                    self.serial.dump(data, fp_)
+            except (IOError, OSError):
+                log.error('Unable to write to the state compile cache file %s', cfn)
+            except TypeError:
+                # Can't serialize pydsl
+                try:
+                    os.remove(cfn)
+                except OSError:
+                    pass
+
     def compile_highstate(self):
         '''
         Return just the highstate or the errors
@@ -4272,6 +5005,12 @@ class HighState(BaseHighState):
         # a stack of current rendering Sls objects, maintained and used by the pydsl renderer.
         self._pydsl_render_stack = []
 
+    def _prerender_client(self):
+        '''
+        Return a file client of its own for a thread of _prerender_states
+        '''
+        return salt.fileclient.get_file_client(self.opts)
+
     def push_active(self):
         self.stack.append(self)
 
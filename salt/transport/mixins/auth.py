@@ -6,9 +6,12 @@ import multiprocessing
 import ctypes
 import logging
 import os
+import base64
 import hashlib
+import hmac
 import shutil
 import binascii
+import time
 
 # Import Salt Libs
 import salt.crypt
@@ -38,6 +41,10 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# The AES key, crypticle and signing key of the publishes, by pki_dir. The
+# publish channels are set up for each publish, so they are kept here.
+_PUBLISH_KEYS = {}
+
 
 # TODO: rename
 class AESPubClientMixin(object):
@@ -66,6 +73,35 @@ class AESPubClientMixin(object):
         raise tornado.gen.Return(payload)
 
 
+class AESPubServerMixin(object):
+    '''
+    Mixin to house the master-side publish crypto
+    '''
+    def _encrypt_publish(self, load):
+        '''
+        Return the payload publishing load to the minions, encrypted with the
+        current AES key and signed with the master key if sign_pub_messages is
+        enabled. The crypticle and the signing key are kept until the AES key
+        rotates.
+        '''
+        key_string = salt.master.SMaster.secrets['aes']['secret'].value
+        cache_key = (self.opts['pki_dir'], bool(self.opts['sign_pub_messages']))
+        keys = _PUBLISH_KEYS.get(cache_key)
+        if keys is None or keys[0] != key_string:
+            sign_key = None
+            if self.opts['sign_pub_messages']:
+                sign_key = salt.crypt.get_rsa_key(
+                    os.path.join(self.opts['pki_dir'], 'master.pem'), None)
+            keys = (key_string, salt.crypt.Crypticle(self.opts, key_string), sign_key)
+            # Swap them at once, the publishes may run in several threads
+            _PUBLISH_KEYS[cache_key] = keys
+        payload = {'enc': 'aes', 'load': keys[1].dumps(load)}
+        if keys[2] is not None:
+            log.debug("Signing data packet")
+            payload['sig'] = salt.crypt.sign_message(keys[2], payload['load'])
+        return payload
+
+
 # TODO: rename?
 class AESReqServerMixin(object):
     '''
@@ -87,6 +123,9 @@ class AESReqServerMixin(object):
                 ),
                 'reload': salt.crypt.Crypticle.generate_key_string
             }
+        # The time the next sign in is due and the number of minions waiting
+        # to sign in, shared by the workers, see _admit_auth
+        self._auth_admission = multiprocessing.Array(ctypes.c_double, 2)
 
     def post_fork(self, _, __):
         self.serial = salt.payload.Serial(self.opts)
@@ -107,10 +146,144 @@ class AESReqServerMixin(object):
 
         self.master_key = salt.crypt.MasterKeys(self.opts)
 
-    def _encrypt_private(self, ret, dictkey, target):
+        # The crypticles of the session keys of the minions, for the AES key
+        # they are derived from, see _session_crypticle
+        self._session_secret = None
+        self._session_aes = None
+        self._session_crypticles = {}
+
+        # The public keys of the minions verified by this worker, with the
+        # stat of their file, and the signature of the last AES key sent
+        self._auth_keys = {}
+        self._auth_sig = (None, None)
+
+    def _admit_auth(self):
+        '''
+        Return 0 if an authentication request is to be handled now, or the
+        number of seconds the minion is to wait before it signs in again.
+
+        The workers admit up to auth_rate_limit requests a second between
+        them, after a burst of as many. The minions turned away are each told
+        to retry after the ones waiting ahead of them, which spreads a storm
+        of sign ins, such as after a restart of the master, over time.
+        '''
+        rate = self.opts.get('auth_rate_limit', 0)
+        admission = getattr(self, '_auth_admission', None)
+        if rate <= 0 or admission is None:
+            return 0
+        with admission.get_lock():
+            now = time.time()
+            due, waiting = admission[0], admission[1]
+            if due < now:
+                # Caught up with the sign ins
+                due, waiting = now, 0
+            if due <= now + 1:
+                admission[0] = due + 1.0 / rate
+                admission[1] = max(waiting - 1, 0)
+                return 0
+            admission[1] = waiting + 1
+        return (due - now - 1) + (waiting + 1) / rate
+
+    @staticmethod
+    def _pub_stat(pubfn):
+        try:
+            stat = os.stat(pubfn)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size, stat.st_ino
+
+    def _check_pub(self, minion_id, pubfn, pub):
+        '''
+        Return whether the public key sent by an accepted minion matches its
+        key on disk. The keys which matched are kept until their file changes,
+        so that the file isn't read again each time the minion signs in.
+        '''
+        stat = self._pub_stat(pubfn)
+        cached = self._auth_keys.get(minion_id)
+        if stat is not None and cached is not None \
+                and cached[0] == stat and cached[1] == pub.strip():
+            return True
+        with salt.utils.files.fopen(pubfn, 'r') as pubfn_handle:
+            disk_pub = pubfn_handle.read().strip()
+        if disk_pub != pub.strip():
+            self._auth_keys.pop(minion_id, None)
+            return False
+        if len(self._auth_keys) >= 10000:
+            self._auth_keys = {}
+        self._auth_keys[minion_id] = [stat, disk_pub, None]
+        return True
+
+    def _get_pub(self, minion_id, pubfn):
+        '''
+        Return the RSA public key of a minion, loaded once for the key checked
+        by _check_pub
+        '''
+        cached = self._auth_keys.get(minion_id)
+        if cached is None or cached[0] != self._pub_stat(pubfn):
+            return salt.crypt.get_rsa_pub_key(pubfn)
+        if cached[2] is None:
+            cached[2] = salt.crypt.get_rsa_pub_key(pubfn)
+        return cached[2]
+
+    def _sign_aes(self, aes):
+        '''
+        Return the signature of an AES key sent to the minions, which is the
+        same for all of them unless auth_mode is 2
+        '''
+        if self._auth_sig[0] != aes:
+            digest = salt.utils.stringutils.to_bytes(hashlib.sha256(aes).hexdigest())
+            self._auth_sig = (aes, salt.crypt.private_encrypt(self.master_key.key, digest))
+        return self._auth_sig[1]
+
+    def _session_key(self, target, aes):
+        '''
+        Return the session key of a minion for an AES key of the master.
+
+        It is derived from a digest of the private key of the master, so that
+        all the workers compute the same key without sharing it, and the other
+        minions, which know the AES key, can't.
+        '''
+        if self._session_secret is None:
+            with salt.utils.files.fopen(self.master_key.rsa_path, 'rb') as fp_:
+                self._session_secret = hashlib.sha256(fp_.read()).digest()
+        size = salt.crypt.Crypticle.generate_key_size()
+        key = hmac.new(self._session_secret,
+                       salt.utils.stringutils.to_bytes(aes) + b'\0' +
+                       salt.utils.stringutils.to_bytes(target),
+                       hashlib.sha512).digest()[:size]
+        return salt.utils.stringutils.to_str(base64.b64encode(key))
+
+    def _session_crypticle(self, target):
+        '''
+        Return the crypticle of the session key of a minion, for the AES key
+        which decrypted its request
+        '''
+        aes = self.crypticle.key_string
+        if aes != self._session_aes or len(self._session_crypticles) >= 10000:
+            self._session_aes = aes
+            self._session_crypticles = {}
+        pcrypt = self._session_crypticles.get(target)
+        if pcrypt is None:
+            pcrypt = salt.crypt.Crypticle(self.opts, self._session_key(target, aes))
+            self._session_crypticles[target] = pcrypt
+        return pcrypt
+
+    def _encrypt_private(self, ret, dictkey, target, session=False):
         '''
         The server equivalent of ReqChannel.crypted_transfer_decode_dictentry
+
+        If the minion received a session key when it authenticated, the reply
+        is encrypted with it, which only needs symmetric crypto.
         '''
+        if session:
+            try:
+                pcrypt = self._session_crypticle(target)
+            except (IOError, OSError) as exc:
+                log.error('Unable to derive the session key of %s: %s', target, exc)
+            else:
+                return {dictkey: pcrypt.dumps(ret if ret is not False else {}),
+                        'session': True}
+
         # encrypt with a specific AES key
         pubfn = os.path.join(self.opts['pki_dir'],
                              'minions',
@@ -153,12 +326,13 @@ class AESReqServerMixin(object):
     def _decode_payload(self, payload):
         # we need to decrypt it
         if payload['enc'] == 'aes':
+            aead = payload.get('aead') == salt.crypt.Crypticle.AEAD
             try:
-                payload['load'] = self.crypticle.loads(payload['load'])
+                payload['load'] = self.crypticle.loads(payload['load'], aead=aead)
             except salt.crypt.AuthenticationError:
                 if not self._update_aes():
                     raise
-                payload['load'] = self.crypticle.loads(payload['load'])
+                payload['load'] = self.crypticle.loads(payload['load'], aead=aead)
         return payload
 
     def _auth(self, load):
@@ -183,6 +357,13 @@ class AESReqServerMixin(object):
                     'load': {'ret': False}}
         log.info('Authentication request from %s', load['id'])
 
+        retry_after = self._admit_auth()
+        if retry_after:
+            log.debug('Too many authentication requests, %s is to retry in '
+                      '%.1f seconds', load['id'], retry_after)
+            return {'enc': 'clear',
+                    'load': {'ret': 'busy', 'retry_after': retry_after}}
+
         # 0 is default which should be 'unlimited'
         if self.opts['max_minions'] > 0:
             # use the ConCache if enabled, else use the minion utils
@@ -248,24 +429,23 @@ class AESReqServerMixin(object):
 
         elif os.path.isfile(pubfn):
             # The key has been accepted, check it
-            with salt.utils.files.fopen(pubfn, 'r') as pubfn_handle:
-                if pubfn_handle.read().strip() != load['pub'].strip():
-                    log.error(
-                        'Authentication attempt from %s failed, the public '
-                        'keys did not match. This may be an attempt to compromise '
-                        'the Salt cluster.', load['id']
-                    )
-                    # put denied minion key into minions_denied
-                    with salt.utils.files.fopen(pubfn_denied, 'w+') as fp_:
-                        fp_.write(load['pub'])
-                    eload = {'result': False,
-                             'id': load['id'],
-                             'act': 'denied',
-                             'pub': load['pub']}
-                    if self.opts.get('auth_events') is True:
-                        self.event.fire_event(eload, salt.utils.event.tagify(prefix='auth'))
-                    return {'enc': 'clear',
-                            'load': {'ret': False}}
+            if not self._check_pub(load['id'], pubfn, load['pub']):
+                log.error(
+                    'Authentication attempt from %s failed, the public '
+                    'keys did not match. This may be an attempt to compromise '
+                    'the Salt cluster.', load['id']
+                )
+                # put denied minion key into minions_denied
+                with salt.utils.files.fopen(pubfn_denied, 'w+') as fp_:
+                    fp_.write(load['pub'])
+                eload = {'result': False,
+                         'id': load['id'],
+                         'act': 'denied',
+                         'pub': load['pub']}
+                if self.opts.get('auth_events') is True:
+                    self.event.fire_event(eload, salt.utils.event.tagify(prefix='auth'))
+                return {'enc': 'clear',
+                        'load': {'ret': False}}
 
         elif not os.path.isfile(pubfn_pend):
             # The key has not been accepted, this is a new minion
@@ -433,7 +613,7 @@ class AESReqServerMixin(object):
         # The key payload may sometimes be corrupt when using auto-accept
         # and an empty request comes in
         try:
-            pub = salt.crypt.get_rsa_pub_key(pubfn)
+            pub = self._get_pub(load['id'], pubfn)
         except Exception as err:
             log.error('Corrupt public key "%s": %s', pubfn, err, exc_info_on_loglevel=logging.DEBUG)
             return {'enc': 'clear',
@@ -444,6 +624,9 @@ class AESReqServerMixin(object):
         ret = {'enc': 'pub',
                'pub_key': self.master_key.get_pub_str(),
                'publish_port': self.opts['publish_port']}
+        if self.opts['crypticle_aead'] and salt.crypt.HAS_AEAD:
+            # Let the minion encrypt its requests with AES-GCM
+            ret['aead'] = salt.crypt.Crypticle.AEAD
 
         # sign the master's pubkey (if enabled) before it is
         # sent to the minion that was just authenticated
@@ -509,8 +692,21 @@ class AESReqServerMixin(object):
             else:
                 ret['aes'] = cipher.encrypt(aes)
         # Be aggressive about the signature
-        digest = salt.utils.stringutils.to_bytes(hashlib.sha256(aes).hexdigest())
-        ret['sig'] = salt.crypt.private_encrypt(self.master_key.key, digest)
+        ret['sig'] = self._sign_aes(aes)
+        if load.get('session'):
+            # The key of the private replies to this minion, signed as well
+            try:
+                session = salt.utils.stringutils.to_bytes(self._session_key(
+                    load['id'], salt.master.SMaster.secrets['aes']['secret'].value))
+            except (IOError, OSError) as exc:
+                log.error('Unable to derive the session key of %s: %s', load['id'], exc)
+            else:
+                if HAS_M2:
+                    ret['session'] = pub.public_encrypt(session, RSA.pkcs1_oaep_padding)
+                else:
+                    ret['session'] = cipher.encrypt(session)
+                digest = salt.utils.stringutils.to_bytes(hashlib.sha256(session).hexdigest())
+                ret['session_sig'] = salt.crypt.private_encrypt(self.master_key.key, digest)
         eload = {'result': True,
                  'act': 'accept',
                  'id': load['id'],
@@ -56,6 +56,13 @@ class ReqServerChannel(object):
         '''
         pass
 
+    def idle(self):
+        '''
+        Return True if the channel has no request waiting nor reply to send,
+        so that it can be closed without dropping any
+        '''
+        return True
+
 
 class PubServerChannel(object):
     '''
@@ -94,9 +101,10 @@ class PubServerChannel(object):
         '''
         pass
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
-        Publish "load" to minions
+        Publish "load" to minions, the "minions" matching its target if the
+        master already resolved them
         '''
         raise NotImplementedError()
 
@@ -8,6 +8,7 @@ Wire protocol: "len(payload) msgpack({'head': SOMEHEADER, 'body': SOMEBODY})"
 
 # Import Python Libs
 from __future__ import absolute_import, print_function, unicode_literals
+import collections
 import errno
 import logging
 import os
@@ -38,6 +39,7 @@ from salt.ext import six
 from salt.ext.six.moves import queue  # pylint: disable=import-error
 from salt.exceptions import SaltReqTimeoutError, SaltClientError
 from salt.transport import iter_transport_opts
+from salt.defaults import DEFAULT_TARGET_DELIM
 
 # Import Tornado Libs
 import tornado
@@ -335,23 +337,39 @@ class AsyncTCPReqChannel(salt.transport.client.ReqChannel):
                 # If its not a bad file descriptor error, raise
                 raise
 
-    def _package_load(self, load):
-        return {
+    def _package_load(self, load, aead=False, session=False):
+        ret = {
             'enc': self.crypt,
             'load': load,
         }
+        if aead:
+            ret['aead'] = salt.crypt.Crypticle.AEAD
+        if session:
+            # Ask for the reply to be encrypted with our session key
+            ret['session'] = True
+        return ret
 
     @tornado.gen.coroutine
     def crypted_transfer_decode_dictentry(self, load, dictkey=None, tries=3, timeout=60):
         if not self.auth.authenticated:
             yield self.auth.authenticate()
-        ret = yield self.message_client.send(self._package_load(self.auth.crypticle.dumps(load)), timeout=timeout)
-        key = self.auth.get_keys()
-        if HAS_M2:
-            aes = key.private_decrypt(ret['key'], RSA.pkcs1_oaep_padding)
+        aead = self.auth.aead
+        session = self.auth.creds.get('session')
+        ret = yield self.message_client.send(
+            self._package_load(self.auth.crypticle.dumps(load, aead=aead),
+                               aead=aead,
+                               session=bool(session)),
+            timeout=timeout)
+        if 'session' in ret:
+            # Encrypted with the session key we got when we authenticated
+            aes = session
         else:
-            cipher = PKCS1_OAEP.new(key)
-            aes = cipher.decrypt(ret['key'])
+            key = self.auth.get_keys()
+            if HAS_M2:
+                aes = key.private_decrypt(ret['key'], RSA.pkcs1_oaep_padding)
+            else:
+                cipher = PKCS1_OAEP.new(key)
+                aes = cipher.decrypt(ret['key'])
         pcrypt = salt.crypt.Crypticle(self.opts, aes)
         data = pcrypt.loads(ret[dictkey])
         if six.PY3:
@@ -368,15 +386,17 @@ class AsyncTCPReqChannel(salt.transport.client.ReqChannel):
         '''
         @tornado.gen.coroutine
         def _do_transfer():
-            data = yield self.message_client.send(self._package_load(self.auth.crypticle.dumps(load)),
-                                                  timeout=timeout,
-                                                  )
+            aead = self.auth.aead
+            data = yield self.message_client.send(
+                self._package_load(self.auth.crypticle.dumps(load, aead=aead), aead=aead),
+                timeout=timeout,
+            )
             # we may not have always data
             # as for example for saltcall ret submission, this is a blind
             # communication, we do not subscribe to return events, we just
             # upload the results to the master
             if data:
-                data = self.auth.crypticle.loads(data)
+                data = self.auth.crypticle.loads(data, aead=aead)
                 if six.PY3:
                     data = salt.transport.frame.decode_embedded_strs(data)
             raise tornado.gen.Return(data)
@@ -726,11 +746,14 @@ class TCPReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.tra
             if req_fun == 'send_clear':
                 stream.write(salt.transport.frame.frame_msg(ret, header=header))
             elif req_fun == 'send':
-                stream.write(salt.transport.frame.frame_msg(self.crypticle.dumps(ret), header=header))
+                # Reply in the mode of the request
+                aead = payload.get('aead') == salt.crypt.Crypticle.AEAD
+                stream.write(salt.transport.frame.frame_msg(self.crypticle.dumps(ret, aead=aead), header=header))
             elif req_fun == 'send_private':
                 stream.write(salt.transport.frame.frame_msg(self._encrypt_private(ret,
                                                              req_opts['key'],
                                                              req_opts['tgt'],
+                                                             session=payload.get('session', False),
                                                              ), header=header))
             else:
                 log.error('Unknown req_fun %s', req_fun)
@@ -1205,11 +1228,17 @@ class Subscriber(object):
         self._closing = False
         self._read_until_future = None
         self.id_ = None
+        # The publishes waiting for the stream, see PubServer._queue_payload
+        self.queue = collections.deque()
+        self.queued_bytes = 0
+        self.writing = False
 
     def close(self):
         if self._closing:
             return
         self._closing = True
+        self.queue.clear()
+        self.queued_bytes = 0
         if not self.stream.closed():
             self.stream.close()
             if self._read_until_future is not None and self._read_until_future.done():
@@ -1238,6 +1267,16 @@ class PubServer(tornado.tcpserver.TCPServer, object):
         self.aes_funcs = salt.master.AESFuncs(self.opts)
         self.present = {}
         self.presence_events = False
+        self.hwm = self.opts.get('tcp_pub_client_hwm', 1000)
+        self.hwm_bytes = self.opts.get('tcp_pub_client_hwm_bytes', 67108864)
+        self.hwm_policy = self.opts.get('tcp_pub_client_hwm_policy', 'drop_oldest')
+        if self.hwm_policy not in ('drop_oldest', 'disconnect', 'coalesce'):
+            log.error('Invalid tcp_pub_client_hwm_policy %s, using drop_oldest',
+                      self.hwm_policy)
+            self.hwm_policy = 'drop_oldest'
+        # The publishes dropped and the minions disconnected by the high water
+        # marks since the last stats event
+        self.stats = {'dropped': 0, 'disconnected': 0}
         if self.opts.get('presence_events', False):
             tcp_only = True
             for transport, _ in iter_transport_opts(self.opts):
@@ -1249,17 +1288,24 @@ class PubServer(tornado.tcpserver.TCPServer, object):
                 # 'Maintenance' process.
                 self.presence_events = True
 
-        if self.presence_events:
+        if self.presence_events or self.opts.get('master_stats', False):
             self.event = salt.utils.event.get_event(
                 'master',
                 opts=self.opts,
                 listen=False
             )
+        self._stats_callback = None
+        if self.opts.get('master_stats', False):
+            self._stats_callback = tornado.ioloop.PeriodicCallback(
+                self._post_stats, self.opts['master_stats_event_iter'] * 1000)
+            self._stats_callback.start()
 
     def close(self):
         if self._closing:
             return
         self._closing = True
+        if self._stats_callback is not None:
+            self._stats_callback.stop()
 
     def __del__(self):
         self.close()
@@ -1356,11 +1402,90 @@ class PubServer(tornado.tcpserver.TCPServer, object):
         self.clients.add(client)
         self.io_loop.spawn_callback(self._stream_read, client)
 
+    def _drop_client(self, client):
+        client.close()
+        self._remove_client_present(client)
+        self.clients.discard(client)
+
+    def _queue_payload(self, client, payload):
+        '''
+        Queue a publish for a client, within the high water marks of its
+        queue. Return False if the client is to be disconnected.
+
+        Each client has a single write in flight on its stream, so that the
+        publishes a slow minion doesn't read wait in its bounded queue,
+        rather than in the unbounded buffer of the stream.
+        '''
+        if client.queue and (
+                (self.hwm and len(client.queue) >= self.hwm) or
+                (self.hwm_bytes and client.queued_bytes + len(payload) > self.hwm_bytes)):
+            if self.hwm_policy == 'disconnect':
+                log.warning(
+                    'Disconnecting the subscriber at %s, which has %d publishes '
+                    'queued', client.address, len(client.queue))
+                self.stats['dropped'] += len(client.queue)
+                self.stats['disconnected'] += 1
+                return False
+            if self.hwm_policy == 'coalesce':
+                self.stats['dropped'] += len(client.queue)
+                client.queue.clear()
+                client.queued_bytes = 0
+            else:
+                while client.queue and (
+                        (self.hwm and len(client.queue) >= self.hwm) or
+                        (self.hwm_bytes and client.queued_bytes + len(payload) > self.hwm_bytes)):
+                    client.queued_bytes -= len(client.queue.popleft())
+                    self.stats['dropped'] += 1
+            log.debug('Dropped publishes queued for the subscriber at %s', client.address)
+        client.queue.append(payload)
+        client.queued_bytes += len(payload)
+        if not client.writing:
+            client.writing = True
+            self.io_loop.spawn_callback(self._stream_write, client)
+        return True
+
+    @tornado.gen.coroutine
+    def _stream_write(self, client):
+        '''
+        Write the queued publishes of a client to its stream, one at a time
+        '''
+        try:
+            while client.queue:
+                payload = client.queue.popleft()
+                client.queued_bytes -= len(payload)
+                # Write the packed str
+                yield client.stream.write(payload)
+        except StreamClosedError:
+            log.debug('Subscriber at %s has disconnected from publisher', client.address)
+            self._drop_client(client)
+        finally:
+            client.writing = False
+
+    def _post_stats(self):
+        '''
+        Fire the depths of the queues of the clients on the event bus
+        '''
+        depths = [len(client.queue) for client in self.clients]
+        queued_bytes = [client.queued_bytes for client in self.clients]
+        stats = {'clients': len(self.clients),
+                 'queued': sum(depths),
+                 'queued_bytes': sum(queued_bytes),
+                 'max_queued': max(depths) if depths else 0,
+                 'max_queued_bytes': max(queued_bytes) if queued_bytes else 0}
+        stats.update(self.stats)
+        self.stats = {'dropped': 0, 'disconnected': 0}
+        self.event.fire_event(
+            {'time': self.opts['master_stats_event_iter'],
+             'worker': self.__class__.__name__,
+             'stats': stats},
+            salt.utils.event.tagify(self.__class__.__name__, 'stats'))
+
     # TODO: ACK the publish through IPC
     @tornado.gen.coroutine
     def publish_payload(self, package, _):
         log.debug('TCP PubServer sending payload: %s', package)
-        payload = salt.transport.frame.frame_msg(package['payload'])
+        # Framed by the publisher, see TCPPubServerChannel.publish
+        payload = package['payload']
 
         to_remove = []
         if 'topic_lst' in package:
@@ -1373,31 +1498,21 @@ class PubServer(tornado.tcpserver.TCPServer, object):
                     # restarts and the master is yet to detect the disconnect
                     # via TCP keep-alive.
                     for client in self.present[topic]:
-                        try:
-                            # Write the packed str
-                            f = client.stream.write(payload)
-                            self.io_loop.add_future(f, lambda f: True)
-                        except StreamClosedError:
+                        if not self._queue_payload(client, payload):
                             to_remove.append(client)
                 else:
                     log.debug('Publish target %s not connected', topic)
         else:
             for client in self.clients:
-                try:
-                    # Write the packed str
-                    f = client.stream.write(payload)
-                    self.io_loop.add_future(f, lambda f: True)
-                except StreamClosedError:
+                if not self._queue_payload(client, payload):
                     to_remove.append(client)
         for client in to_remove:
-            log.debug('Subscriber at %s has disconnected from publisher', client.address)
-            client.close()
-            self._remove_client_present(client)
-            self.clients.discard(client)
+            self._drop_client(client)
         log.trace('TCP PubServer finished publishing payload')
 
 
-class TCPPubServerChannel(salt.transport.server.PubServerChannel):
+class TCPPubServerChannel(salt.transport.mixins.auth.AESPubServerMixin,
+                          salt.transport.server.PubServerChannel):
     # TODO: opts!
     # Based on default used in tornado.netutil.bind_sockets()
     backlog = 128
@@ -1477,18 +1592,15 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         '''
         process_manager.add_process(self._publish_daemon, kwargs=kwargs)
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions
+
+        :param dict load: A load to be sent across the wire to minions
+        :param list minions: The minions matching the target of the load, if
+            the master already resolved them
         '''
-        payload = {'enc': 'aes'}
-
-        crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
-        payload['load'] = crypticle.dumps(load)
-        if self.opts['sign_pub_messages']:
-            master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
-            log.debug("Signing data packet")
-            payload['sig'] = salt.crypt.sign_message(master_pem_path, payload['load'])
+        payload = self._encrypt_publish(load)
         # Use the Salt IPC server
         if self.opts.get('ipc_mode', '') == 'tcp':
             pull_uri = int(self.opts.get('tcp_master_publish_pull', 4514))
@@ -1502,20 +1614,33 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         )
         pub_sock.connect()
 
-        int_payload = {'payload': self.serial.dumps(payload)}
-
-        # add some targeting stuff for lists only (for now)
-        if load['tgt_type'] == 'list':
-            if isinstance(load['tgt'], six.string_types):
+        # Frame the payload for the minions here, so that the publish daemon
+        # writes it to their streams as is
+        int_payload = {'payload': salt.transport.frame.frame_msg(self.serial.dumps(payload))}
+
+        # Resolve the target here, so that the publish daemon only writes the
+        # payload to the streams of the matching minions. The syndics pass the
+        # publishes on to their own minions, so they get all of them.
+        # When the target doesn't resolve, the publish is sent to all the
+        # minions, which match it themselves.
+        if load['tgt_type'] == 'list' and not isinstance(load['tgt'], six.string_types):
+            int_payload['topic_lst'] = load['tgt']
+        elif load['tgt_type'] == 'list' or not self.opts.get('order_masters'):
+            match_ids = minions
+            if match_ids is None:
                 # Fetch a list of minions that match
-                _res = self.ckminions.check_minions(load['tgt'],
-                                                    tgt_type=load['tgt_type'])
-                match_ids = _res['minions']
-
-                log.debug("Publish Side Match: %s", match_ids)
+                try:
+                    match_ids = self.ckminions.check_minions(
+                        load['tgt'],
+                        tgt_type=load['tgt_type'],
+                        delimiter=load.get('delimiter', DEFAULT_TARGET_DELIM))['minions']
+                except Exception as exc:
+                    log.debug('Unable to resolve the target of publish %s: %s',
+                              load.get('jid'), exc)
+
+            log.debug("Publish Side Match: %s", match_ids)
+            if match_ids or load['tgt_type'] == 'list':
                 # Send list of miions thru so zmq can target them
-                int_payload['topic_lst'] = match_ids
-            else:
-                int_payload['topic_lst'] = load['tgt']
+                int_payload['topic_lst'] = match_ids or []
         # Send it over IPC!
         pub_sock.send(int_payload)
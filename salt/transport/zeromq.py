@@ -66,6 +66,67 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# The worker lanes of the master the requests are sent to, by command. The
+# other requests go to the default lane.
+REQ_LANES = {
+    '_auth': 'auth',
+    '_return': 'return',
+    '_syndic_return': 'return',
+    '_pillar': 'pillar',
+    '_serve_file': 'file',
+    '_file_hash': 'file',
+    '_file_hash_and_stat': 'file',
+    '_file_hashes': 'file',
+    '_file_list': 'file',
+    '_file_list_emptydirs': 'file',
+    '_dir_list': 'file',
+    '_symlink_list': 'file',
+    '_file_find': 'file',
+    '_file_envs': 'file',
+}
+
+
+def _req_lane(load):
+    '''
+    Return the worker lane of the master to send a load to, or None for the
+    default lane
+    '''
+    if isinstance(load, dict):
+        return REQ_LANES.get(load.get('cmd'))
+    return None
+
+
+def worker_lanes(opts):
+    '''
+    Return the worker lanes of the master with their number of workers, leaving
+    out the unknown lanes and the lanes without workers, as their requests
+    would never be handled
+    '''
+    known = set(REQ_LANES.values())
+    lanes = {}
+    for lane, workers in six.iteritems(opts.get('worker_lanes') or {}):
+        if lane not in known:
+            log.warning('Ignoring the unknown worker lane %s, the worker lanes '
+                        'are: %s', lane, ', '.join(sorted(known)))
+            continue
+        try:
+            workers = int(workers)
+        except (TypeError, ValueError):
+            workers = 0
+        if workers <= 0:
+            log.warning('Ignoring the worker lane %s, it has no workers, its '
+                        'requests go to the default lane', lane)
+            continue
+        lanes[lane] = workers
+    return lanes
+
+
+def _lane_frame(lane):
+    '''
+    Return the envelope frame routing a request to a worker lane
+    '''
+    return salt.utils.stringutils.to_bytes('lane:{0}'.format(lane))
+
 
 def _get_master_uri(master_ip,
                     master_port,
@@ -273,11 +334,17 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
         # if we've reached here something is very abnormal
         raise SaltException('ReqChannel: missing master_uri/master_ip in self.opts')
 
-    def _package_load(self, load):
-        return {
+    def _package_load(self, load, aead=False, session=False):
+        ret = {
             'enc': self.crypt,
             'load': load,
         }
+        if aead:
+            ret['aead'] = salt.crypt.Crypticle.AEAD
+        if session:
+            # Ask for the reply to be encrypted with our session key
+            ret['session'] = True
+        return ret
 
     @tornado.gen.coroutine
     def crypted_transfer_decode_dictentry(self, load, dictkey=None, tries=3, timeout=60):
@@ -285,26 +352,41 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
             # Return control back to the caller, continue when authentication succeeds
             yield self.auth.authenticate()
         # Return control to the caller. When send() completes, resume by populating ret with the Future.result
+        aead = self.auth.aead
+        session = self.auth.creds.get('session')
+        lane = _req_lane(load)
         ret = yield self.message_client.send(
-            self._package_load(self.auth.crypticle.dumps(load)),
+            self._package_load(self.auth.crypticle.dumps(load, aead=aead),
+                               aead=aead,
+                               session=bool(session)),
             timeout=timeout,
             tries=tries,
+            lane=lane,
         )
-        key = self.auth.get_keys()
-        if 'key' not in ret:
+        if 'key' not in ret and 'session' not in ret:
             # Reauth in the case our key is deleted on the master side.
             yield self.auth.authenticate()
+            aead = self.auth.aead
+            session = self.auth.creds.get('session')
             ret = yield self.message_client.send(
-                self._package_load(self.auth.crypticle.dumps(load)),
+                self._package_load(self.auth.crypticle.dumps(load, aead=aead),
+                                   aead=aead,
+                                   session=bool(session)),
                 timeout=timeout,
                 tries=tries,
+                lane=lane,
             )
-        if HAS_M2:
-            aes = key.private_decrypt(ret['key'],
-                                      RSA.pkcs1_oaep_padding)
+        if 'session' in ret:
+            # Encrypted with the session key we got when we authenticated
+            aes = session
         else:
-            cipher = PKCS1_OAEP.new(key)
-            aes = cipher.decrypt(ret['key'])
+            key = self.auth.get_keys()
+            if HAS_M2:
+                aes = key.private_decrypt(ret['key'],
+                                          RSA.pkcs1_oaep_padding)
+            else:
+                cipher = PKCS1_OAEP.new(key)
+                aes = cipher.decrypt(ret['key'])
         pcrypt = salt.crypt.Crypticle(self.opts, aes)
         data = pcrypt.loads(ret[dictkey])
         if six.PY3:
@@ -329,17 +411,19 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
         @tornado.gen.coroutine
         def _do_transfer():
             # Yield control to the caller. When send() completes, resume by populating data with the Future.result
+            aead = self.auth.aead
             data = yield self.message_client.send(
-                self._package_load(self.auth.crypticle.dumps(load)),
+                self._package_load(self.auth.crypticle.dumps(load, aead=aead), aead=aead),
                 timeout=timeout,
                 tries=tries,
+                lane=_req_lane(load),
             )
             # we may not have always data
             # as for example for saltcall ret submission, this is a blind
             # communication, we do not subscribe to return events, we just
             # upload the results to the master
             if data:
-                data = self.auth.crypticle.loads(data, raw)
+                data = self.auth.crypticle.loads(data, raw, aead=aead)
             if six.PY3 and not raw:
                 data = salt.transport.frame.decode_embedded_strs(data)
             raise tornado.gen.Return(data)
@@ -368,6 +452,7 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
             self._package_load(load),
             timeout=timeout,
             tries=tries,
+            lane=_req_lane(load),
         )
 
         raise tornado.gen.Return(ret)
@@ -602,20 +687,16 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
         self.clients.setsockopt(zmq.BACKLOG, self.opts.get('zmq_backlog', 1000))
         self._start_zmq_monitor()
         self.workers = self.context.socket(zmq.DEALER)
-
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            self.w_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_workers', 4515)
-                )
-        else:
-            self.w_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'workers.ipc')
-                )
+        self.w_uri = self._workers_uri()
 
         log.info('Setting up the master communication server')
         self.clients.bind(self.uri)
         self.workers.bind(self.w_uri)
 
+        if worker_lanes(self.opts):
+            self._lanes_device()
+            return
+
         while True:
             if self.clients.closed or self.workers.closed:
                 break
@@ -628,6 +709,78 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
             except (KeyboardInterrupt, SystemExit):
                 break
 
+    def _workers_uri(self, lane=None):
+        '''
+        Return the URI of the socket the workers of a lane connect to, or of
+        the default lane
+        '''
+        if lane is not None:
+            lanes = sorted(worker_lanes(self.opts))
+            if self.opts.get('ipc_mode', '') == 'tcp':
+                return 'tcp://127.0.0.1:{0}'.format(
+                    self.opts.get('tcp_master_workers', 4515) + 1 + lanes.index(lane)
+                    )
+            return 'ipc://{0}'.format(
+                os.path.join(self.opts['sock_dir'], 'workers-{0}.ipc'.format(lane))
+                )
+        if self.opts.get('ipc_mode', '') == 'tcp':
+            return 'tcp://127.0.0.1:{0}'.format(
+                self.opts.get('tcp_master_workers', 4515)
+                )
+        return 'ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'workers.ipc')
+            )
+
+    def _lanes_device(self):
+        '''
+        Route the requests to the workers of their lane, instead of running a
+        zmq queue device.
+
+        The requests of a lane are queued up to worker_lanes_hwm, then dropped
+        until its workers catch up, for the minions to retry them. A busy lane
+        never holds the requests of the other lanes back. The requests of the
+        lanes without workers go to the default lane.
+        '''
+        lanes = {}
+        for lane in sorted(worker_lanes(self.opts)):
+            sock = self.context.socket(zmq.DEALER)
+            sock.setsockopt(zmq.SNDHWM, self.opts.get('worker_lanes_hwm', 1000))
+            sock.bind(self._workers_uri(lane))
+            lanes[_lane_frame(lane)] = sock
+        self.lanes = list(lanes.values())
+
+        poller = zmq.Poller()
+        poller.register(self.clients, zmq.POLLIN)
+        poller.register(self.workers, zmq.POLLIN)
+        for sock in self.lanes:
+            poller.register(sock, zmq.POLLIN)
+
+        while True:
+            if self.clients.closed or self.workers.closed:
+                break
+            try:
+                events = dict(poller.poll())
+                for sock in events:
+                    frames = sock.recv_multipart(copy=False)
+                    if sock is not self.clients:
+                        # A reply, back to the minion
+                        self.clients.send_multipart(frames, copy=False)
+                        continue
+                    # The identity of the minion comes first, then its lane
+                    workers = self.workers
+                    if len(frames) > 2:
+                        workers = lanes.get(frames[1].bytes, self.workers)
+                    try:
+                        workers.send_multipart(frames, copy=False, flags=zmq.NOBLOCK)
+                    except zmq.Again:
+                        log.warning('Dropping a request, the workers of its lane are busy')
+            except zmq.ZMQError as exc:
+                if exc.errno == errno.EINTR:
+                    continue
+                six.reraise(*sys.exc_info())
+            except (KeyboardInterrupt, SystemExit):
+                break
+
     def close(self):
         '''
         Cleanly shutdown the router socket
@@ -647,6 +800,9 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
             self.clients.close()
         if hasattr(self, 'workers') and self.workers.closed is False:
             self.workers.close()
+        for sock in getattr(self, 'lanes', ()):
+            if sock.closed is False:
+                sock.close()
         if hasattr(self, 'stream'):
             self.stream.close()
         if hasattr(self, '_socket') and self._socket.closed is False:
@@ -679,7 +835,7 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
             threading.Thread(target=self._w_monitor.start_poll).start()
             log.debug('ZMQ monitor has been started started')
 
-    def post_fork(self, payload_handler, io_loop):
+    def post_fork(self, payload_handler, io_loop, lane=None):
         '''
         After forking we need to create all of the local sockets to listen to the
         router
@@ -687,6 +843,7 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
         :param func payload_handler: A function to called to handle incoming payloads as
                                      they are picked up off the wire
         :param IOLoop io_loop: An instance of a Tornado IOLoop, to handle event scheduling
+        :param str lane: The worker lane to handle the requests of, if not the default one
         '''
         self.payload_handler = payload_handler
         self.io_loop = io_loop
@@ -695,14 +852,7 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
         self._socket = self.context.socket(zmq.REP)
         self._start_zmq_monitor()
 
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            self.w_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_workers', 4515)
-                )
-        else:
-            self.w_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'workers.ipc')
-                )
+        self.w_uri = self._workers_uri(lane)
         log.info('Worker binding to socket %s', self.w_uri)
         self._socket.connect(self.w_uri)
 
@@ -711,6 +861,20 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
         self.stream = zmq.eventloop.zmqstream.ZMQStream(self._socket, io_loop=self.io_loop)
         self.stream.on_recv_stream(self.handle_message)
 
+    def idle(self):
+        '''
+        Return True if the worker socket has no request waiting nor reply to
+        send, so that it can be closed without dropping any
+        '''
+        if getattr(self, 'stream', None) is None or self.stream.closed():
+            return True
+        if self.stream.sending():
+            return False
+        # A REP socket is readable with a request waiting, and writable until
+        # the reply to the last request is sent
+        events = self._socket.getsockopt(zmq.EVENTS)
+        return not events & (zmq.POLLIN | zmq.POLLOUT)
+
     @tornado.gen.coroutine
     def handle_message(self, stream, payload):
         '''
@@ -776,11 +940,14 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin,
         if req_fun == 'send_clear':
             stream.send(self.serial.dumps(ret))
         elif req_fun == 'send':
-            stream.send(self.serial.dumps(self.crypticle.dumps(ret)))
+            # Reply in the mode of the request
+            aead = payload.get('aead') == salt.crypt.Crypticle.AEAD
+            stream.send(self.serial.dumps(self.crypticle.dumps(ret, aead=aead)))
         elif req_fun == 'send_private':
             stream.send(self.serial.dumps(self._encrypt_private(ret,
                                                                 req_opts['key'],
                                                                 req_opts['tgt'],
+                                                                session=payload.get('session', False),
                                                                 )))
         else:
             log.error('Unknown req_fun %s', req_fun)
@@ -836,7 +1003,8 @@ def _set_tcp_keepalive(zmq_socket, opts):
             )
 
 
-class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
+class ZeroMQPubServerChannel(salt.transport.mixins.auth.AESPubServerMixin,
+                             salt.transport.server.PubServerChannel):
     '''
     Encapsulate synchronous operations for a publisher channel
     '''
@@ -909,13 +1077,14 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
                 # SIGUSR1 gracefully so we don't choke and die horribly
                 try:
                     log.debug('Publish daemon getting data from puller %s', pull_uri)
-                    package = pull_sock.recv()
-                    log.debug('Publish daemon received payload. size=%d', len(package))
+                    # The targeting header and the payload, which is passed
+                    # on to the minions as is, see publish
+                    header, payload = pull_sock.recv_multipart(copy=False)
+                    log.debug('Publish daemon received payload. size=%d', len(payload))
 
-                    unpacked_package = salt.payload.unpackage(package)
+                    unpacked_package = salt.payload.unpackage(header.bytes)
                     if six.PY3:
                         unpacked_package = salt.transport.frame.decode_embedded_strs(unpacked_package)
-                    payload = unpacked_package['payload']
                     log.trace('Accepted unpacked package from puller')
                     if self.opts['zmq_filtering']:
                         # if you have a specific topic list, use that
@@ -926,25 +1095,25 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
                                 # to avoid collisions
                                 htopic = salt.utils.stringutils.to_bytes(hashlib.sha1(salt.utils.stringutils.to_bytes(topic)).hexdigest())
                                 pub_sock.send(htopic, flags=zmq.SNDMORE)
-                                pub_sock.send(payload)
+                                pub_sock.send(payload, copy=False)
                                 log.trace('Filtered data has been sent')
 
                             # Syndic broadcast
                             if self.opts.get('order_masters'):
                                 log.trace('Sending filtered data to syndic')
                                 pub_sock.send(b'syndic', flags=zmq.SNDMORE)
-                                pub_sock.send(payload)
+                                pub_sock.send(payload, copy=False)
                                 log.trace('Filtered data has been sent to syndic')
                         # otherwise its a broadcast
                         else:
                             # TODO: constants file for "broadcast"
                             log.trace('Sending broadcasted data over publisher %s', pub_uri)
                             pub_sock.send(b'broadcast', flags=zmq.SNDMORE)
-                            pub_sock.send(payload)
+                            pub_sock.send(payload, copy=False)
                             log.trace('Broadcasted data has been sent')
                     else:
                         log.trace('Sending ZMQ-unfiltered data over publisher %s', pub_uri)
-                        pub_sock.send(payload)
+                        pub_sock.send(payload, copy=False)
                         log.trace('Unfiltered data has been sent')
                 except zmq.ZMQError as exc:
                     if exc.errno == errno.EINTR:
@@ -1015,21 +1184,19 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
             self._sock_data.sock.close()
             delattr(self._sock_data, 'sock')
 
-    def publish(self, load):
+    def publish(self, load, minions=None):
         '''
         Publish "load" to minions. This send the load to the publisher daemon
         process with does the actual sending to minions.
 
         :param dict load: A load to be sent across the wire to minions
+        :param list minions: The minions matching the target of the load, if
+            the master already resolved them
         '''
-        payload = {'enc': 'aes'}
-        crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
-        payload['load'] = crypticle.dumps(load)
-        if self.opts['sign_pub_messages']:
-            master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
-            log.debug("Signing data packet")
-            payload['sig'] = salt.crypt.sign_message(master_pem_path, payload['load'])
-        int_payload = {'payload': self.serial.dumps(payload)}
+        payload = self.serial.dumps(self._encrypt_publish(load))
+        # The targeting goes in a header frame of its own, so that the
+        # publish daemon sends the payload without parsing or copying it
+        int_payload = {}
 
         # add some targeting stuff for lists only (for now)
         if load['tgt_type'] == 'list':
@@ -1038,22 +1205,24 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
         # If zmq_filtering is enabled, target matching has to happen master side
         match_targets = ["pcre", "glob", "list"]
         if self.opts['zmq_filtering'] and load['tgt_type'] in match_targets:
-            # Fetch a list of minions that match
-            _res = self.ckminions.check_minions(load['tgt'],
-                                                tgt_type=load['tgt_type'])
-            match_ids = _res['minions']
+            match_ids = minions
+            if match_ids is None:
+                # Fetch a list of minions that match
+                _res = self.ckminions.check_minions(load['tgt'],
+                                                    tgt_type=load['tgt_type'])
+                match_ids = _res['minions']
 
             log.debug("Publish Side Match: %s", match_ids)
             # Send list of miions thru so zmq can target them
             int_payload['topic_lst'] = match_ids
-        payload = self.serial.dumps(int_payload)
+        header = self.serial.dumps(int_payload)
         log.debug(
             'Sending payload to publish daemon. jid=%s size=%d',
             load.get('jid', None), len(payload),
         )
         if not self.pub_sock:
             self.pub_connect()
-        self.pub_sock.send(payload)
+        self.pub_sock.send_multipart([header, payload], copy=False)
         log.debug('Sent payload to publish daemon.')
 
 
@@ -1062,7 +1231,11 @@ class AsyncReqMessageClientPool(salt.transport.MessageClientPool):
     Wrapper class of AsyncReqMessageClientPool to avoid blocking waiting while writing data to socket.
     '''
     def __init__(self, opts, args=None, kwargs=None):
-        super(AsyncReqMessageClientPool, self).__init__(AsyncReqMessageClient, opts, args=args, kwargs=kwargs)
+        if opts.get('zmq_req_multiplex', True):
+            tgt = AsyncDealerMessageClient
+        else:
+            tgt = AsyncReqMessageClient
+        super(AsyncReqMessageClientPool, self).__init__(tgt, opts, args=args, kwargs=kwargs)
         self._closing = False
 
     def close(self):
@@ -1102,6 +1275,8 @@ class AsyncReqMessageClient(object):
     message sends in this class. In the future if we decide to attempt to multiplex
     we can manage a pool of REQ/REP sockets-- but for now we'll just do them in serial
     '''
+    socket_type = zmq.REQ
+
     def __init__(self, opts, addr, linger=0, io_loop=None):
         '''
         Create an asynchronous message client
@@ -1177,7 +1352,7 @@ class AsyncReqMessageClient(object):
             del self.stream
             del self.socket
 
-        self.socket = self.context.socket(zmq.REQ)
+        self.socket = self.context.socket(self.socket_type)
 
         # socket options
         if hasattr(zmq, 'RECONNECT_IVL_MAX'):
@@ -1259,9 +1434,12 @@ class AsyncReqMessageClient(object):
             else:
                 future.set_exception(SaltReqTimeoutError('Message timed out'))
 
-    def send(self, message, timeout=None, tries=3, future=None, callback=None, raw=False):
+    def send(self, message, timeout=None, tries=3, future=None, callback=None, raw=False, lane=None):
         '''
         Return a future which will be completed when the message has a response
+
+        The REQ socket can't route the message to a worker lane of the master,
+        it goes to the default lane.
         '''
         if future is None:
             future = tornado.concurrent.Future()
@@ -1293,6 +1471,118 @@ class AsyncReqMessageClient(object):
         return future
 
 
+class AsyncDealerMessageClient(AsyncReqMessageClient):
+    '''
+    This class wraps an underlying zeromq DEALER socket, which keeps many
+    requests in flight on a single connection to the master.
+
+    Each request is sent with a request id frame ahead of the empty delimiter
+    frame. The ROUTER socket of the master and the REP sockets of its workers
+    keep it in the envelope of the request and send it back with the reply,
+    which is matched to its request by it. The replies come back in the order
+    the workers of the master handle the requests, and the replies to timed
+    out requests are dropped.
+
+    Requests sent to a worker lane of the master get a lane frame ahead of the
+    request id, which the master routes them on. Masters without worker lanes
+    keep it in the envelope like the request id.
+    '''
+    socket_type = zmq.DEALER
+
+    def __init__(self, opts, addr, linger=0, io_loop=None):
+        self._request_id = 0
+        super(AsyncDealerMessageClient, self).__init__(opts, addr, linger=linger, io_loop=io_loop)
+
+    def _init_socket(self):
+        super(AsyncDealerMessageClient, self)._init_socket()
+        self.stream.on_recv(self._handle_reply)
+
+    def _handle_reply(self, msg):
+        if len(msg) < 3 or msg[-2]:
+            log.error('Dropping a reply with %d frames from %s', len(msg), self.addr)
+            return
+        request_id = msg[-3]
+        future = self.send_future_map.pop(request_id, None)
+        if future is None:
+            # Timedout
+            return
+        self._remove_request(request_id)
+        if not future.done():
+            future.set_result(self.serial.loads(msg[-1]))
+
+    def _remove_request(self, request_id):
+        try:
+            self.send_queue.remove(request_id)
+        except ValueError:
+            pass
+        self.remove_message_timeout(request_id)
+
+    def timeout_message(self, message):
+        '''
+        Handle a request timeout by forgetting its request id and informing
+        the caller. The request is sent again under a new request id if it has
+        tries left.
+
+        :raises: SaltReqTimeoutError
+        '''
+        future = self.send_future_map.pop(message, None)
+        self.send_timeout_map.pop(message, None)
+        self._remove_request(message)
+        if future is None or future.done():
+            return
+        if future.attempts < future.tries:
+            future.attempts += 1
+            log.debug('SaltReqTimeoutError, retrying. (%s/%s)', future.attempts, future.tries)
+            self.send(
+                future.message,
+                timeout=future.timeout,
+                tries=future.tries,
+                future=future,
+                lane=future.lane,
+            )
+        else:
+            future.set_exception(SaltReqTimeoutError('Message timed out'))
+
+    def send(self, message, timeout=None, tries=3, future=None, callback=None, raw=False, lane=None):
+        '''
+        Return a future which will be completed when the message has a response
+        '''
+        if future is None:
+            future = tornado.concurrent.Future()
+            future.tries = tries
+            future.attempts = 0
+            future.timeout = timeout
+            future.lane = lane
+            # if a future wasn't passed in, we need to serialize the message
+            future.message = self.serial.dumps(message)
+        if callback is not None:
+            def handle_future(future):
+                response = future.result()
+                self.io_loop.add_callback(callback, response)
+            future.add_done_callback(handle_future)
+
+        self._request_id = (self._request_id + 1) % 0xFFFFFFFF
+        request_id = salt.utils.stringutils.to_bytes(six.text_type(self._request_id))
+        # Add this future to the mapping
+        self.send_future_map[request_id] = future
+
+        if self.opts.get('detect_mode') is True:
+            timeout = 1
+
+        if timeout is not None:
+            send_timeout = self.io_loop.call_later(timeout, self.timeout_message, request_id)
+            self.send_timeout_map[request_id] = send_timeout
+
+        # The requests in flight, for AsyncReqMessageClientPool to balance them
+        self.send_queue.append(request_id)
+        if lane is None:
+            self.stream.send_multipart([request_id, b'', future.message])
+        else:
+            self.stream.send_multipart([_lane_frame(lane), request_id, b'', future.message])
+
+        return future
+
+
 class ZeroMQSocketMonitor(object):
     __EVENT_MAP = None
 
@@ -11,6 +11,7 @@ import os.path
 import pipes
 import pprint
 import re
+import threading
 import uuid
 from functools import wraps
 from xml.dom import minidom
@@ -45,6 +46,10 @@ __all__ = [
 
 GLOBAL_UUID = uuid.UUID('91633EBF-1C86-5E33-935A-28061F4B480E')
 
+# The locks of the templates cached, striped by saltenv and URL, so that the SLS
+# files rendered in threads don't write the same template to the cache at once
+_CACHE_LOCKS = [threading.Lock() for _ in range(32)]
+
 
 class SaltCacheLoader(BaseLoader):
     '''
@@ -87,7 +92,9 @@ class SaltCacheLoader(BaseLoader):
         Cache a file from the salt master
         '''
         saltpath = salt.utils.url.create(template)
-        self.file_client().get_file(saltpath, '', True, self.saltenv)
+        lock = _CACHE_LOCKS[hash((self.saltenv, saltpath)) % len(_CACHE_LOCKS)]
+        with lock:
+            self.file_client().get_file(saltpath, '', True, self.saltenv)
 
     def check_cache(self, template):
         '''
@@ -441,6 +441,10 @@ class MasterPillarUtil(object):
             # to read in the pillar/grains data since they are both stored
             # in the same file, 'data.p'
             grains, pillars = self._get_cached_minion_data(*minion_ids)
+        if salt.utils.minions.MinionDataIndex.enabled(self.opts):
+            index = salt.utils.minions.MinionDataIndex(self.opts)
+        else:
+            index = None
         try:
             c_minions = self.cache.list('minions')
             for minion_id in minion_ids:
@@ -458,10 +462,16 @@ class MasterPillarUtil(object):
                     (clear_grains and not minion_pillar)):
                     # Not saving pillar or grains, so just delete the cache file
                     self.cache.flush(bank, 'data')
+                    if index is not None:
+                        index.remove(minion_id)
                 elif clear_pillar and minion_grains:
                     self.cache.store(bank, 'data', {'grains': minion_grains})
+                    if index is not None:
+                        index.update(minion_id, {'grains': minion_grains})
                 elif clear_grains and minion_pillar:
                     self.cache.store(bank, 'data', {'pillar': minion_pillar})
+                    if index is not None:
+                        index.update(minion_id, {'pillar': minion_pillar})
                 if clear_mine:
                     # Delete the whole mine file
                     self.cache.flush(bank, 'mine')
@@ -8,12 +8,17 @@ expected to return
 from __future__ import absolute_import, unicode_literals
 import os
 import fnmatch
+import hashlib
+import mmap
 import re
 import logging
+import struct
+import time
 
 # Import salt libs
 import salt.payload
 import salt.roster
+import salt.utils.atomicfile
 import salt.utils.data
 import salt.utils.files
 import salt.utils.network
@@ -179,6 +184,681 @@ def nodegroup_comp(nodegroup, nodegroups, skip=None, first_call=True):
         return ret
 
 
+# Maximum number of compiled compound targets kept by a CkMinions instance
+COMPOUND_CACHE_SIZE = 1024
+
+_COMPOUND_OPERS = ('and', 'or', 'not', '(', ')')
+
+
+def compile_compound(expr, nodegroups=None):
+    '''
+    Parse a compound target into a tree of tuples, which
+    CkMinions._eval_compound evaluates with set operations:
+
+    - ``('and', left, right)`` and ``('or', left, right)``
+    - ``('not', operand)``
+    - ``('match', engine, pattern, delimiter)``, with ``engine`` being None
+      for plain globs
+
+    ``not`` binds tighter than ``and``, which binds tighter than ``or``. A
+    ``not`` following an operand is an implicit ``and``, and parentheses left
+    open at the end of the expression are implicitly closed. Nodegroups are
+    expanded in place.
+
+    Return None if the target is invalid.
+    '''
+    if nodegroups is None:
+        nodegroups = {}
+    if isinstance(expr, six.string_types):
+        words = expr.split()
+    else:
+        # we make a shallow copy in order to not affect the passed in arg
+        words = list(expr)
+
+    tokens = []
+    while words:
+        word = words.pop(0)
+        if not isinstance(word, six.string_types):
+            word = six.text_type(word)
+        if word in _COMPOUND_OPERS:
+            tokens.append(word)
+            continue
+        target_info = parse_target(word)
+        if target_info['engine'] == 'N':
+            # if we encounter a node group, just evaluate it in-place
+            decomposed = nodegroup_comp(target_info['pattern'], nodegroups)
+            if decomposed:
+                words = decomposed + words
+            continue
+        if target_info['engine']:
+            tokens.append(('match',
+                           target_info['engine'],
+                           target_info['pattern'],
+                           target_info['delimiter']))
+        else:
+            tokens.append(('match', None, word, None))
+
+    pos = [0]
+
+    def _peek():
+        if pos[0] < len(tokens):
+            return tokens[pos[0]]
+        return None
+
+    def _parse_or():
+        node = _parse_and()
+        while _peek() == 'or':
+            pos[0] += 1
+            node = ('or', node, _parse_and())
+        return node
+
+    def _parse_and():
+        node = _parse_not()
+        while _peek() in ('and', 'not'):
+            if _peek() == 'and':
+                pos[0] += 1
+            node = ('and', node, _parse_not())
+        return node
+
+    def _parse_not():
+        token = _peek()
+        pos[0] += 1
+        if token == 'not':
+            return ('not', _parse_not())
+        if token == '(':
+            if _peek() in ('and', 'or'):
+                raise ValueError(
+                    'Invalid beginning operator after "(": {0}'.format(_peek()))
+            node = _parse_or()
+            if _peek() == ')':
+                pos[0] += 1
+            elif _peek() is not None:
+                raise ValueError('Unexpected word: {0}'.format(_peek()))
+            return node
+        if token is None:
+            raise ValueError('Unexpected end of expression')
+        if token in _COMPOUND_OPERS:
+            raise ValueError('Unexpected operator: {0}'.format(token))
+        return token
+
+    try:
+        tree = _parse_or()
+        if _peek() is not None:
+            raise ValueError('Unexpected word: {0}'.format(_peek()))
+    except ValueError as exc:
+        log.error('Invalid compound target %s: %s', expr, exc)
+        return None
+    return tree
+
+
+# Per-process cache of the minion data index files, keyed by path. Each entry
+# holds the (st_mtime, st_ino) of the file it was loaded from, so that an index
+# file rewritten by another master process is transparently reloaded.
+_INDEX_FILE_CACHE = {}
+
+# Values longer than this are not indexed, minions holding them are verified
+# against their full cached data instead.
+INDEX_MAX_VALUE_LEN = 256
+
+# Separator for the components of an indexed data path
+_INDEX_PATH_SEP = '\x1f'
+
+_INDEX_SET_KINDS = ('dict', 'list', 'complex')
+_INDEX_MAP_KINDS = ('value', 'key')
+
+
+def _index_value(value):
+    '''
+    Normalize a scalar value the same way salt.utils.data.subdict_match does
+    before comparing it to a target
+    '''
+    try:
+        return six.text_type(value).lower()
+    except UnicodeDecodeError:
+        return salt.utils.stringutils.to_unicode(value).lower()
+
+
+def _index_entries(data, path=()):
+    '''
+    Flatten ``data`` into a set of ``(path, kind, value)`` index entries.
+
+    ``kind`` is one of ``value`` (a scalar, or a scalar member of a list),
+    ``key`` (a key of a dict), ``dict`` and ``list`` (the path holds a
+    non-empty dict or list) or ``complex`` (the path holds something that can
+    only be matched against the full data).
+    '''
+    ret = set()
+    for key, val in six.iteritems(data):
+        if not isinstance(key, six.string_types):
+            # Unreachable by salt.utils.data.traverse_dict_and_list
+            continue
+        sub = path + (key,)
+        pathkey = _INDEX_PATH_SEP.join(sub)
+        if isinstance(val, dict):
+            if not val:
+                continue
+            ret.add((pathkey, 'dict', None))
+            for subkey in val:
+                if isinstance(subkey, six.string_types):
+                    ret.add((pathkey, 'key', subkey))
+            ret.update(_index_entries(val, sub))
+        elif isinstance(val, (list, tuple)):
+            if not val:
+                continue
+            ret.add((pathkey, 'list', None))
+            for member in val:
+                if isinstance(member, (dict, list, tuple)):
+                    ret.add((pathkey, 'complex', None))
+                    continue
+                member = _index_value(member)
+                if len(member) > INDEX_MAX_VALUE_LEN:
+                    ret.add((pathkey, 'complex', None))
+                else:
+                    ret.add((pathkey, 'value', member))
+        else:
+            val = _index_value(val)
+            if len(val) > INDEX_MAX_VALUE_LEN:
+                ret.add((pathkey, 'complex', None))
+            else:
+                ret.add((pathkey, 'value', val))
+    return ret
+
+
+class KeyCache(object):
+    '''
+    The accepted, pending and rejected minion keys of the master, shared by
+    all the master processes when ``key_cache`` is ``shared``.
+
+    The Maintenance process owns the key lists: whenever the key directories
+    change, it writes the lists to the ``.key_state`` file of the pki_dir and
+    then increments the generation counter kept in the memory mapped
+    ``.key_generation`` file. The other processes only compare the counter
+    with the generation of the lists they loaded, so that listing the keys and
+    testing the membership of a key don't touch the filesystem until the keys
+    change.
+    '''
+    STATE_FILE = '.key_state'
+    GENERATION_FILE = '.key_generation'
+    # The key directories changed in the last seconds may change again without
+    # their mtime changing, they are listed again on the next refresh
+    RACY_DELAY = 2
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        if opts.get('transport', 'zeromq') in ('zeromq', 'tcp'):
+            self.dirs = ('minions', 'minions_pre', 'minions_rejected')
+        else:
+            self.dirs = ('accepted', 'pending', 'rejected')
+        self._generation_map = None
+        self._generation = None
+        self._keys = None
+        # The mtimes of the key directories when they were last published
+        self._dir_stamps = None
+
+    def _map_generation(self, write=False):
+        '''
+        Return the memory map of the generation counter, None if it is not
+        published yet
+        '''
+        if self._generation_map is None:
+            path = os.path.join(self.opts['pki_dir'], self.GENERATION_FILE)
+            try:
+                if write:
+                    # The file must never be replaced, the readers would keep
+                    # mapping the old one
+                    with salt.utils.files.fopen(path, 'ab') as fp_:
+                        if fp_.tell() < 8:
+                            fp_.write(b'\0' * (8 - fp_.tell()))
+                    with salt.utils.files.fopen(path, 'r+b') as fp_:
+                        self._generation_map = mmap.mmap(fp_.fileno(), 8)
+                else:
+                    with salt.utils.files.fopen(path, 'rb') as fp_:
+                        self._generation_map = mmap.mmap(
+                            fp_.fileno(), 8, access=mmap.ACCESS_READ)
+            except (IOError, OSError, ValueError) as exc:
+                if write:
+                    log.error('Unable to map the key generation file %s: %s', path, exc)
+                return None
+        return self._generation_map
+
+    def _load(self):
+        '''
+        Return the published key lists, loading them again if their generation
+        changed, or None if they are not published
+        '''
+        generation_map = self._map_generation()
+        if generation_map is None:
+            return None
+        generation = struct.unpack_from(str('<Q'), generation_map)[0]
+        if self._keys is None or generation != self._generation:
+            path = os.path.join(self.opts['pki_dir'], self.STATE_FILE)
+            try:
+                with salt.utils.files.fopen(path, 'rb') as fp_:
+                    state = self.serial.load(fp_)
+            except (IOError, OSError) as exc:
+                log.debug('Unable to read the key cache %s: %s', path, exc)
+                return None
+            self._keys = dict(
+                (name, (keys, frozenset(keys)))
+                for name, keys in six.iteritems(state['keys'])
+            )
+            # The state is written before the counter is incremented
+            self._generation = state['generation']
+        return self._keys
+
+    def keys(self, name):
+        '''
+        Return the sorted list of the keys of the directory name of the
+        pki_dir, or None if the keys are not published. The list must not be
+        modified.
+        '''
+        keys = self._load()
+        if keys is None or name not in keys:
+            return None
+        return keys[name][0]
+
+    def key_set(self, name):
+        '''
+        Return the frozenset of the keys of the directory name of the pki_dir,
+        or None if the keys are not published
+        '''
+        keys = self._load()
+        if keys is None or name not in keys:
+            return None
+        return keys[name][1]
+
+    def refresh(self):
+        '''
+        Publish the key lists if the key directories changed since they were
+        last published. Only the Maintenance process publishes them.
+
+        Return True if they were published.
+        '''
+        now = time.time()
+        stamps = []
+        for name in self.dirs:
+            try:
+                stamps.append(os.stat(os.path.join(self.opts['pki_dir'], name)).st_mtime)
+            except OSError:
+                stamps.append(None)
+        if stamps == self._dir_stamps:
+            return False
+        generation_map = self._map_generation(write=True)
+        if generation_map is None:
+            return False
+
+        keys = {}
+        for name in self.dirs:
+            path = os.path.join(self.opts['pki_dir'], name)
+            try:
+                names = os.listdir(path)
+            except OSError:
+                names = []
+            keys[name] = [
+                fn_ for fn_ in salt.utils.data.sorted_ignorecase(names)
+                if not fn_.startswith('.') and os.path.isfile(os.path.join(path, fn_))
+            ]
+        generation = struct.unpack_from(str('<Q'), generation_map)[0] + 1
+        try:
+            with salt.utils.atomicfile.atomic_open(
+                    os.path.join(self.opts['pki_dir'], self.STATE_FILE), 'wb') as fp_:
+                self.serial.dump({'generation': generation, 'keys': keys}, fp_)
+        except (IOError, OSError) as exc:
+            log.error('Unable to write the key cache: %s', exc)
+            return False
+        struct.pack_into(str('<Q'), generation_map, 0, generation)
+        log.debug('Published generation %s of the key cache', generation)
+
+        if all(stamp is None or now - stamp >= self.RACY_DELAY for stamp in stamps):
+            self._dir_stamps = stamps
+        else:
+            self._dir_stamps = None
+        return True
+
+
+class MinionDataIndex(object):
+    '''
+    Inverted index of the grains and pillar held in the minion data cache.
+
+    The index maps every data path (``os``, ``roles``, ``ip_interfaces:eth0``,
+    ...) and value to the set of minions holding it, so that grain and pillar
+    targets can be resolved with set lookups instead of fetching the cached
+    data of every minion. It lives under ``<cachedir>/minion_index``:
+
+    ``grains/<hash>.p``, ``pillar/<hash>.p``
+        One file per top level grain/pillar key. A target only ever needs the
+        file of its first key component.
+
+    ``minions/<minion_id>.p``
+        The entries indexed for each minion, so that an update only rewrites
+        the files of the keys which actually changed.
+
+    ``.complete``
+        Written once the index has been built from the whole minion data
+        cache. Until then lookups are not served from the index.
+
+    The index is maintained incrementally by :py:meth:`update` and
+    :py:meth:`remove` whenever the minion data cache is written, and is shared
+    by all the master processes.
+    '''
+    SEARCH_TYPES = ('grains', 'pillar')
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        self.index_dir = os.path.join(opts['cachedir'], 'minion_index')
+        self.complete_fn = os.path.join(self.index_dir, '.complete')
+
+    @staticmethod
+    def enabled(opts):
+        '''
+        Return True if the master is configured to maintain the index
+        '''
+        return bool(opts.get('minion_data_cache', False)
+                    and opts.get('minion_data_index', False))
+
+    def _minion_path(self, minion_id):
+        return os.path.join(self.index_dir, 'minions', '{0}.p'.format(minion_id))
+
+    def _key_path(self, search_type, top_key):
+        digest = hashlib.sha256(
+            salt.utils.stringutils.to_bytes(top_key)).hexdigest()
+        return os.path.join(self.index_dir, search_type, '{0}.p'.format(digest))
+
+    def _read(self, path):
+        try:
+            with salt.utils.files.fopen(path, 'rb') as fp_:
+                return self.serial.load(fp_)
+        except (IOError, OSError):
+            return None
+        except Exception as exc:
+            log.error('Unable to read minion data index file %s: %s', path, exc)
+            return None
+
+    @staticmethod
+    def _makedirs(path):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                pass
+
+    def _write(self, path, data):
+        self._makedirs(path)
+        with salt.utils.atomicfile.atomic_open(path, 'wb') as fp_:
+            self.serial.dump(data, fp_)
+
+    def _load_key(self, path):
+        '''
+        Load an index file, using the per-process cache if it did not change
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            _INDEX_FILE_CACHE.pop(path, None)
+            return {}
+        stamp = (stat.st_mtime, stat.st_ino)
+        cached = _INDEX_FILE_CACHE.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        data = self._read(path) or {}
+        # Sets are stored as lists
+        for entry in six.itervalues(data):
+            for kind in _INDEX_MAP_KINDS:
+                entry[kind] = dict(
+                    (val, set(ids)) for val, ids in six.iteritems(entry.get(kind, {}))
+                )
+            for kind in _INDEX_SET_KINDS:
+                entry[kind] = set(entry.get(kind, []))
+        _INDEX_FILE_CACHE[path] = (stamp, data)
+        return data
+
+    def _dump_key(self, path, data):
+        out = {}
+        for pathkey, entry in six.iteritems(data):
+            dumped = {}
+            for kind in _INDEX_MAP_KINDS:
+                vals = dict(
+                    (val, sorted(ids)) for val, ids in six.iteritems(entry[kind]) if ids
+                )
+                if vals:
+                    dumped[kind] = vals
+            for kind in _INDEX_SET_KINDS:
+                if entry[kind]:
+                    dumped[kind] = sorted(entry[kind])
+            if dumped:
+                out[pathkey] = dumped
+        _INDEX_FILE_CACHE.pop(path, None)
+        if out:
+            self._write(path, out)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _apply(self, changes):
+        '''
+        Apply index changes. ``changes`` maps ``(search_type, top_key)`` to
+        a list of ``(minion_id, removed_entries, added_entries)``.
+        '''
+        for (search_type, top_key), minion_changes in six.iteritems(changes):
+            path = self._key_path(search_type, top_key)
+            self._makedirs(path)
+            # An flock is released by the kernel if its holder dies, so a
+            # crashed worker can't leave a stale lock behind
+            with salt.utils.files.flopen(path + '.lock', 'a'):
+                # Work on a private copy, the cached one is shared
+                _INDEX_FILE_CACHE.pop(path, None)
+                data = self._load_key(path)
+                for minion_id, removed, added in minion_changes:
+                    for pathkey, kind, value in removed:
+                        entry = data.get(pathkey)
+                        if entry is None:
+                            continue
+                        if kind in _INDEX_MAP_KINDS:
+                            entry[kind].get(value, set()).discard(minion_id)
+                        else:
+                            entry[kind].discard(minion_id)
+                    for pathkey, kind, value in added:
+                        entry = data.setdefault(
+                            pathkey,
+                            {'value': {}, 'key': {}, 'dict': set(),
+                             'list': set(), 'complex': set()})
+                        if kind in _INDEX_MAP_KINDS:
+                            entry[kind].setdefault(value, set()).add(minion_id)
+                        else:
+                            entry[kind].add(minion_id)
+                self._dump_key(path, data)
+
+    @staticmethod
+    def _group(entries):
+        '''
+        Group index entries by top level key
+        '''
+        ret = {}
+        for entry in entries:
+            top_key = entry[0].split(_INDEX_PATH_SEP, 1)[0]
+            ret.setdefault(top_key, set()).add(tuple(entry))
+        return ret
+
+    def _changes(self, minion_id, data, changes):
+        '''
+        Compute the index changes for the new cached ``data`` of a minion and
+        store its new index record. ``data`` being None removes the minion.
+        '''
+        minion_path = self._minion_path(minion_id)
+        old = self._read(minion_path) or {}
+        new = {}
+        for search_type in self.SEARCH_TYPES:
+            old_entries = self._group(old.get(search_type, []))
+            new_entries = {}
+            if data is not None:
+                search_data = data.get(search_type)
+                if isinstance(search_data, dict):
+                    entries = _index_entries(search_data)
+                    new_entries = self._group(entries)
+                    new[search_type] = sorted(
+                        [list(entry) for entry in entries],
+                        key=lambda x: (x[0], x[1], x[2] or '')
+                    )
+            for top_key in set(old_entries) | set(new_entries):
+                removed = old_entries.get(top_key, set())
+                added = new_entries.get(top_key, set())
+                if removed == added:
+                    continue
+                changes.setdefault((search_type, top_key), []).append(
+                    (minion_id, removed - added, added - removed))
+        if data is None:
+            try:
+                os.remove(minion_path)
+            except OSError:
+                pass
+        elif new != old or not os.path.isfile(minion_path):
+            self._write(minion_path, new)
+
+    def _safe_apply(self, changes):
+        try:
+            self._apply(changes)
+        except (IOError, OSError) as exc:
+            # A partially applied change would return wrong targets, drop
+            # the index so that it gets rebuilt from the minion data cache.
+            log.error('Unable to update the minion data index, it will be '
+                      'rebuilt: %s', exc)
+            self.invalidate()
+            return False
+        return True
+
+    def is_complete(self):
+        '''
+        Return True if the index covers the whole minion data cache
+        '''
+        return os.path.isfile(self.complete_fn)
+
+    def invalidate(self):
+        '''
+        Mark the index as incomplete, so that it is rebuilt on next use
+        '''
+        try:
+            os.remove(self.complete_fn)
+        except OSError:
+            pass
+
+    def update(self, minion_id, data):
+        '''
+        Index the grains and pillar of a minion, as stored in the ``data`` key
+        of the ``minions/<minion_id>`` bank of the minion data cache
+        '''
+        changes = {}
+        try:
+            self._changes(minion_id, data, changes)
+        except (IOError, OSError) as exc:
+            log.error('Unable to update the minion data index for %s: %s',
+                      minion_id, exc)
+            self.invalidate()
+            return
+        self._safe_apply(changes)
+
+    def remove(self, *minion_ids):
+        '''
+        Remove minions from the index
+        '''
+        changes = {}
+        try:
+            for minion_id in minion_ids:
+                self._changes(minion_id, None, changes)
+        except (IOError, OSError) as exc:
+            log.error('Unable to remove minions from the minion data '
+                      'index: %s', exc)
+            self.invalidate()
+            return
+        self._safe_apply(changes)
+
+    def build(self, minion_data):
+        '''
+        Index the cached data of all minions at once. ``minion_data`` maps all
+        the minion ids found in the minion data cache to their cached data.
+        '''
+        changes = {}
+        try:
+            for minion_id in set(self.indexed_minions()) - set(minion_data):
+                self._changes(minion_id, None, changes)
+            for minion_id, data in six.iteritems(minion_data):
+                self._changes(minion_id, data, changes)
+        except (IOError, OSError) as exc:
+            log.error('Unable to build the minion data index: %s', exc)
+            return
+        if not self._safe_apply(changes):
+            return
+        self._makedirs(self.complete_fn)
+        try:
+            with salt.utils.files.fopen(self.complete_fn, 'w'):
+                pass
+        except (IOError, OSError) as exc:
+            log.error('Unable to mark the minion data index as complete: %s', exc)
+
+    def indexed_minions(self):
+        '''
+        Return the ids of the indexed minions
+        '''
+        try:
+            return [fn_[:-2] for fn_ in os.listdir(os.path.join(self.index_dir, 'minions'))
+                    if fn_.endswith('.p') and not fn_.startswith('.')]
+        except OSError:
+            return []
+
+    def match(self, search_type, expr, delimiter=DEFAULT_TARGET_DELIM, exact_match=False):
+        '''
+        Resolve a grain or pillar glob/exact target against the index, with
+        the semantics of salt.utils.data.subdict_match.
+
+        Return a tuple of the set of minions known to match and the set of
+        minions holding data which can only be matched against their full
+        cached data. Return None if the target cannot be resolved by the
+        index, in which case the cache must be scanned.
+        '''
+        if delimiter != DEFAULT_TARGET_DELIM:
+            # Nested dict matches in subdict_match always use the default
+            # delimiter, which the index relies upon
+            return None
+        splits = expr.split(delimiter)
+        matched = set()
+        verify = set()
+        if len(splits) == 1:
+            return matched, verify
+        if splits[0] == '*':
+            return None
+        data = self._load_key(self._key_path(search_type, splits[0]))
+        for idx in range(len(splits) - 1, 0, -1):
+            # Minions holding a list along the path may match through a list
+            # index or through a dict embedded in the list
+            for pidx in range(1, idx):
+                prefix = data.get(_INDEX_PATH_SEP.join(splits[:pidx]))
+                if prefix is not None:
+                    verify.update(prefix['list'])
+            entry = data.get(_INDEX_PATH_SEP.join(splits[:idx]))
+            if entry is None:
+                continue
+            matchstr = delimiter.join(splits[idx:])
+            pattern = _index_value(matchstr)
+            if exact_match or not any(char in pattern for char in '*?['):
+                matched.update(entry['value'].get(pattern, ()))
+            else:
+                for value, ids in six.iteritems(entry['value']):
+                    if fnmatch.fnmatch(value, pattern):
+                        matched.update(ids)
+            if matchstr == '*':
+                matched.update(entry['dict'])
+            elif matchstr.startswith('*:'):
+                verify.update(entry['dict'])
+            matched.update(entry['key'].get(matchstr, ()))
+            verify.update(entry['complex'])
+        verify.difference_update(matched)
+        return matched, verify
+
+
 class CkMinions(object):
     '''
     Used to check what minions should respond from a target
@@ -192,6 +872,20 @@ class CkMinions(object):
         self.opts = opts
         self.serial = salt.payload.Serial(opts)
         self.cache = salt.cache.factory(opts)
+        if MinionDataIndex.enabled(opts):
+            self.index = MinionDataIndex(opts)
+        else:
+            self.index = None
+        # Compiled compound targets
+        self._compound_cache = {}
+        # The key lists published by the Maintenance process
+        if opts.get('key_cache') == 'shared':
+            self.key_cache = KeyCache(opts)
+        else:
+            self.key_cache = None
+        # Accepted keys and cached minions shared by the sub-matchers of a
+        # compound target, see _from_snapshot
+        self._snapshot = None
         # TODO: this is actually an *auth* check
         if self.opts.get('transport', 'zeromq') in ('zeromq', 'tcp'):
             self.acc = 'minions'
@@ -219,7 +913,7 @@ class CkMinions(object):
         '''
         if isinstance(expr, six.string_types):
             expr = [m for m in expr.split(',') if m]
-        minions = self._pki_minions()
+        minions = self._pki_minion_set()
         return {'minions': [x for x in expr if x in minions],
                 'missing': [] if ignore_missing else [x for x in expr if x not in minions]}
 
@@ -231,11 +925,67 @@ class CkMinions(object):
         return {'minions': [m for m in self._pki_minions() if reg.match(m)],
                 'missing': []}
 
+    def _from_snapshot(self, name, func):
+        '''
+        Return the result of ``func``, which is computed only once for the
+        duration of a compound target evaluation
+        '''
+        if self._snapshot is None:
+            return func()
+        if name not in self._snapshot:
+            self._snapshot[name] = func()
+        ret = self._snapshot[name]
+        # Callers are free to modify the returned list
+        return list(ret) if ret is not None else None
+
     def _pki_minions(self):
         '''
         Retreive complete minion list from PKI dir.
         Respects cache if configured
         '''
+        return self._from_snapshot('pki_minions', self._read_pki_minions)
+
+    def _pki_minion_set(self):
+        '''
+        Return the set of the minions of the PKI dir
+        '''
+        if self.key_cache is not None:
+            minions = self.key_cache.key_set(self.acc)
+            if minions is not None:
+                return minions
+        return set(self._pki_minions())
+
+    def _accepted_minions(self):
+        '''
+        Return the list of accepted minions, listing the PKI dir
+        '''
+        def _list_accepted():
+            if self.key_cache is not None:
+                minions = self.key_cache.keys(self.acc)
+                if minions is not None:
+                    return list(minions)
+            minions = []
+            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
+                if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
+                    minions.append(fn_)
+            return minions
+        return self._from_snapshot('accepted_minions', _list_accepted)
+
+    def _cached_minions(self):
+        '''
+        Return the list of minions in the minion data cache
+        '''
+        return self._from_snapshot('cached_minions',
+                                   lambda: self.cache.list('minions'))
+
+    def _read_pki_minions(self):
+        '''
+        Read the complete minion list from the PKI dir or the key cache
+        '''
+        if self.key_cache is not None:
+            minions = self.key_cache.keys(self.acc)
+            if minions is not None:
+                return list(minions)
         minions = []
         pki_cache_fn = os.path.join(self.opts['pki_dir'], self.acc, '.key_cache')
         try:
@@ -278,28 +1028,38 @@ class CkMinions(object):
         '''
         cache_enabled = self.opts.get('minion_data_cache', False)
 
-        def list_cached_minions():
-            return self.cache.list('minions')
-
         if greedy:
-            minions = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                    minions.append(fn_)
+            minions = self._accepted_minions()
         elif cache_enabled:
-            minions = list_cached_minions()
+            minions = self._cached_minions()
         else:
             return {'minions': [],
                     'missing': []}
 
         if cache_enabled:
             if greedy:
-                cminions = list_cached_minions()
+                cminions = self._cached_minions()
             else:
                 cminions = minions
             if not cminions:
                 return {'minions': minions,
                         'missing': []}
+            if self.index is not None and not regex_match:
+                matched = self._check_index_minions(expr,
+                                                    delimiter,
+                                                    search_type,
+                                                    exact_match)
+                if matched is not None:
+                    if greedy:
+                        # Keep the accepted minions with no cached data
+                        indexed = set(self._from_snapshot(
+                            'indexed_minions', self.index.indexed_minions))
+                        indexed.intersection_update(cminions)
+                        minions = set(minions) - (indexed - matched)
+                    else:
+                        minions = matched.intersection(cminions)
+                    return {'minions': list(minions),
+                            'missing': []}
             minions = set(minions)
             for id_ in cminions:
                 if greedy and id_ not in minions:
@@ -320,6 +1080,51 @@ class CkMinions(object):
         return {'minions': minions,
                 'missing': []}
 
+    def _build_index(self):
+        '''
+        Build the minion data index from the whole minion data cache
+        '''
+        log.debug('Building the minion data index')
+        minion_data = {}
+        for id_ in self.cache.list('minions'):
+            try:
+                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            except SaltCacheError:
+                continue
+            if isinstance(mdata, dict):
+                minion_data[id_] = mdata
+        self.index.build(minion_data)
+
+    def _check_index_minions(self, expr, delimiter, search_type, exact_match):
+        '''
+        Return the set of cached minions matching a grain or pillar target
+        using the minion data index, or None if the target can't be resolved
+        through the index. Only the minions whose indexed data is ambiguous
+        for this target get their cached data fetched.
+        '''
+        if not self.index.is_complete():
+            self._build_index()
+        res = self.index.match(search_type,
+                               expr,
+                               delimiter=delimiter,
+                               exact_match=exact_match)
+        if res is None:
+            return None
+        matched, verify = res
+        for id_ in verify:
+            try:
+                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            except SaltCacheError:
+                continue
+            if mdata is None:
+                continue
+            if salt.utils.data.subdict_match(mdata.get(search_type),
+                                             expr,
+                                             delimiter=delimiter,
+                                             exact_match=exact_match):
+                matched.add(id_)
+        return matched
+
     def _check_grain_minions(self, expr, delimiter, greedy):
         '''
         Return the minions found by looking via grains
@@ -371,14 +1176,14 @@ class CkMinions(object):
         if greedy:
             minions = self._pki_minions()
         elif cache_enabled:
-            minions = self.cache.list('minions')
+            minions = self._cached_minions()
         else:
             return {'minions': [],
                     'missing': []}
 
         if cache_enabled:
             if greedy:
-                cminions = self.cache.list('minions')
+                cminions = self._cached_minions()
             else:
                 cminions = minions
             if cminions is None:
@@ -439,14 +1244,10 @@ class CkMinions(object):
             )
             cache_enabled = self.opts.get('minion_data_cache', False)
             if greedy:
-                mlist = []
-                for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                    if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                        mlist.append(fn_)
-                return {'minions': mlist,
+                return {'minions': self._accepted_minions(),
                         'missing': []}
             elif cache_enabled:
-                return {'minions': self.cache.list('minions'),
+                return {'minions': self._cached_minions(),
                         'missing': []}
             else:
                 return {'minions': [],
@@ -474,18 +1275,27 @@ class CkMinions(object):
         if not isinstance(expr, six.string_types) and not isinstance(expr, (list, tuple)):
             log.error('Compound target that is neither string, list nor tuple')
             return {'minions': [], 'missing': []}
-        minions = set(self._pki_minions())
-        log.debug('minions: %s', minions)
 
-        nodegroups = self.opts.get('nodegroups', {})
+        # All the sub-matchers of the expression share one view of the
+        # accepted keys and of the minion data cache
+        own_snapshot = self._snapshot is None
+        if own_snapshot:
+            self._snapshot = {}
+        try:
+            if not self.opts.get('minion_data_cache', False):
+                return {'minions': self._pki_minions(),
+                        'missing': []}
+
+            tree = self._compile_compound(expr)
+            if tree is None:
+                return {'minions': [], 'missing': []}
+            log.debug('Evaluating compound target: %s', expr)
 
-        if self.opts.get('minion_data_cache', False):
             ref = {'G': self._check_grain_minions,
                    'P': self._check_grain_pcre_minions,
                    'I': self._check_pillar_minions,
                    'J': self._check_pillar_pcre_minions,
                    'L': self._check_list_minions,
-                   'N': None,    # nodegroups should already be expanded
                    'S': self._check_ipcidr_minions,
                    'E': self._check_pcre_minions,
                    'R': self._all_minions}
@@ -493,131 +1303,66 @@ class CkMinions(object):
                 ref['I'] = self._check_pillar_exact_minions
                 ref['J'] = self._check_pillar_exact_minions
 
-            results = []
-            unmatched = []
-            opers = ['and', 'or', 'not', '(', ')']
             missing = []
+            minions = self._eval_compound(tree, ref, greedy, missing)
+            return {'minions': list(minions), 'missing': missing}
+        finally:
+            if own_snapshot:
+                self._snapshot = None
 
-            if isinstance(expr, six.string_types):
-                words = expr.split()
-            else:
-                # we make a shallow copy in order to not affect the passed in arg
-                words = expr[:]
-
-            while words:
-                word = words.pop(0)
-                target_info = parse_target(word)
-
-                # Easy check first
-                if word in opers:
-                    if results:
-                        if results[-1] == '(' and word in ('and', 'or'):
-                            log.error('Invalid beginning operator after "(": %s', word)
-                            return {'minions': [], 'missing': []}
-                        if word == 'not':
-                            if not results[-1] in ('&', '|', '('):
-                                results.append('&')
-                            results.append('(')
-                            results.append(six.text_type(set(minions)))
-                            results.append('-')
-                            unmatched.append('-')
-                        elif word == 'and':
-                            results.append('&')
-                        elif word == 'or':
-                            results.append('|')
-                        elif word == '(':
-                            results.append(word)
-                            unmatched.append(word)
-                        elif word == ')':
-                            if not unmatched or unmatched[-1] != '(':
-                                log.error('Invalid compound expr (unexpected '
-                                          'right parenthesis): %s',
-                                          expr)
-                                return {'minions': [], 'missing': []}
-                            results.append(word)
-                            unmatched.pop()
-                            if unmatched and unmatched[-1] == '-':
-                                results.append(')')
-                                unmatched.pop()
-                        else:  # Won't get here, unless oper is added
-                            log.error('Unhandled oper in compound expr: %s',
-                                      expr)
-                            return {'minions': [], 'missing': []}
-                    else:
-                        # seq start with oper, fail
-                        if word == 'not':
-                            results.append('(')
-                            results.append(six.text_type(set(minions)))
-                            results.append('-')
-                            unmatched.append('-')
-                        elif word == '(':
-                            results.append(word)
-                            unmatched.append(word)
-                        else:
-                            log.error(
-                                'Expression may begin with'
-                                ' binary operator: %s', word
-                            )
-                            return {'minions': [], 'missing': []}
-
-                elif target_info and target_info['engine']:
-                    if 'N' == target_info['engine']:
-                        # if we encounter a node group, just evaluate it in-place
-                        decomposed = nodegroup_comp(target_info['pattern'], nodegroups)
-                        if decomposed:
-                            words = decomposed + words
-                        continue
-
-                    engine = ref.get(target_info['engine'])
-                    if not engine:
-                        # If an unknown engine is called at any time, fail out
-                        log.error(
-                            'Unrecognized target engine "%s" for'
-                            ' target expression "%s"',
-                            target_info['engine'],
-                            word,
-                        )
-                        return {'minions': [], 'missing': []}
-
-                    engine_args = [target_info['pattern']]
-                    if target_info['engine'] in ('G', 'P', 'I', 'J'):
-                        engine_args.append(target_info['delimiter'] or ':')
-                    engine_args.append(greedy)
-
-                    # ignore missing minions for lists if we exclude them with
-                    # a 'not'
-                    if 'L' == target_info['engine']:
-                        engine_args.append(results and results[-1] == '-')
-                    _results = engine(*engine_args)
-                    results.append(six.text_type(set(_results['minions'])))
-                    missing.extend(_results['missing'])
-                    if unmatched and unmatched[-1] == '-':
-                        results.append(')')
-                        unmatched.pop()
-
-                else:
-                    # The match is not explicitly defined, evaluate as a glob
-                    _results = self._check_glob_minions(word, True)
-                    results.append(six.text_type(set(_results['minions'])))
-                    if unmatched and unmatched[-1] == '-':
-                        results.append(')')
-                        unmatched.pop()
-
-            # Add a closing ')' for each item left in unmatched
-            results.extend([')' for item in unmatched])
-
-            results = ' '.join(results)
-            log.debug('Evaluating final compound matching expr: %s',
-                      results)
-            try:
-                minions = list(eval(results))  # pylint: disable=W0123
-                return {'minions': minions, 'missing': missing}
-            except Exception:
-                log.error('Invalid compound target: %s', expr)
-                return {'minions': [], 'missing': []}
-
-        return {'minions': list(minions),
-                'missing': []}
+    def _compile_compound(self, expr):
+        '''
+        Return the parsed form of a compound target, from the cache of
+        already compiled targets if possible. Return None if the target is
+        invalid.
+        '''
+        if isinstance(expr, six.string_types):
+            key = expr
+        else:
+            key = tuple(expr)
+        try:
+            return self._compound_cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable words, don't cache
+            return compile_compound(expr, self.opts.get('nodegroups', {}))
+        tree = compile_compound(expr, self.opts.get('nodegroups', {}))
+        if tree is not None:
+            if len(self._compound_cache) >= COMPOUND_CACHE_SIZE:
+                self._compound_cache.clear()
+            self._compound_cache[key] = tree
+        return tree
+
+    def _eval_compound(self, node, ref, greedy, missing, ignore_missing=False):
+        '''
+        Evaluate a compiled compound target to a set of minions
+        '''
+        oper = node[0]
+        if oper == 'and':
+            return (self._eval_compound(node[1], ref, greedy, missing)
+                    & self._eval_compound(node[2], ref, greedy, missing))
+        if oper == 'or':
+            return (self._eval_compound(node[1], ref, greedy, missing)
+                    | self._eval_compound(node[2], ref, greedy, missing))
+        if oper == 'not':
+            # Ignore missing minions for lists if we exclude them with a 'not'
+            return set(self._pki_minion_set()) - self._eval_compound(
+                node[1], ref, greedy, missing, ignore_missing=True)
+
+        _, engine, pattern, tgt_delim = node
+        if engine is None:
+            # The match is not explicitly defined, evaluate as a glob
+            return set(self._check_glob_minions(pattern, True)['minions'])
+        engine_args = [pattern]
+        if engine in ('G', 'P', 'I', 'J'):
+            engine_args.append(tgt_delim or ':')
+        engine_args.append(greedy)
+        if engine == 'L':
+            engine_args.append(ignore_missing)
+        _results = ref[engine](*engine_args)
+        missing.extend(_results['missing'])
+        return set(_results['minions'])
 
     def connected_ids(self, subset=None, show_ip=False, show_ipv4=None, include_localhost=None):
         '''
@@ -684,11 +1429,7 @@ class CkMinions(object):
         '''
         Return a list of all minions that have auth'd
         '''
-        mlist = []
-        for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-            if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                mlist.append(fn_)
-        return {'minions': mlist, 'missing': []}
+        return {'minions': self._accepted_minions(), 'missing': []}
 
     def check_minions(self,
                       expr,
@@ -60,6 +60,24 @@ def appendproctitle(name):
         setproctitle.setproctitle(setproctitle.getproctitle() + ' ' + name)
 
 
+def getproctitle():
+    '''
+    Return the current process title, or None if it can't be set
+    '''
+    if HAS_SETPROCTITLE:
+        return setproctitle.getproctitle()
+    return None
+
+
+def resetproctitle(title):
+    '''
+    Set the current process title back to "title", as returned by
+    getproctitle
+    '''
+    if HAS_SETPROCTITLE and title is not None:
+        setproctitle.setproctitle(title)
+
+
 def daemonize(redirect_out=True):
     '''
     Daemonize a process
@@ -456,6 +474,17 @@ class ProcessManager(object):
     def stop_restarting(self):
         self._restart_processes = False
 
+    def release_process(self, name):
+        '''
+        Stop tracking the process with the given name, so that it isn't
+        restarted when it exits. Return the process, or None if not found.
+        '''
+        for pid, mapping in six.iteritems(self._process_map.copy()):
+            if mapping['Process'].name == name:
+                del self._process_map[pid]
+                return mapping['Process']
+        return None
+
     def send_signal_to_processes(self, signal_):
         if (salt.utils.platform.is_windows() and
                 signal_ in (signal.SIGTERM, signal.SIGINT)):
@@ -35,6 +35,7 @@ import salt.utils.platform
 import salt.utils.yamlencoding
 import salt.utils.hashutils
 import salt.utils.stringutils
+import salt.utils.url
 from salt.exceptions import (
     SaltRenderError, CommandExecutionError, SaltInvocationError
 )
@@ -441,6 +442,13 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
                               tmplstr,
                               trace=tracestr)
 
+    rendered_files = context.get('rendered_files')
+    if isinstance(loader, salt.utils.jinja.SaltCacheLoader) \
+            and isinstance(rendered_files, list):
+        # Report the imported templates along with the rendered file
+        rendered_files.extend(
+            (saltenv, salt.utils.url.create(name)) for name in loader.cached)
+
     # Workaround a bug in Jinja that removes the final newline
     # (https://github.com/mitsuhiko/jinja2/issues/75)
     if newline:
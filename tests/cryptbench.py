@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the throughput of salt.crypt.Crypticle by payload size, for each
+available crypto backend and encryption mode.
+
+The AES-CBC mode is measured with M2Crypto and with PyCryptodome (or
+PyCrypto), whichever are installed, and the AES-GCM mode with PyCryptodome.
+For each payload size, the script prints the MB/s of encrypt + decrypt, and
+of dumps + loads which also serialize the payload as a dict.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function
+import optparse
+import os
+import timeit
+
+# Import Salt libs
+import salt.crypt
+
+
+def parse():
+    '''
+    Parse the script command line inputs
+    '''
+    parser = optparse.OptionParser()
+
+    parser.add_option(
+        '-s',
+        '--sizes',
+        dest='sizes',
+        default='64,1024,16384,262144,1048576',
+        help='Comma separated list of the payload sizes to measure, in bytes'
+    )
+    parser.add_option(
+        '-t',
+        '--time',
+        dest='time',
+        default=0.5,
+        type=float,
+        help='The number of seconds to measure each case for'
+    )
+
+    options, _ = parser.parse_args()
+    return options
+
+
+def backends():
+    '''
+    Return the available CBC backends, as (name, HAS_M2, AES module) tuples
+    '''
+    ret = []
+    try:
+        import M2Crypto  # pylint: disable=unused-variable
+        ret.append(('m2crypto', True, None))
+    except ImportError:
+        pass
+    try:
+        from Cryptodome.Cipher import AES
+        ret.append(('cryptodome', False, AES))
+    except ImportError:
+        try:
+            from Crypto.Cipher import AES
+            ret.append(('pycrypto', False, AES))
+        except ImportError:
+            pass
+    return ret
+
+
+def measure(func, size, duration):
+    '''
+    Return the throughput of func in MB/s of payload
+    '''
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= duration / 4:
+            break
+        number *= 2
+    number = max(1, int(number * duration / elapsed))
+    elapsed = timeit.timeit(func, number=number)
+    return size * number / elapsed / 1024 / 1024
+
+
+def run(options):
+    '''
+    Print the throughput of each backend and mode by payload size
+    '''
+    sizes = [int(size) for size in options.sizes.split(',')]
+    cases = []
+    for name, has_m2, aes in backends():
+        cases.append(('{0} cbc'.format(name), has_m2, aes, False))
+    if salt.crypt.HAS_AEAD:
+        cases.append(('cryptodome gcm', salt.crypt.HAS_M2, getattr(salt.crypt, 'AES', None), True))
+
+    crypticle = salt.crypt.Crypticle({}, salt.crypt.Crypticle.generate_key_string())
+    print('{0:<16} {1:>10} {2:>14} {3:>14}'.format('case', 'size', 'crypt MB/s', 'dumps MB/s'))
+    orig = salt.crypt.HAS_M2, getattr(salt.crypt, 'AES', None)
+    try:
+        for case, has_m2, aes, aead in cases:
+            salt.crypt.HAS_M2 = has_m2
+            salt.crypt.AES = aes
+            for size in sizes:
+                data = os.urandom(size)
+                obj = {'fun': 'test.arg', 'arg': [data]}
+                encrypted = crypticle.encrypt(data, aead=aead)
+                dumped = crypticle.dumps(obj, aead=aead)
+
+                def _crypt():
+                    crypticle.encrypt(data, aead=aead)
+                    crypticle.decrypt(encrypted, aead=aead)
+
+                def _dumps():
+                    crypticle.dumps(obj, aead=aead)
+                    crypticle.loads(dumped, aead=aead)
+
+                print('{0:<16} {1:>10} {2:>14.1f} {3:>14.1f}'.format(
+                    case,
+                    size,
+                    measure(_crypt, size, options.time),
+                    measure(_dumps, size, options.time)))
+    finally:
+        salt.crypt.HAS_M2, salt.crypt.AES = orig
+
+
+if __name__ == '__main__':
+    run(parse())
@@ -353,3 +353,71 @@ class Local_CacheTest(TestCase, AdaptedConfigurationTestCaseMixin, LoaderModuleM
         self._check_dir_files('new_jid_dir was not removed',
                               self.EMPTY_JID_DIR,
                               status='removed')
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class LocalCacheJobIndexTestCase(TestCase, LoaderModuleMockMixin):
+    '''
+    Tests for the hourly index of the jids of local_cache
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.TMP_CACHE_DIR = os.path.join(RUNTIME_VARS.TMP, 'salt_test_job_index')
+
+    def setup_loader_modules(self):
+        return {local_cache: {'__opts__': {'cachedir': self.TMP_CACHE_DIR,
+                                           'hash_type': 'sha256',
+                                           'keep_jobs': 1}}}
+
+    def tearDown(self):
+        if os.path.exists(self.TMP_CACHE_DIR):
+            shutil.rmtree(self.TMP_CACHE_DIR)
+
+    def _add_job(self, jid, fun='test.ping'):
+        local_cache.prep_jid(passed_jid=jid)
+        local_cache.save_load(jid, {'fun': fun, 'arg': [], 'tgt': '',
+                                    'tgt_type': 'glob', 'user': 'root'})
+        return salt.utils.jid.jid_dir(jid, os.path.join(self.TMP_CACHE_DIR, 'jobs'), 'sha256')
+
+    def test_clean_old_jobs_index(self):
+        '''
+        Tests that the first cleanup indexes the existing jobs, and that the
+        next ones drop the jobs of the expired hours from the index
+        '''
+        now = time.time()
+        with patch('time.time', MagicMock(return_value=now - 3 * 3600)):
+            old_dir = self._add_job('20190101000000000001')
+        new_dir = self._add_job('20190101000000000002')
+
+        # The index is not complete until the job cache is walked through
+        self.assertIsNone(local_cache._index_hours())
+        local_cache.clean_old_jobs()
+        self.assertEqual(local_cache._index_hours(), [int(now // 3600) - 3, int(now // 3600)])
+
+        with patch.object(local_cache, '_walk_through_clean_old_jobs') as walk:
+            local_cache.clean_old_jobs()
+        self.assertFalse(walk.called)
+        self.assertFalse(os.path.exists(old_dir))
+        self.assertTrue(os.path.exists(new_dir))
+        self.assertEqual(local_cache._index_hours(), [int(now // 3600)])
+        self.assertEqual(list(local_cache.get_jids()), ['20190101000000000002'])
+
+    def test_get_jids_filter_index(self):
+        '''
+        Tests that get_jids_filter returns the most recent jobs from the index
+        '''
+        now = time.time()
+        for hours, jid in ((2, '20190101000000000001'),
+                           (1, '20190101000000000002'),
+                           (0, '20190101000000000003')):
+            with patch('time.time', MagicMock(return_value=now - hours * 3600)):
+                self._add_job(jid)
+        self._add_job('20190101000000000004', fun='saltutil.find_job')
+        with patch.dict(local_cache.__opts__, {'keep_jobs': 24}):
+            local_cache.clean_old_jobs()
+
+        with patch.object(local_cache, '_walk_through') as walk:
+            jobs = local_cache.get_jids_filter(2)
+        self.assertFalse(walk.called)
+        self.assertEqual([job['JID'] for job in jobs],
+                         ['20190101000000000002', '20190101000000000003'])
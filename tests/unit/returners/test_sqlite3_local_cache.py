@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+'''
+Unit tests for the SQLite job cache (sqlite3_local_cache).
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import shutil
+import tempfile
+import time
+
+# Import Salt Testing libs
+from tests.support.mixins import LoaderModuleMockMixin
+from tests.support.runtests import RUNTIME_VARS
+from tests.support.unit import TestCase, skipIf
+from tests.support.mock import patch
+
+# Import Salt libs
+import salt.returners.sqlite3_local_cache as sqlite3_local_cache
+
+
+@skipIf(not sqlite3_local_cache.HAS_SQLITE3, 'sqlite3 is not available')
+class SQLite3LocalCacheTestCase(TestCase, LoaderModuleMockMixin):
+    '''
+    Tests for the sqlite3_local_cache returner
+    '''
+    def setup_loader_modules(self):
+        self.tmp_cachedir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        return {sqlite3_local_cache: {'__opts__': {'cachedir': self.tmp_cachedir,
+                                                   'keep_jobs': 1,
+                                                   'hash_type': 'sha256',
+                                                   'job_cache_store_endtime': True}}}
+
+    def tearDown(self):
+        for conn in sqlite3_local_cache._CONNECTIONS.values():
+            conn.close()
+        sqlite3_local_cache._CONNECTIONS.clear()
+        shutil.rmtree(self.tmp_cachedir)
+
+    def _prep_job(self, jid='20190101000000000000', **kwargs):
+        jid = sqlite3_local_cache.prep_jid(passed_jid=jid, **kwargs)
+        load = {'jid': jid, 'fun': 'test.ping', 'arg': [], 'tgt': 'minion*',
+                'tgt_type': 'glob', 'user': 'root'}
+        sqlite3_local_cache.save_load(jid, load, minions=['minion1', 'minion2'])
+        return jid
+
+    def test_job_cache(self):
+        '''
+        Tests the storage and the lookup of the jobs and their returns
+        '''
+        jid = self._prep_job()
+        self.assertIsNone(sqlite3_local_cache.returner(
+            {'jid': jid, 'id': 'minion1', 'return': True, 'retcode': 0, 'out': 'nested'}))
+        # Extra returns are dropped
+        self.assertFalse(sqlite3_local_cache.returner(
+            {'jid': jid, 'id': 'minion1', 'return': False}))
+        # As are the returns of unknown jobs
+        self.assertFalse(sqlite3_local_cache.returner(
+            {'jid': '20190101000000000001', 'id': 'minion1', 'return': True}))
+
+        sqlite3_local_cache.save_minions(jid, ['minion3'], syndic_id='syndic')
+        load = sqlite3_local_cache.get_load(jid)
+        self.assertEqual(load['fun'], 'test.ping')
+        self.assertEqual(load['Minions'], ['minion1', 'minion2', 'minion3'])
+        self.assertEqual(sqlite3_local_cache.get_load('20190101000000000001'), {})
+
+        self.assertEqual(sqlite3_local_cache.get_jid(jid),
+                         {'minion1': {'return': True, 'retcode': 0, 'out': 'nested'}})
+
+        sqlite3_local_cache.update_endtime(jid, '2019, Jan 01 00:00:01.000000')
+        self.assertEqual(sqlite3_local_cache.get_endtime(jid), '2019, Jan 01 00:00:01.000000')
+        jids = sqlite3_local_cache.get_jids()
+        self.assertEqual(list(jids), [jid])
+        self.assertEqual(jids[jid]['Function'], 'test.ping')
+        self.assertEqual(jids[jid]['EndTime'], '2019, Jan 01 00:00:01.000000')
+
+    def test_nocache(self):
+        '''
+        Tests that the returns of the nocache jobs are not stored
+        '''
+        jid = self._prep_job(nocache=True)
+        sqlite3_local_cache.returner({'jid': jid, 'id': 'minion1', 'return': True})
+        self.assertEqual(sqlite3_local_cache.get_jid(jid), {})
+
+    def test_get_jids_filter(self):
+        '''
+        Tests that the most recent jobs are returned in order
+        '''
+        for jid in ('20190101000000000003', '20190101000000000001', '20190101000000000002'):
+            self._prep_job(jid)
+        jobs = sqlite3_local_cache.get_jids_filter(2)
+        self.assertEqual([job['JID'] for job in jobs],
+                         ['20190101000000000002', '20190101000000000003'])
+
+    def test_clean_old_jobs(self):
+        '''
+        Tests that the jobs older than keep_jobs are removed
+        '''
+        old_jid = self._prep_job()
+        sqlite3_local_cache.returner({'jid': old_jid, 'id': 'minion1', 'return': True})
+        with patch('time.time', return_value=time.time() + 7200):
+            new_jid = self._prep_job('20190101000000000001')
+            sqlite3_local_cache.clean_old_jobs()
+        self.assertEqual(list(sqlite3_local_cache.get_jids()), [new_jid])
+        self.assertEqual(sqlite3_local_cache.get_jid(old_jid), {})
+        self.assertEqual(sqlite3_local_cache.get_load(old_jid), {})
@@ -313,3 +313,38 @@ class TestM2CryptoRegression47124(TestCase):
         with patch('salt.crypt.get_rsa_key', return_value=key):
             signature = salt.crypt.sign_message('/keydir/keyname.pem', message, passphrase='password')
         self.assertEqual(signature, self.SIGNATURE)
+
+
+class CrypticleTestCase(TestCase):
+    '''
+    TestCase for the encryption modes of salt.crypt.Crypticle
+    '''
+    def setUp(self):
+        self.crypticle = crypt.Crypticle({}, crypt.Crypticle.generate_key_string())
+
+    def test_cbc(self):
+        for size in (0, 15, 16, 17, 1000):
+            data = os.urandom(size)
+            encrypted = self.crypticle.encrypt(data)
+            self.assertEqual(len(encrypted) % crypt.Crypticle.AES_BLOCK_SIZE, 0)
+            self.assertEqual(self.crypticle.decrypt(encrypted), data)
+        encrypted = bytearray(self.crypticle.encrypt(b'data'))
+        encrypted[-1] ^= 1
+        self.assertRaises(crypt.AuthenticationError, self.crypticle.decrypt, bytes(encrypted))
+
+    @skipIf(not crypt.HAS_AEAD, 'Skip when AES-GCM is not available')
+    def test_aead(self):
+        for size in (0, 15, 16, 17, 1000):
+            data = os.urandom(size)
+            encrypted = self.crypticle.encrypt(data, aead=True)
+            self.assertEqual(len(encrypted),
+                             size + crypt.Crypticle.NONCE_SIZE + crypt.Crypticle.TAG_SIZE)
+            self.assertEqual(self.crypticle.decrypt(encrypted, aead=True), data)
+        self.assertEqual(self.crypticle.loads(self.crypticle.dumps({'foo': 'bar'}, aead=True), aead=True),
+                         {'foo': 'bar'})
+        encrypted = bytearray(self.crypticle.encrypt(b'data', aead=True))
+        encrypted[-1] ^= 1
+        self.assertRaises(crypt.AuthenticationError, self.crypticle.decrypt, bytes(encrypted), aead=True)
+        # The modes don't mix
+        self.assertRaises(crypt.AuthenticationError, self.crypticle.decrypt,
+                          self.crypticle.encrypt(b'data'), aead=True)
@@ -1267,3 +1267,160 @@ class LazyLoaderOptimizationOrderTest(TestCase):
         basename = os.path.basename(filename)
         expected = 'lazyloadertest.py' if six.PY3 else 'lazyloadertest.pyc'
         assert basename == expected, basename
+
+
+class LazyLoaderManifestTest(TestCase):
+    '''
+    Test the manifest of the module directories
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.opts = salt.config.minion_config(None)
+        cls.opts['grains'] = {}
+        if not os.path.isdir(RUNTIME_VARS.TMP):
+            os.makedirs(RUNTIME_VARS.TMP)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.module_dir = os.path.join(self.tmp_dir, 'modules')
+        os.makedirs(self.module_dir)
+        self.opts = copy.deepcopy(self.opts)
+        self.opts['cachedir'] = self.tmp_dir
+        self.opts['loader_manifest'] = True
+        self.write_module('manifesttest', '__virtualname__ = \'mtest\'\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        del self.opts
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.opts
+
+    def write_module(self, name, content):
+        with salt.utils.files.fopen(os.path.join(self.module_dir, name + '.py'), 'w') as fh:
+            fh.write(content)
+        # Backdate the directory, the manifest ignores the directories
+        # modified within the same mtime tick as their listing
+        past = os.stat(self.module_dir).st_mtime - 10
+        os.utime(self.module_dir, (past, past))
+
+    def get_loader(self):
+        return salt.loader.LazyLoader([self.module_dir], self.opts, tag='module')
+
+    def test_manifest(self):
+        scan = salt.loader.LazyLoader._scan_module_dir
+        with patch.object(salt.loader.LazyLoader, '_scan_module_dir',
+                          autospec=True, side_effect=scan) as scan_mock:
+            loader = self.get_loader()
+            self.assertIn('manifesttest', loader.file_mapping)
+            self.assertEqual(loader.static_virtualnames,
+                             {'manifesttest': 'mtest'})
+            self.assertEqual(scan_mock.call_count, 1)
+            self.assertTrue(os.path.isfile(
+                os.path.join(self.tmp_dir, 'loader_manifest.p')))
+
+            # Unchanged directories are not listed again
+            self.assertEqual(self.get_loader().file_mapping, loader.file_mapping)
+            self.assertEqual(scan_mock.call_count, 1)
+
+            # Nor are they when the manifest is read back from the disk
+            with patch.dict(salt.loader._LOADER_MANIFEST, {}, clear=True), \
+                    patch.object(salt.loader, '_LOADER_MANIFEST_FILES', set()):
+                self.assertEqual(self.get_loader().file_mapping,
+                                 loader.file_mapping)
+            self.assertEqual(scan_mock.call_count, 1)
+
+            # A new module is found
+            self.write_module('manifestnew', '')
+            loader = self.get_loader()
+            self.assertIn('manifestnew', loader.file_mapping)
+            self.assertEqual(scan_mock.call_count, 2)
+
+
+class LazyLoaderVirtualCacheTest(TestCase):
+    '''
+    Test the cache of the __virtual__ outcomes
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.opts = salt.config.minion_config(None)
+        cls.opts['grains'] = {'os': 'Salt'}
+        if not os.path.isdir(RUNTIME_VARS.TMP):
+            os.makedirs(RUNTIME_VARS.TMP)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.module_dir = os.path.join(self.tmp_dir, 'modules')
+        os.makedirs(self.module_dir)
+        self.opts = copy.deepcopy(self.opts)
+        self.opts['cachedir'] = self.tmp_dir
+        self.opts['virtual_cache'] = True
+        self.write_module('vcacheno', 'return (False, \'not here\')')
+        self.write_module('vcacherenamed', 'return \'vcachename\'')
+
+    def tearDown(self):
+        salt.loader.clear_virtual_cache(self.opts)
+        shutil.rmtree(self.tmp_dir)
+        del self.opts
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.opts
+
+    def write_module(self, name, virtual):
+        path = os.path.join(self.module_dir, name + '.py')
+        with salt.utils.files.fopen(path, 'w') as fh:
+            fh.write(textwrap.dedent('''\
+                __virtualname__ = 'vcachename'
+
+                def __virtual__():
+                    {0}
+
+                def ping():
+                    return True
+                ''').format(virtual))
+        # Backdate the module, the cache ignores the modules modified within
+        # the same mtime tick as their __virtual__ call
+        past = os.stat(path).st_mtime - 10
+        os.utime(path, (past, past))
+
+    def get_loader(self):
+        return salt.loader.LazyLoader([self.module_dir], self.opts, tag='module')
+
+    def test_virtual_cache(self):
+        process_virtual = salt.loader.LazyLoader._process_virtual
+        with patch.object(salt.loader.LazyLoader, '_process_virtual',
+                          autospec=True, side_effect=process_virtual) as virtual_mock:
+            loader = self.get_loader()
+            self.assertTrue(loader['vcachename.ping']())
+            self.assertEqual(loader.missing_modules['vcacheno'], 'not here')
+            self.assertEqual(virtual_mock.call_count, 2)
+            self.assertTrue(os.path.isfile(
+                os.path.join(self.tmp_dir, 'virtual_cache.p')))
+
+            # The module which refused to load is not imported again, and the
+            # renamed module is tried first
+            for count in (3, 4):
+                loader = self.get_loader()
+                self.assertEqual(next(loader._iter_files('vcachename')),
+                                 'vcacherenamed')
+                self.assertTrue(loader['vcachename.ping']())
+                loader._load_all()
+                self.assertEqual(loader.missing_modules['vcacheno'], 'not here')
+                self.assertEqual(virtual_mock.call_count, count)
+                # Read the cache back from the disk the next time
+                salt.loader._VIRTUAL_CACHE.clear()
+                salt.loader._VIRTUAL_CACHE_FILES.clear()
+
+            # The cache is invalidated by the grains
+            self.opts['grains']['os'] = 'Other'
+            self.get_loader()._load_all()
+            self.assertEqual(virtual_mock.call_count, 6)
+
+            # And on demand
+            salt.loader.clear_virtual_cache(self.opts)
+            self.assertFalse(os.path.isfile(
+                os.path.join(self.tmp_dir, 'virtual_cache.p')))
+            self.get_loader()._load_all()
+            self.assertEqual(virtual_mock.call_count, 8)
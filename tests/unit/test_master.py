@@ -2,12 +2,18 @@
 
 # Import Python libs
 from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import time
 
 # Import Salt libs
 import salt.config
 import salt.master
+import salt.utils.files
 
 # Import Salt Testing Libs
+from tests.support.runtests import RUNTIME_VARS
 from tests.support.unit import TestCase
 from tests.support.mock import (
     patch,
@@ -331,3 +337,230 @@ class ClearFuncsTestCase(TestCase):
                 patch('salt.utils.master.get_values_of_matching_keys', MagicMock(return_value=['test'])), \
                 patch('salt.utils.minions.CkMinions.auth_check', MagicMock(return_value=False)):
             self.assertEqual(mock_ret, self.clear_funcs.publish(load))
+
+    def test_publish_resolved_minions(self):
+        '''
+        Asserts that the minions resolved for the publish are handed to the publish channels.
+        '''
+        load = {'user': 'test', 'fun': 'test.arg', 'tgt': 'G@os:Linux', 'tgt_type': 'compound',
+                'kwargs': {'user': 'test'}, 'arg': 'foo', 'jid': '1'}
+        check_minions = MagicMock(return_value={'minions': ['minion1'], 'missing': []})
+        with patch('salt.acl.PublisherACL.user_is_blacklisted', MagicMock(return_value=False)), \
+                patch('salt.acl.PublisherACL.cmd_is_blacklisted', MagicMock(return_value=False)), \
+                patch('salt.auth.LoadAuth.authenticate_key', MagicMock(return_value='fake-user-key')), \
+                patch('salt.utils.master.get_values_of_matching_keys', MagicMock(return_value=['test'])), \
+                patch('salt.utils.minions.CkMinions.check_minions', check_minions), \
+                patch('salt.utils.minions.CkMinions.auth_check', MagicMock(return_value=True)), \
+                patch('salt.master.ClearFuncs._prep_jid', MagicMock(return_value='1')), \
+                patch('salt.master.ClearFuncs._prep_pub', MagicMock(return_value={'jid': '1'})), \
+                patch('salt.master.ClearFuncs._send_ssh_pub', MagicMock()), \
+                patch('salt.master.ClearFuncs._send_pub', MagicMock()) as send_pub_mock:
+            ret = self.clear_funcs.publish(load)
+        self.assertEqual(ret['load']['minions'], ['minion1'])
+        self.assertEqual(check_minions.call_count, 1)
+        send_pub_mock.assert_called_once_with({'jid': '1'}, ['minion1'])
+
+
+class AESFuncsTestCase(TestCase):
+    '''
+    TestCase for salt.master.AESFuncs class
+    '''
+
+    def setUp(self):
+        opts = salt.config.master_config(None)
+        with patch('salt.master.AESFuncs._AESFuncs__setup_fileserver', MagicMock()), \
+                patch('salt.utils.event.get_master_event', MagicMock()), \
+                patch('salt.client.get_local_client', MagicMock()), \
+                patch('salt.minion.MasterMinion', MagicMock()), \
+                patch('salt.daemons.masterapi.RemoteFuncs', MagicMock()), \
+                patch('salt.utils.minions.CkMinions', MagicMock()):
+            self.aes_funcs = salt.master.AESFuncs(opts)
+
+    def test_return_batch(self):
+        '''
+        Asserts that the returns of a batch are stored, except the ones of
+        other minions
+        '''
+        ret = {'id': 'minion', 'jid': '20190101000000000000', 'return': True}
+        load = {'cmd': '_return_batch',
+                'id': 'minion',
+                'returns': [ret, dict(ret, id='other'), 'invalid', ret]}
+        with patch('salt.utils.job.store_job', MagicMock()) as store_mock:
+            ret_val, opts = self.aes_funcs.run_func('_return_batch', load)
+        self.assertEqual(opts, {'fun': 'send'})
+        self.assertEqual(store_mock.call_count, 2)
+        for call in store_mock.call_args_list:
+            self.assertEqual(call[0][1], ret)
+
+    def test_verify_minion_pub_cache(self):
+        '''
+        Asserts that the key of a minion and its verified token are reused
+        until the key file changes or is removed
+        '''
+        pki_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, pki_dir)
+        os.makedirs(os.path.join(pki_dir, 'minions'))
+        pub_path = os.path.join(pki_dir, 'minions', 'minion')
+        with salt.utils.files.fopen(pub_path, 'w') as fp_:
+            fp_.write('key')
+        self.aes_funcs.opts['pki_dir'] = pki_dir
+        verify = self.aes_funcs._AESFuncs__verify_minion
+        with patch('salt.crypt.get_rsa_pub_key', MagicMock()) as get_mock, \
+                patch('salt.crypt.public_decrypt', MagicMock(return_value=b'salt')) as decrypt_mock:
+            self.assertTrue(verify('minion', b'token'))
+            self.assertTrue(verify('minion', b'token'))
+            self.assertEqual(get_mock.call_count, 1)
+            self.assertEqual(decrypt_mock.call_count, 1)
+
+            # The key changed
+            with salt.utils.files.fopen(pub_path, 'w') as fp_:
+                fp_.write('new key')
+            self.assertTrue(verify('minion', b'token'))
+            self.assertEqual(get_mock.call_count, 2)
+            self.assertEqual(decrypt_mock.call_count, 2)
+
+            # The key is no longer accepted
+            os.remove(pub_path)
+            self.assertFalse(verify('minion', b'token'))
+
+
+class MaintenanceTestCase(TestCase):
+    '''
+    TestCase for salt.master.Maintenance class
+    '''
+    def test_sleep_key_cache_interval(self):
+        '''
+        Asserts that the shared key cache isn't refreshed in a tight loop with a null interval.
+        '''
+        opts = salt.config.master_config(None)
+        opts.update(key_cache='shared', key_cache_interval=0, loop_interval=1)
+        maintenance = salt.master.Maintenance(opts)
+        with patch('salt.master.time.time', MagicMock(side_effect=[100.0, 100.0, 100.5, 101.0])), \
+                patch('salt.master.time.sleep', MagicMock()) as sleep_mock, \
+                patch.object(maintenance, 'handle_key_cache', MagicMock()) as handle_mock:
+            maintenance.sleep()
+        self.assertEqual(sleep_mock.call_args_list, [((0.1,),), ((0.1,),)])
+        self.assertEqual(handle_mock.call_count, 2)
+
+
+class MWorkerTestCase(TestCase):
+    '''
+    TestCase for salt.master.MWorker class
+    '''
+    def test_check_retire(self):
+        '''
+        Asserts that a retired worker only exits once it has no request left to handle.
+        '''
+        opts = salt.config.master_config(None)
+        channel = MagicMock()
+        worker_load = [0.0] * salt.master.MWorkerPool.SLOTS
+        worker = salt.master.MWorker(opts, {}, {}, [channel], 'MWorker-0',
+                                     worker_load=worker_load, worker_index=0)
+        worker.io_loop = MagicMock()
+        worker._retire_callback = MagicMock()
+
+        worker._check_retire()
+        self.assertFalse(channel.idle.called)
+        # Retired while handling a request
+        worker_load[3] = 1.0
+        worker_load[0] = time.time()
+        worker._check_retire()
+        self.assertFalse(channel.idle.called)
+        # Done with the request, but another one is waiting
+        worker_load[0] = 0.0
+        channel.idle.return_value = False
+        worker._check_retire()
+        self.assertFalse(channel.close.called)
+
+        channel.idle.return_value = True
+        worker._check_retire()
+        channel.close.assert_called_once_with()
+        worker.io_loop.stop.assert_called_once_with()
+        worker._retire_callback.stop.assert_called_once_with()
+
+
+class MWorkerPoolTestCase(TestCase):
+    '''
+    TestCase for salt.master.MWorkerPool
+    '''
+    def setUp(self):
+        opts = salt.config.master_config(None)
+        opts.update(worker_threads=2, worker_threads_max=4)
+        self.process_manager = MagicMock()
+        self.start_worker = MagicMock()
+        self.pool = salt.master.MWorkerPool(opts, self.process_manager, self.start_worker)
+        self.pool.start()
+
+    def _check(self, busy):
+        '''
+        Check the pool after each worker was busy for the given part of a
+        second, and idle since
+        '''
+        self.pool.last_check -= 1
+        for index in self.pool.workers:
+            slot = index * self.pool.SLOTS
+            self.pool.load[slot + 1] = self.pool.busy[index] + busy
+            self.pool.load[slot + 2] = self.pool.requests[index] + 1
+        self.pool.check()
+
+    def test_grow_and_shrink(self):
+        self.assertEqual(self.pool.workers, set([0, 1]))
+        self.assertEqual([call[0][0] for call in self.start_worker.call_args_list], [0, 1])
+
+        # Busy workers, start one more worker, then the last one
+        self._check(1)
+        self.assertEqual(self.pool.workers, set([0, 1, 2]))
+        self._check(1)
+        self.assertEqual(self.pool.workers, set([0, 1, 2, 3]))
+        self._check(1)
+        self.assertEqual(self.start_worker.call_count, 4)
+
+        # Idle workers, the last started ones are stopped one at a time
+        for _ in range(self.pool.SHRINK_CHECKS - 1):
+            self._check(0.1)
+        self.assertFalse(self.process_manager.release_process.called)
+        self._check(0.1)
+        self.process_manager.release_process.assert_called_once_with('MWorker-3')
+        self.assertEqual(self.pool.workers, set([0, 1, 2]))
+        # The retired worker is told to exit, and isn't stopped
+        self.assertEqual(self.pool.load[3 * self.pool.SLOTS + 3], 1.0)
+        self.assertIn(3, self.pool.retiring)
+        for _ in range(self.pool.SHRINK_CHECKS * 2):
+            self._check(0)
+        self.assertEqual(self.pool.workers, set([0, 1]))
+        self.assertFalse(self.process_manager.stop_process.called)
+
+    def test_retired_worker_reaped(self):
+        process = MagicMock()
+        process.is_alive.return_value = True
+        self.process_manager.release_process.return_value = process
+        self._check(1)
+        for _ in range(self.pool.SHRINK_CHECKS):
+            self._check(0)
+        self.assertEqual(list(self.pool.retiring), [2])
+
+        # The index of a retired worker still running isn't reused
+        self._check(1)
+        self.assertEqual(self.pool.workers, set([0, 1, 3]))
+
+        # Retired workers running for too long are terminated
+        self.pool.retiring[2] = (process, time.time() - self.pool.RETIRE_TIMEOUT)
+        self.pool.check()
+        process.terminate.assert_called_once_with()
+        self.assertEqual(self.pool.retiring, {})
+
+        # Once exited, the retired workers are collected
+        self.pool.retiring[2] = (process, time.time())
+        process.is_alive.return_value = False
+        self.pool.check()
+        self.assertEqual(self.pool.retiring, {})
+        self.assertEqual(process.terminate.call_count, 1)
+
+    def test_busy_worker_not_stopped(self):
+        self._check(1)
+        self.assertEqual(self.pool.workers, set([0, 1, 2]))
+        # The last worker is handling a request
+        self.pool.load[2 * self.pool.SLOTS] = self.pool.last_check
+        for _ in range(self.pool.SHRINK_CHECKS):
+            self._check(0)
+        self.process_manager.release_process.assert_called_once_with('MWorker-1')
@@ -6,6 +6,7 @@
 # Import python libs
 from __future__ import absolute_import
 import copy
+import multiprocessing
 import os
 
 # Import Salt Testing libs
@@ -13,6 +14,7 @@ from tests.support.unit import TestCase, skipIf
 from tests.support.mock import NO_MOCK, NO_MOCK_REASON, patch, MagicMock
 from tests.support.mixins import AdaptedConfigurationTestCaseMixin
 from tests.support.helpers import skip_if_not_root
+from tests.support.runtests import RUNTIME_VARS
 # Import salt libs
 import salt.minion
 import salt.utils.event as event
@@ -235,6 +237,148 @@ class MinionTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
             finally:
                 minion.destroy()
 
+    def test_job_worker_pool(self):
+        '''
+        Tests that _handle_decoded_payload hands jobs to idle job workers, and
+        forks a process for the job when all of them are busy.
+        '''
+        pipes = []
+        real_pipe = multiprocessing.Pipe
+
+        def _pipe():
+            parent_conn, child_conn = real_pipe()
+            pipes.append(child_conn)
+            return parent_conn, MagicMock()
+
+        with patch('salt.minion.Minion.ctx', MagicMock(return_value={})), \
+                patch('salt.minion.JobWorker.start', MagicMock(return_value=True)), \
+                patch('salt.minion.JobWorker.join', MagicMock(return_value=True)), \
+                patch('salt.minion.JobWorker.terminate', MagicMock(return_value=True)), \
+                patch('salt.minion.JobWorker.is_alive', MagicMock(return_value=True)), \
+                patch('salt.utils.process.SignalHandlingMultiprocessingProcess.start', MagicMock(return_value=True)), \
+                patch('salt.utils.process.SignalHandlingMultiprocessingProcess.join', MagicMock(return_value=True)), \
+                patch('salt.utils.minion.running', MagicMock(return_value=[])), \
+                patch('salt.minion.multiprocessing.Pipe', _pipe):
+            mock_opts = salt.config.DEFAULT_MINION_OPTS.copy()
+            mock_opts['__role'] = 'minion'
+            mock_opts['minion_jid_queue_hwm'] = 100
+            mock_opts['job_worker_pool_size'] = 1
+
+            io_loop = tornado.ioloop.IOLoop()
+            minion = salt.minion.Minion(mock_opts, jid_queue=[], io_loop=io_loop)
+            try:
+                mock_data = {'fun': 'foo.bar', 'jid': 1}
+                io_loop.run_sync(lambda: minion._handle_decoded_payload(mock_data))
+                self.assertEqual(salt.minion.JobWorker.start.call_count, 1)
+                self.assertEqual(pipes[0].recv(), (mock_data, False))
+
+                # The only worker is busy, the job gets its own process
+                io_loop.run_sync(lambda: minion._handle_decoded_payload({'fun': 'foo.bar', 'jid': 2}))
+                self.assertEqual(salt.utils.process.SignalHandlingMultiprocessingProcess.start.call_count, 1)
+
+                # Once done, the worker gets the next job
+                pipes[0].send(1)
+                mock_data = {'fun': 'foo.bar', 'jid': 3}
+                io_loop.run_sync(lambda: minion._handle_decoded_payload(mock_data))
+                self.assertEqual(pipes[0].recv(), (mock_data, False))
+                self.assertEqual(salt.minion.JobWorker.start.call_count, 1)
+                self.assertEqual(salt.utils.process.SignalHandlingMultiprocessingProcess.start.call_count, 1)
+
+                # Recycled workers are told to exit
+                minion.job_pool.recycle()
+                self.assertIsNone(pipes[0].recv())
+                self.assertEqual(minion.job_pool.workers, [])
+            finally:
+                minion.destroy()
+
+    def test_job_worker_pool_max_jobs(self):
+        '''
+        Tests that a job worker is not handed any job past its last one, even
+        when it reported that job done before exiting.
+        '''
+        pipes = []
+        real_pipe = multiprocessing.Pipe
+
+        def _pipe():
+            parent_conn, child_conn = real_pipe()
+            pipes.append(child_conn)
+            return parent_conn, MagicMock()
+
+        with patch('salt.minion.JobWorker.start', MagicMock(return_value=True)), \
+                patch('salt.minion.JobWorker.is_alive', MagicMock(return_value=True)), \
+                patch('salt.minion.multiprocessing.Pipe', _pipe):
+            pool = salt.minion.JobWorkerPool(MagicMock(), 1, 1)
+            self.assertTrue(pool.dispatch({'jid': '1'}, True))
+            self.assertEqual(pipes[0].recv(), ({'jid': '1'}, True))
+            # The worker is done with its last job and still alive
+            try:
+                pipes[0].send('1')
+            except (IOError, OSError):
+                pass
+            self.assertTrue(pool.dispatch({'jid': '2'}, True))
+            self.assertEqual(salt.minion.JobWorker.start.call_count, 2)
+            self.assertEqual(pipes[1].recv(), ({'jid': '2'}, True))
+            # The retired worker only finds its pipe closed
+            self.assertRaises(EOFError, pipes[0].recv)
+            # Both workers exit after their job
+            self.assertEqual(pool.workers, [])
+            self.assertEqual(len(pool.retired), 2)
+
+    def test_job_worker_proctitle(self):
+        '''
+        Tests that each job run by a job worker starts from the process title
+        of the worker, instead of appending to the one of the previous job.
+        '''
+        minion = MagicMock(job_pool=None, proc_dir=RUNTIME_VARS.TMP)
+        conn = MagicMock()
+        conn.recv.side_effect = [({'jid': '1'}, True), ({'jid': '2'}, True), None]
+        with patch('salt.utils.process.getproctitle', MagicMock(return_value='JobWorker')), \
+                patch('salt.utils.process.resetproctitle', MagicMock()) as reset_mock:
+            salt.minion.JobWorker(minion, conn, 0).run()
+        self.assertEqual(minion._target.call_count, 2)
+        self.assertEqual(reset_mock.call_args_list, [(('JobWorker',),)] * 2)
+
+    def test_return_batch(self):
+        '''
+        Tests that the job returns handed over to the minion process are sent
+        to the master in batches.
+        '''
+        mock_opts = salt.config.DEFAULT_MINION_OPTS.copy()
+        mock_opts['master'] = 'salt'
+        mock_opts['return_batch_window'] = 60
+        mock_opts['return_batch_size'] = 2
+        mock_opts['multiprocessing'] = False
+        with patch('salt.minion.Minion._send_req_async', MagicMock()) as send_mock, \
+                patch('salt.minion.Minion._send_req_sync', MagicMock()) as send_sync_mock, \
+                patch('salt.minion.Minion._queue_return', MagicMock(return_value=True)) as queue_mock:
+            io_loop = tornado.ioloop.IOLoop()
+            minion = salt.minion.Minion(mock_opts, io_loop=io_loop)
+            try:
+                # The jobs hand their returns over to the minion process
+                minion._return_pub({'jid': '1', 'fun': 'test.ping', 'return': True})
+                self.assertEqual(send_sync_mock.call_count, 0)
+                load = queue_mock.call_args[0][0]
+                self.assertEqual(load['cmd'], '_return')
+                self.assertEqual(load['jid'], '1')
+
+                minion._handle_tag_return_batch('__return_batch', {'master': 'salt', 'load': load})
+                self.assertEqual(send_mock.call_count, 0)
+                self.assertIsNotNone(minion._return_batch_timeout)
+                # The returns of the jobs from other masters are left to them
+                minion._handle_tag_return_batch('__return_batch', {'master': 'other', 'load': load})
+                self.assertEqual(minion.return_batch, [load])
+
+                # A full batch is sent right away
+                minion._handle_tag_return_batch('__return_batch', {'master': 'salt', 'load': load})
+                self.assertEqual(send_mock.call_count, 1)
+                batch = send_mock.call_args[0][0]
+                self.assertEqual(batch['cmd'], '_return_batch')
+                self.assertEqual(batch['returns'], [load, load])
+                self.assertEqual(minion.return_batch, [])
+                self.assertIsNone(minion._return_batch_timeout)
+            finally:
+                minion.destroy()
+
     def test_beacons_before_connect(self):
         '''
         Tests that the 'beacons_before_connect' option causes the beacons to be initialized before connect.
@@ -5,9 +5,11 @@
 
 # Import Python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import copy
 import os
 import shutil
 import tempfile
+import threading
 
 # Import Salt Testing libs
 import tests.integration as integration
@@ -22,7 +24,10 @@ from tests.support.runtests import RUNTIME_VARS
 
 # Import Salt libs
 import salt.exceptions
+import salt.fileclient
 import salt.state
+import salt.utils.files
+from salt.ext import six
 from salt.utils.odict import OrderedDict
 from salt.utils.decorators import state as statedecorators
 
@@ -129,6 +134,113 @@ class StateCompilerTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
             run_num = ret['test_|-step_one_|-step_one_|-succeed_with_changes']['__run_num__']
             self.assertEqual(run_num, 0)
 
+    def test_requisite_index(self):
+        '''
+        Test that the requisites referring to globs, names, SLS and
+        requisite_in resolve to the same chunks as before the index
+        '''
+        with patch('salt.state.State._gather_pillar'):
+            high_data = OrderedDict([
+                ('configure', OrderedDict([
+                    ('test', [
+                        OrderedDict([('require', [OrderedDict([('sls', 'pkgs')])])]),
+                        OrderedDict([('watch', [OrderedDict([('test', 'install_*')])])]),
+                        'succeed_with_changes', {'order': 1}]),
+                    ('__sls__', 'conf'),
+                    ('__env__', 'base')])),
+                ('install_a', OrderedDict([
+                    ('test', [{'name': 'alpha'}, 'succeed_with_changes', {'order': 2}]),
+                    ('__sls__', 'pkgs'),
+                    ('__env__', 'base')])),
+                ('install_b', OrderedDict([
+                    ('test', [
+                        OrderedDict([('require_in', [OrderedDict([('test', 'service')])])]),
+                        'succeed_without_changes', {'order': 3}]),
+                    ('__sls__', 'pkgs'),
+                    ('__env__', 'base')])),
+                ('service', OrderedDict([
+                    ('test', [
+                        OrderedDict([('require', ['alpha'])]),
+                        'succeed_without_changes', {'order': 0}]),
+                    ('__sls__', 'svc'),
+                    ('__env__', 'base')])),
+            ])
+            minion_opts = self.get_temp_config('minion')
+            state_obj = salt.state.State(minion_opts)
+            ret = state_obj.call_high(high_data)
+        order = sorted(ret, key=lambda tag: ret[tag]['__run_num__'])
+        self.assertEqual(
+            [salt.state.split_low_tag(tag)['__id__'] for tag in order],
+            ['install_a', 'install_b', 'service', 'configure'])
+        self.assertTrue(all(item['result'] for item in ret.values()))
+        # Watched, but the state made changes itself
+        self.assertNotIn('watch', ret['test_|-configure_|-configure_|-succeed_with_changes']['changes'])
+
+        index = salt.state.ChunkIndex(state_obj.compile_high_data(high_data))
+        self.assertEqual([chunk['__id__'] for chunk in index.find('id', 'install_?')],
+                         ['install_a', 'install_b'])
+        self.assertEqual([chunk['__id__'] for chunk in index.find('test', 'alpha')], ['install_a'])
+        self.assertEqual(index.find('file', 'alpha'), [])
+        self.assertEqual([chunk['__id__'] for chunk in index.find('sls', 'p*')],
+                         ['install_a', 'install_b'])
+        self.assertEqual(index.first('alpha')['__id__'], 'install_a')
+        self.assertIsNone(index.first(['alpha']))
+
+    def test_state_concurrency(self):
+        '''
+        Test that running the states concurrently returns the results and run
+        order of running them one at a time
+        '''
+        high_data = OrderedDict([
+            ('configure', OrderedDict([
+                ('test', [
+                    OrderedDict([('require', ['install'])]),
+                    'succeed_with_changes', {'order': 1}]),
+                ('__sls__', 'conf'),
+                ('__env__', 'base')])),
+            ('install', OrderedDict([
+                ('test', ['succeed_with_changes', {'order': 2}]),
+                ('__sls__', 'pkgs'),
+                ('__env__', 'base')])),
+            ('users', OrderedDict([
+                ('test', ['succeed_without_changes', {'order': 3}]),
+                ('__sls__', 'users'),
+                ('__env__', 'base')])),
+            ('reload', OrderedDict([
+                ('test', [
+                    OrderedDict([('onchanges', ['users'])]),
+                    'succeed_with_changes', {'order': 4}]),
+                ('__sls__', 'users'),
+                ('__env__', 'base')])),
+            ('service', OrderedDict([
+                ('test', [
+                    OrderedDict([('watch', ['configure'])]),
+                    OrderedDict([('require', ['users'])]),
+                    'succeed_without_changes', {'order': 5}]),
+                ('__sls__', 'svc'),
+                ('__env__', 'base')])),
+            ('missing', OrderedDict([
+                ('test', [
+                    OrderedDict([('require', ['nothing'])]),
+                    'succeed_with_changes', {'order': 6}]),
+                ('__sls__', 'svc'),
+                ('__env__', 'base')])),
+        ])
+        rets = []
+        for concurrency in (0, 4):
+            with patch('salt.state.State._gather_pillar'):
+                minion_opts = self.get_temp_config('minion', state_concurrency=concurrency)
+                state_obj = salt.state.State(minion_opts, jid='20190101000000000000')
+                ret = state_obj.call_high(copy.deepcopy(high_data))
+            order = sorted(ret, key=lambda tag: ret[tag]['__run_num__'])
+            rets.append((
+                [salt.state.split_low_tag(tag)['__id__'] for tag in order],
+                dict((tag, (item['result'], item['changes'])) for tag, item in six.iteritems(ret))))
+        self.assertEqual(rets[0], rets[1])
+        self.assertEqual(
+            rets[1][0],
+            ['install', 'configure', 'users', 'reload', 'service', 'missing'])
+
     def test_verify_onlyif_parse(self):
         low_data = {
             "onlyif": [
@@ -293,6 +405,151 @@ class HighStateTestCase(TestCase, AdaptedConfigurationTestCaseMixin):
         ret = salt.state.find_sls_ids('issue-47182.stateA.newer', high)
         self.assertEqual(ret, [('somestuff', 'cmd')])
 
+    def test_compile_cache(self):
+        '''
+        Test that the compiled highstate is used until a rendered SLS file or
+        a template it imports changes
+        '''
+        files = {
+            'top.sls': 'base:\n  match:\n    - cached\n',
+            'cached.sls': "{% from 'map.jinja' import value %}\n"
+                          "check:\n  test.succeed_without_changes:\n    - name: {{ value }}\n",
+            'map.jinja': "{% set value = 'one' %}\n",
+        }
+        for name, contents in six.iteritems(files):
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(contents)
+        self.config['state_compile_cache'] = True
+        # List the files written since the state tree was last listed
+        self.config['fileserver_list_cache_time'] = 0
+
+        def _names():
+            highstate = salt.state.HighState(self.config)
+            highstate.push_active()
+            try:
+                with patch.object(highstate, 'render_highstate',
+                                  wraps=highstate.render_highstate) as render:
+                    ret = highstate.call_highstate()
+            finally:
+                highstate.pop_active()
+            return [item['name'] for item in ret.values()], render.call_count
+
+        self.assertEqual(_names(), (['one'], 1))
+        self.assertEqual(_names(), (['one'], 0))
+        with salt.utils.files.fopen(os.path.join(self.state_tree_dir, 'map.jinja'), 'w') as fp_:
+            fp_.write("{% set value = 'two' %}\n")
+        self.assertEqual(_names(), (['two'], 1))
+        self.assertEqual(_names(), (['two'], 0))
+
+    def test_render_workers(self):
+        '''
+        Test that rendering the SLS files in threads gives the highstate and
+        errors of rendering them one at a time
+        '''
+        files = {
+            'top.sls': 'base:\n  match:\n    - web\n    - db\n    - missing\n',
+            'web/init.sls': 'include:\n  - .config\n  - common\n'
+                            'web:\n  test.succeed_without_changes\n',
+            'web/config.sls': 'include:\n  - common\n'
+                              'web_config:\n  test.succeed_without_changes\n',
+            'db.sls': 'include:\n  - common\n  - web.config\n  - nothing\n'
+                      '{% for num in range(3) %}\n'
+                      'db_{{ num }}:\n  test.succeed_without_changes\n'
+                      '{% endfor %}\n',
+            'common.sls': 'common:\n  test.succeed_without_changes\n',
+        }
+        os.makedirs(os.path.join(self.state_tree_dir, 'web'))
+        for name, contents in six.iteritems(files):
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(contents)
+        self.config['fileserver_list_cache_time'] = 0
+
+        rets = []
+        for workers in (0, 4):
+            self.config['state_render_workers'] = workers
+            highstate = salt.state.HighState(self.config)
+            highstate.push_active()
+            try:
+                matches = highstate.top_matches(highstate.get_top())
+                rets.append(highstate.render_highstate(matches))
+            finally:
+                highstate.pop_active()
+        self.assertEqual(rets[0], rets[1])
+        high, errors = rets[1]
+        self.assertEqual(
+            sorted(high, key=lambda id_: high[id_]['test'][-1]['order']),
+            ['common', 'web_config', 'web', 'db_0', 'db_1', 'db_2'])
+        self.assertEqual(len(errors), 2)
+
+    def test_render_workers_error(self):
+        '''
+        Test that the SLS files failing to render in a thread are rendered
+        again one at a time
+        '''
+        files = {
+            'top.sls': 'base:\n  match:\n    - web\n    - db\n',
+            'web.sls': 'web:\n  test.succeed_without_changes\n',
+            'db.sls': 'db:\n  test.succeed_without_changes\n',
+        }
+        for name, contents in six.iteritems(files):
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(contents)
+        self.config['fileserver_list_cache_time'] = 0
+        self.config['state_render_workers'] = 4
+        compile_template = salt.state.compile_template
+        main_thread = threading.current_thread()
+
+        def _compile_template(template, *args, **kwargs):
+            if threading.current_thread() is not main_thread and template.endswith('web.sls'):
+                raise salt.exceptions.SaltRenderError('IOLoop is already running')
+            return compile_template(template, *args, **kwargs)
+
+        highstate = salt.state.HighState(self.config)
+        highstate.push_active()
+        try:
+            with patch('salt.state.compile_template', _compile_template):
+                matches = highstate.top_matches(highstate.get_top())
+                high, errors = highstate.render_highstate(matches)
+        finally:
+            highstate.pop_active()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(high), ['db', 'web'])
+
+    def test_prefetch_files(self):
+        '''
+        Test that the salt:// files referenced by the chunks are cached, and
+        cached again once changed
+        '''
+        for name in ('one.txt', 'two.txt'):
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, name), 'w') as fp_:
+                fp_.write(name)
+        chunks = [
+            {'state': 'file', 'fun': 'managed', '__id__': 'one',
+             'name': '/tmp/one', 'source': 'salt://one.txt', '__env__': 'base'},
+            {'state': 'file', 'fun': 'managed', '__id__': 'two',
+             'name': '/tmp/two', '__env__': 'base',
+             'source': ['salt://missing.txt', 'salt://two.txt?saltenv=base']},
+        ]
+        highstate = salt.state.HighState(self.config)
+        client = salt.fileclient.get_file_client(self.config)
+        try:
+            highstate.state.prefetch_files(chunks, 4)
+            for name in ('one.txt', 'two.txt'):
+                dest = client.is_cached('salt://' + name, 'base')
+                self.assertTrue(dest)
+                with salt.utils.files.fopen(dest) as fp_:
+                    self.assertEqual(fp_.read(), name)
+            self.assertFalse(client.is_cached('salt://missing.txt', 'base'))
+
+            with salt.utils.files.fopen(os.path.join(self.state_tree_dir, 'one.txt'), 'w') as fp_:
+                fp_.write('changed')
+            highstate.state.prefetch_files(chunks, 4)
+            with salt.utils.files.fopen(client.is_cached('salt://one.txt', 'base')) as fp_:
+                self.assertEqual(fp_.read(), 'changed')
+        finally:
+            client.destroy()
+            highstate.client.destroy()
+
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
 @skipIf(pytest is None, 'PyTest is missing')
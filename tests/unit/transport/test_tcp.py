@@ -18,6 +18,7 @@ import salt.utils.platform
 import salt.utils.process
 import salt.transport.server
 import salt.transport.client
+import salt.transport.tcp
 import salt.exceptions
 from salt.ext.six.moves import range
 from salt.transport.tcp import SaltMessageClientPool
@@ -310,3 +311,133 @@ class SaltMessageClientPoolTest(AsyncTestCase):
 
         with self.assertRaises(tornado.ioloop.TimeoutError):
             test_connect(self)
+
+
+class TCPPubServerChannelTargetTest(TestCase):
+    '''
+    Test the resolution of the targets of the publishes
+    '''
+    def setUp(self):
+        self.opts = salt.config.master_config(None)
+        self.check_minions = MagicMock(return_value={'minions': ['minion1'],
+                                                     'missing': [],
+                                                     'ssh_minions': False})
+        self.pub_sock = MagicMock()
+        self.patches = (
+            patch('salt.utils.minions.CkMinions.check_minions', self.check_minions),
+            patch('salt.utils.asynchronous.SyncWrapper', MagicMock(return_value=self.pub_sock)),
+            patch('salt.transport.mixins.auth.AESPubServerMixin._encrypt_publish',
+                  MagicMock(return_value={'enc': 'aes', 'load': b'load'})),
+        )
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def _publish(self, load, minions=None):
+        channel = salt.transport.tcp.TCPPubServerChannel(self.opts)
+        channel.publish(load, minions=minions)
+        return self.pub_sock.send.call_args[0][0]
+
+    def test_publish_targets(self):
+        '''
+        Test that the publishes are only sent to the matching minions
+        '''
+        package = self._publish({'tgt_type': 'grain', 'tgt': 'os:Linux',
+                                 'delimiter': '|', 'jid': '1'})
+        self.assertEqual(package['topic_lst'], ['minion1'])
+        self.check_minions.assert_called_once_with(
+            'os:Linux', tgt_type='grain', delimiter='|')
+
+        package = self._publish({'tgt_type': 'list', 'tgt': ['minion2'], 'jid': '2'})
+        self.assertEqual(package['topic_lst'], ['minion2'])
+        self.assertEqual(self.check_minions.call_count, 1)
+
+    def test_publish_syndic(self):
+        '''
+        Test that the publishes are sent to all the minions of a syndic master
+        '''
+        self.opts['order_masters'] = True
+        package = self._publish({'tgt_type': 'glob', 'tgt': 'web*', 'jid': '1'})
+        self.assertNotIn('topic_lst', package)
+        self.assertFalse(self.check_minions.called)
+
+    def test_publish_resolved_targets(self):
+        '''
+        Test that the minions already resolved by the master are used
+        '''
+        package = self._publish({'tgt_type': 'compound', 'tgt': 'G@os:Linux', 'jid': '1'},
+                                minions=['minion2'])
+        self.assertEqual(package['topic_lst'], ['minion2'])
+        self.assertFalse(self.check_minions.called)
+
+    def test_publish_unresolved_targets(self):
+        '''
+        Test that the publishes are sent to all the minions when their target
+        doesn't resolve
+        '''
+        self.check_minions.return_value = {'minions': [], 'missing': [], 'ssh_minions': False}
+        package = self._publish({'tgt_type': 'grain', 'tgt': 'os:Linux', 'jid': '1'})
+        self.assertNotIn('topic_lst', package)
+
+        self.check_minions.side_effect = ValueError
+        package = self._publish({'tgt_type': 'glob', 'tgt': 'web*', 'jid': '2'})
+        self.assertNotIn('topic_lst', package)
+
+
+class PubServerQueueTest(AsyncTestCase):
+    '''
+    Test the bounded queues of the publisher clients
+    '''
+    def _server(self, **kwargs):
+        opts = salt.config.master_config(None)
+        opts.update(tcp_pub_client_hwm=3, tcp_pub_client_hwm_bytes=0, **kwargs)
+        with patch('salt.master.AESFuncs', MagicMock()):
+            server = salt.transport.tcp.PubServer(opts, io_loop=self.io_loop)
+        self.addCleanup(server.close)
+        return server
+
+    def _client(self, server):
+        stream = MagicMock()
+        # The minion doesn't read its publishes
+        stream.write.return_value = tornado.concurrent.Future()
+        stream.closed.return_value = False
+        client = salt.transport.tcp.Subscriber(stream, ('127.0.0.1', 1234))
+        server.clients.add(client)
+        return client
+
+    @gen_test
+    def test_drop_oldest(self):
+        server = self._server()
+        client = self._client(server)
+        for num in range(6):
+            yield server.publish_payload({'payload': six.b(str(num))}, None)
+            # Let the client start writing
+            yield tornado.gen.moment
+        # The first publish is being written
+        self.assertEqual(client.stream.write.call_args[0][0], b'0')
+        self.assertEqual(list(client.queue), [b'3', b'4', b'5'])
+        self.assertEqual(client.queued_bytes, 3)
+        self.assertEqual(server.stats['dropped'], 2)
+
+    @gen_test
+    def test_coalesce(self):
+        server = self._server(tcp_pub_client_hwm_policy='coalesce')
+        client = self._client(server)
+        for num in range(5):
+            yield server.publish_payload({'payload': six.b(str(num))}, None)
+            yield tornado.gen.moment
+        self.assertEqual(list(client.queue), [b'4'])
+        self.assertEqual(server.stats['dropped'], 3)
+
+    @gen_test
+    def test_disconnect(self):
+        server = self._server(tcp_pub_client_hwm_policy='disconnect')
+        client = self._client(server)
+        for num in range(5):
+            yield server.publish_payload({'payload': six.b(str(num))}, None)
+        self.assertNotIn(client, server.clients)
+        self.assertTrue(client.stream.close.called)
+        self.assertEqual(server.stats['disconnected'], 1)
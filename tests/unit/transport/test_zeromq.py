@@ -20,21 +20,28 @@ except ImportError:
 
 # Import 3rd-party libs
 import zmq.eventloop.ioloop
+import zmq.eventloop.zmqstream
 # support pyzmq 13.0.x, TODO: remove once we force people to 14.0.x
 if not hasattr(zmq.eventloop.ioloop, 'ZMQIOLoop'):
     zmq.eventloop.ioloop.ZMQIOLoop = zmq.eventloop.ioloop.IOLoop
 from tornado.testing import AsyncTestCase
 import tornado.gen
+import tornado.ioloop
 
 # Import Salt libs
 import salt.config
 import salt.log.setup
 from salt.ext import six
 import salt.utils.process
+import salt.utils.files
 import salt.utils.platform
 import salt.transport.server
 import salt.transport.client
 import salt.exceptions
+import salt.crypt
+import salt.master
+import salt.transport.mixins.auth
+import salt.transport.zeromq
 from salt.ext.six.moves import range
 from salt.transport.zeromq import AsyncReqMessageClientPool
 
@@ -76,6 +83,7 @@ class BaseZMQReqCase(TestCase, AdaptedConfigurationTestCaseMixin):
                'tcp_master_publish_pull': tcp_master_publish_pull,
                'tcp_master_workers': tcp_master_workers}
         )
+        cls.master_config.update(getattr(cls, 'master_config_overrides', {}))
 
         cls.minion_config = cls.get_temp_config(
             'minion',
@@ -156,6 +164,102 @@ class ClearReqTestCases(BaseZMQReqCase, ReqChannelMixin):
         self.assertIn('localhost', channel.master_uri)
         del channel
 
+    def test_multiplex(self):
+        '''
+        Test that the requests in flight together on a DEALER socket each get
+        their own reply
+        '''
+        io_loop = zmq.eventloop.ioloop.ZMQIOLoop()
+        client = salt.transport.zeromq.AsyncDealerMessageClient(
+            self.minion_config, self.minion_config['master_uri'], io_loop=io_loop)
+
+        @tornado.gen.coroutine
+        def _send():
+            futures = [client.send({'enc': 'clear', 'load': {'num': num}}, timeout=30)
+                       for num in range(10)]
+            self.assertEqual(len(client.send_queue), 10)
+            ret = yield futures
+            raise tornado.gen.Return(ret)
+
+        try:
+            ret = io_loop.run_sync(_send)
+        finally:
+            client.close()
+            io_loop.close()
+        self.assertEqual([reply['load'] for reply in ret],
+                         [{'num': num} for num in range(10)])
+        self.assertEqual(client.send_queue, [])
+
+
+class ReqLanesTestCases(BaseZMQReqCase):
+    '''
+    Test the routing of the requests to the worker lanes
+    '''
+    master_config_overrides = {'worker_lanes': {'auth': 1, 'file': 0}}
+
+    @classmethod
+    def setUpClass(cls):
+        super(ReqLanesTestCases, cls).setUpClass()
+        cls.lane_channel = salt.transport.server.ReqServerChannel.factory(cls.master_config)
+        cls.lane_channel.post_fork(cls._handle_lane_payload, io_loop=cls.io_loop, lane='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.lane_channel.close()
+        del cls.lane_channel
+        super(ReqLanesTestCases, cls).tearDownClass()
+
+    @classmethod
+    @tornado.gen.coroutine
+    def _handle_payload(cls, payload):
+        raise tornado.gen.Return(({'lane': None, 'load': payload['load']}, {'fun': 'send_clear'}))
+
+    @classmethod
+    @tornado.gen.coroutine
+    def _handle_lane_payload(cls, payload):
+        raise tornado.gen.Return(({'lane': 'auth', 'load': payload['load']}, {'fun': 'send_clear'}))
+
+    def test_lanes(self):
+        '''
+        Test that the requests are handled by the workers of their lane, and
+        the requests of the lanes without workers by the default workers
+        '''
+        io_loop = zmq.eventloop.ioloop.ZMQIOLoop()
+        client = salt.transport.zeromq.AsyncDealerMessageClient(
+            self.minion_config, self.minion_config['master_uri'], io_loop=io_loop)
+
+        @tornado.gen.coroutine
+        def _send():
+            ret = yield [client.send({'enc': 'clear', 'load': {'num': num}}, timeout=30, lane=lane)
+                         for num, lane in enumerate([None, 'auth', 'file'])]
+            raise tornado.gen.Return(ret)
+
+        try:
+            ret = io_loop.run_sync(_send)
+        finally:
+            client.close()
+            io_loop.close()
+        self.assertEqual(ret, [{'lane': None, 'load': {'num': 0}},
+                               {'lane': 'auth', 'load': {'num': 1}},
+                               {'lane': None, 'load': {'num': 2}}])
+
+    def test_req_lane(self):
+        '''
+        Test the lanes of the commands
+        '''
+        self.assertEqual(salt.transport.zeromq._req_lane({'cmd': '_auth'}), 'auth')
+        self.assertEqual(salt.transport.zeromq._req_lane({'cmd': '_serve_file'}), 'file')
+        self.assertIsNone(salt.transport.zeromq._req_lane({'cmd': '_mine'}))
+        self.assertIsNone(salt.transport.zeromq._req_lane('load'))
+
+    def test_worker_lanes(self):
+        '''
+        Test that the unknown lanes and the lanes without workers are ignored
+        '''
+        opts = {'worker_lanes': {'auth': 2, 'file': 0, 'return': -1, 'pilar': 4}}
+        self.assertEqual(salt.transport.zeromq.worker_lanes(opts), {'auth': 2})
+        self.assertEqual(salt.transport.zeromq.worker_lanes({'worker_lanes': None}), {})
+
 
 @flaky
 @skipIf(ON_SUSE, 'Skipping until https://github.com/saltstack/salt/issues/32902 gets fixed')
@@ -685,3 +789,203 @@ class PubServerChannel(TestCase, AdaptedConfigurationTestCaseMixin):
         gather.join()
         server_channel.pub_close()
         assert len(results) == send_num, (len(results), set(expect).difference(results))
+
+
+class PubServerChannelKeysTest(TestCase):
+    '''
+    Test the reuse of the publish crypto between publishes
+    '''
+    def setUp(self):
+        self.secrets = salt.master.SMaster.secrets.get('aes')
+        salt.master.SMaster.secrets['aes'] = {
+            'secret': multiprocessing.Array(
+                ctypes.c_char,
+                six.b(salt.crypt.Crypticle.generate_key_string()),
+            ),
+        }
+        self.opts = salt.config.master_config(None)
+        self.opts['sign_pub_messages'] = True
+        with patch('salt.utils.minions.CkMinions', MagicMock()):
+            self.channel = salt.transport.zeromq.ZeroMQPubServerChannel(self.opts)
+        salt.transport.mixins.auth._PUBLISH_KEYS.clear()
+
+    def tearDown(self):
+        salt.transport.mixins.auth._PUBLISH_KEYS.clear()
+        if self.secrets is None:
+            salt.master.SMaster.secrets.pop('aes', None)
+        else:
+            salt.master.SMaster.secrets['aes'] = self.secrets
+
+    def test_publish_keys(self):
+        '''
+        Test that the crypticle and the signing key are only set up again when
+        the AES key rotates
+        '''
+        sign_key = object()
+        crypticle = salt.crypt.Crypticle
+        with patch('salt.crypt.get_rsa_key', MagicMock(return_value=sign_key)) as get_key_mock, \
+                patch('salt.crypt.sign_message', MagicMock(return_value=b'sig')) as sign_mock, \
+                patch('salt.crypt.Crypticle', MagicMock(side_effect=crypticle)) as crypticle_mock:
+            for _ in range(3):
+                payload = self.channel._encrypt_publish({'jid': '1'})
+                self.assertEqual(payload['sig'], b'sig')
+            self.assertEqual(crypticle_mock.call_count, 1)
+            self.assertEqual(get_key_mock.call_count, 1)
+            self.assertEqual(sign_mock.call_args[0][0], sign_key)
+
+            key = crypticle.generate_key_string()
+            salt.master.SMaster.secrets['aes']['secret'].value = six.b(key)
+            payload = self.channel._encrypt_publish({'jid': '2'})
+            self.assertEqual(crypticle_mock.call_count, 2)
+            self.assertEqual(get_key_mock.call_count, 2)
+        self.assertEqual(crypticle({}, key).loads(payload['load']), {'jid': '2'})
+
+    def test_send_pub_keys(self):
+        '''
+        Test that the publishes of the master, which set up a publish channel
+        each, share the crypticle and the signing key
+        '''
+        clear_funcs = salt.master.ClearFuncs(self.opts, {})
+        pub_sock = MagicMock()
+        with patch('salt.crypt.get_rsa_key', MagicMock(return_value=object())) as get_key_mock, \
+                patch('salt.crypt.sign_message', MagicMock(return_value=b'sig')), \
+                patch('salt.crypt.Crypticle', MagicMock(side_effect=salt.crypt.Crypticle)) as crypticle_mock, \
+                patch('salt.utils.minions.CkMinions', MagicMock()), \
+                patch.object(salt.transport.zeromq.ZeroMQPubServerChannel, 'pub_sock', pub_sock):
+            for jid in ('1', '2'):
+                clear_funcs._send_pub({'tgt_type': 'glob', 'tgt': '*', 'jid': jid})
+            self.assertEqual(crypticle_mock.call_count, 1)
+            self.assertEqual(get_key_mock.call_count, 1)
+        self.assertEqual(pub_sock.send_multipart.call_count, 2)
+
+
+class ReqServerSessionKeyTest(TestCase):
+    '''
+    Test the encryption of the private replies with the session keys
+    '''
+    def setUp(self):
+        opts = salt.config.master_config(None)
+        self.channel = salt.transport.zeromq.ZeroMQReqServerChannel(opts)
+        self.channel.crypticle = salt.crypt.Crypticle(
+            opts, salt.crypt.Crypticle.generate_key_string())
+        self.channel._session_secret = b'secret'
+        self.channel._session_aes = None
+        self.channel._session_crypticles = {}
+
+    def test_encrypt_private_session(self):
+        '''
+        Test that the replies are encrypted with the session key derived for
+        the minion and the current AES key
+        '''
+        aes = self.channel.crypticle.key_string
+        session = self.channel._session_key('minion', aes)
+        self.assertNotEqual(session, self.channel._session_key('other', aes))
+        with patch('salt.crypt.get_rsa_pub_key', MagicMock()) as pub_mock:
+            ret = self.channel._encrypt_private({'a': 1}, 'pillar', 'minion', session=True)
+            self.assertFalse(pub_mock.called)
+        self.assertTrue(ret['session'])
+        self.assertNotIn('key', ret)
+        crypticle = salt.crypt.Crypticle({}, session)
+        self.assertEqual(crypticle.loads(ret['pillar']), {'a': 1})
+
+        # The session keys rotate with the AES key
+        self.channel.crypticle = salt.crypt.Crypticle(
+            {}, salt.crypt.Crypticle.generate_key_string())
+        ret = self.channel._encrypt_private({'a': 1}, 'pillar', 'minion', session=True)
+        self.assertNotEqual(
+            self.channel._session_key('minion', self.channel.crypticle.key_string),
+            session)
+        self.assertRaises(salt.crypt.AuthenticationError, crypticle.loads, ret['pillar'])
+
+
+class ReqServerAuthTest(TestCase):
+    '''
+    Test the admission of the authentication requests and the cache of the
+    minion keys
+    '''
+    def setUp(self):
+        opts = salt.config.master_config(None)
+        opts['auth_rate_limit'] = 2
+        self.channel = salt.transport.zeromq.ZeroMQReqServerChannel(opts)
+        self.channel._auth_admission = multiprocessing.Array(ctypes.c_double, 2)
+        self.channel._auth_keys = {}
+
+    def test_admit_auth(self):
+        '''
+        Test that the requests over the limit are told to retry one after the
+        other
+        '''
+        with patch('time.time', MagicMock(return_value=1000.0)):
+            self.assertEqual([self.channel._admit_auth() for _ in range(3)], [0, 0, 0])
+            self.assertEqual(self.channel._admit_auth(), 1.0)
+            self.assertEqual(self.channel._admit_auth(), 1.5)
+        with patch('time.time', MagicMock(return_value=1001.0)):
+            self.assertEqual([self.channel._admit_auth() for _ in range(2)], [0, 0])
+            self.assertEqual(self.channel._admit_auth(), 1.0)
+        # The waiting minions are forgotten once the requests caught up
+        with patch('time.time', MagicMock(return_value=1100.0)):
+            self.assertEqual(self.channel._admit_auth(), 0)
+            self.assertEqual(self.channel._auth_admission[1], 0)
+
+    def test_check_pub(self):
+        '''
+        Test that the keys are only read and loaded again when their file
+        changes
+        '''
+        pubfn = os.path.join(RUNTIME_VARS.TMP, 'minion_key')
+        with salt.utils.files.fopen(pubfn, 'w') as fp_:
+            fp_.write('key1\n')
+        self.addCleanup(os.remove, pubfn)
+        self.assertTrue(self.channel._check_pub('minion', pubfn, 'key1'))
+        with patch('salt.utils.files.fopen', MagicMock(side_effect=IOError)):
+            self.assertTrue(self.channel._check_pub('minion', pubfn, 'key1'))
+        self.assertFalse(self.channel._check_pub('other', pubfn, 'key2'))
+        with patch('salt.crypt.get_rsa_pub_key', MagicMock()) as get_mock:
+            self.channel._get_pub('minion', pubfn)
+            self.channel._get_pub('minion', pubfn)
+            self.assertEqual(get_mock.call_count, 1)
+
+        with salt.utils.files.fopen(pubfn, 'w') as fp_:
+            fp_.write('key2 changed\n')
+        self.assertFalse(self.channel._check_pub('minion', pubfn, 'key1'))
+        self.assertNotIn('minion', self.channel._auth_keys)
+
+
+class ReqServerIdleTest(TestCase):
+    '''
+    Test the check of the requests and replies left on a worker socket
+    '''
+    def setUp(self):
+        self.context = zmq.Context()
+        self.dealer = self.context.socket(zmq.DEALER)
+        self.dealer.bind('inproc://req_server_idle')
+        self.io_loop = tornado.ioloop.IOLoop()
+        self.channel = salt.transport.zeromq.ZeroMQReqServerChannel(
+            salt.config.master_config(None))
+        self.channel._socket = self.context.socket(zmq.REP)
+        self.channel._socket.connect('inproc://req_server_idle')
+        self.channel.stream = zmq.eventloop.zmqstream.ZMQStream(
+            self.channel._socket, io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.channel.stream.close()
+        self.dealer.close()
+        self.io_loop.close()
+        self.context.term()
+
+    def test_idle(self):
+        '''
+        Test that the worker socket is only idle once the requests are
+        handled and their replies sent
+        '''
+        self.assertTrue(self.channel.idle())
+        self.dealer.send_multipart([b'', b'request'])
+        self.assertTrue(self.channel._socket.poll(5000))
+        self.assertFalse(self.channel.idle())
+        self.channel._socket.recv()
+        self.assertFalse(self.channel.idle())
+        self.channel.stream.send(b'reply')
+        self.assertFalse(self.channel.idle())
+        self.channel.stream.flush(zmq.POLLOUT)
+        self.assertTrue(self.channel.idle())
+        self.assertEqual(self.dealer.recv_multipart(), [b'', b'reply'])
@@ -2,9 +2,14 @@
 
 # Import python libs
 from __future__ import absolute_import, unicode_literals
+import os
+import shutil
 import sys
+import tempfile
 
 # Import Salt Libs
+import salt.utils.data
+import salt.utils.files
 import salt.utils.minions
 
 # Import Salt Testing Libs
@@ -42,6 +47,39 @@ class MinionsTestCase(TestCase):
             ret = salt.utils.minions.nodegroup_comp(nodegroup, NODEGROUPS)
             self.assertEqual(ret, expected)
 
+    def test_compile_compound(self):
+        '''
+        Test the parsing of compound targets
+        '''
+        web = ('match', None, 'web*', None)
+        grain = ('match', 'G', 'os:Debian', None)
+        lst = ('match', 'L', 'a,b', None)
+        self.assertEqual(salt.utils.minions.compile_compound('web*'), web)
+        # and binds tighter than or, not binds tighter than and
+        self.assertEqual(
+            salt.utils.minions.compile_compound('G@os:Debian and L@a,b or web*'),
+            ('or', ('and', grain, lst), web))
+        self.assertEqual(
+            salt.utils.minions.compile_compound('web* or G@os:Debian and L@a,b'),
+            ('or', web, ('and', grain, lst)))
+        self.assertEqual(
+            salt.utils.minions.compile_compound('not web* and G@os:Debian'),
+            ('and', ('not', web), grain))
+        # not after an operand is an implicit and
+        self.assertEqual(
+            salt.utils.minions.compile_compound(['web*', 'not', '(', 'L@a,b', 'or', 'G@os:Debian', ')']),
+            ('and', web, ('not', ('or', lst, grain))))
+        # unbalanced opening parentheses are closed at the end
+        self.assertEqual(
+            salt.utils.minions.compile_compound('( web* and ( L@a,b'),
+            ('and', web, lst))
+        # nodegroups are expanded in place
+        self.assertEqual(
+            salt.utils.minions.compile_compound('N@group1 and web*', NODEGROUPS),
+            ('and', ('match', 'L', 'host1,host2,host3', None), web))
+        for invalid in ('', 'and web*', 'web* or', 'web* )', '( and web*', 'web* L@a,b', '( )'):
+            self.assertIsNone(salt.utils.minions.compile_compound(invalid), invalid)
+
 
 class CkMinionsTestCase(TestCase):
     '''
@@ -271,6 +309,35 @@ class CkMinionsTestCase(TestCase):
         ret = self.ckminions.spec_check(auth_list, 'jobs.active', {}, 'runner')
         self.assertFalse(ret)
 
+    @patch('salt.utils.minions.CkMinions._pki_minions', MagicMock(return_value=['web1', 'web2', 'db1', 'db2']))
+    @patch('salt.utils.minions.CkMinions._check_grain_minions',
+           MagicMock(return_value={'minions': ['web1', 'db1'], 'missing': []}))
+    def test_check_compound_minions(self):
+        for expr, expected in (('web*', ['web1', 'web2']),
+                               ('G@os:Debian and web*', ['web1']),
+                               ('G@os:Debian and L@web2,db2 or E@db\\d', ['db1', 'db2']),
+                               ('not G@os:Debian', ['web2', 'db2']),
+                               ('web* not G@os:Debian', ['web2']),
+                               ('not ( web* or L@db1 )', ['db2']),
+                               ('web* and', [])):
+            ret = self.ckminions._check_compound_minions(expr, ':', True)
+            self.assertEqual(sorted(ret['minions']), sorted(expected), expr)
+        ret = self.ckminions._check_compound_minions('L@web1,web3 or db1', ':', True)
+        self.assertEqual(ret['missing'], ['web3'])
+        ret = self.ckminions._check_compound_minions('db1 or not L@web1,web3', ':', True)
+        self.assertEqual(ret['missing'], [])
+
+    def test_compound_snapshot(self):
+        with patch('salt.utils.minions.CkMinions._read_pki_minions',
+                   MagicMock(return_value=['web1', 'web2', 'db1'])) as read_pki:
+            ret = self.ckminions._check_compound_minions('web* or not L@web1,db1 or E@db.*',
+                                                         ':', True)
+            self.assertEqual(sorted(ret['minions']), ['db1', 'web1', 'web2'])
+            self.assertEqual(read_pki.call_count, 1)
+            self.assertIsNone(self.ckminions._snapshot)
+            # The compiled target is reused
+            self.assertIn('web* or not L@web1,db1 or E@db.*', self.ckminions._compound_cache)
+
     @patch('salt.utils.minions.CkMinions._pki_minions', MagicMock(return_value=['alpha', 'beta', 'gamma']))
     def test_auth_check(self):
         # Test function-only rule
@@ -369,6 +436,118 @@ class CkMinionsTestCase(TestCase):
         self.assertTrue(ret)
 
 
+MINION_DATA = {
+    'web1': {'grains': {'os': 'Ubuntu',
+                        'osrelease': '18.04',
+                        'roles': ['web', 'db'],
+                        'ip_interfaces': {'eth0': ['10.0.0.1']},
+                        'num_cpus': 4},
+             'pillar': {'app': {'version': '1.2', 'tier': 'front'},
+                        'users': [{'name': 'alice'}]}},
+    'web2': {'grains': {'os': 'Ubuntu',
+                        'osrelease': '16.04',
+                        'roles': ['web'],
+                        'ip_interfaces': {'eth0': ['10.0.0.2']},
+                        'num_cpus': 2},
+             'pillar': {'app': {'version': '1.3', 'tier': 'front'}}},
+    'db1': {'grains': {'os': 'CentOS',
+                       'osrelease': '7',
+                       'roles': ['db'],
+                       'ip_interfaces': {'eth0': ['10.0.1.1'], 'eth1': []},
+                       'num_cpus': 4},
+            'pillar': {'app': 'none',
+                       'users': [{'name': 'bob'}]}},
+}
+
+
+class MinionDataIndexTestCase(TestCase):
+    '''
+    TestCase for salt.utils.minions.MinionDataIndex
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.index = salt.utils.minions.MinionDataIndex({'cachedir': self.cachedir})
+        self.index.build(MINION_DATA)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+        salt.utils.minions._INDEX_FILE_CACHE.clear()
+
+    def _expected(self, search_type, expr, exact_match=False):
+        return set(
+            id_ for id_, data in MINION_DATA.items()
+            if salt.utils.data.subdict_match(data.get(search_type),
+                                             expr,
+                                             exact_match=exact_match)
+        )
+
+    def _matched(self, search_type, expr, exact_match=False):
+        matched, verify = self.index.match(search_type, expr, exact_match=exact_match)
+        for id_ in verify:
+            if salt.utils.data.subdict_match(MINION_DATA[id_].get(search_type),
+                                             expr,
+                                             exact_match=exact_match):
+                matched.add(id_)
+        return matched
+
+    def test_build(self):
+        self.assertTrue(self.index.is_complete())
+        self.assertEqual(sorted(self.index.indexed_minions()), ['db1', 'web1', 'web2'])
+
+    def test_match_grains(self):
+        for expr in ('os:Ubuntu', 'os:ubuntu', 'os:Ub*', 'os:*', 'os:Debian',
+                     'osrelease:1?.04', 'roles:db', 'roles:w*', 'num_cpus:4',
+                     'ip_interfaces:eth0:10.0.0.1', 'ip_interfaces:eth0:10.0.*',
+                     'ip_interfaces:eth1', 'ip_interfaces:*', 'missing:foo', 'os'):
+            self.assertEqual(self._matched('grains', expr),
+                             self._expected('grains', expr),
+                             expr)
+
+    def test_match_pillar(self):
+        for expr in ('app:version:1.2', 'app:tier:front', 'app:none', 'app:tier',
+                     'app:*', 'users:name:alice', 'users:0:name:bob'):
+            for exact_match in (False, True):
+                self.assertEqual(self._matched('pillar', expr, exact_match),
+                                 self._expected('pillar', expr, exact_match),
+                                 expr)
+
+    def test_match_unresolvable(self):
+        self.assertIsNone(self.index.match('grains', '*:Ubuntu'))
+        self.assertIsNone(self.index.match('grains', 'os,Ubuntu', delimiter=','))
+
+    def test_update_and_remove(self):
+        self.index.update('db1', {'grains': {'os': 'Ubuntu'}})
+        self.assertEqual(self._matched('grains', 'os:Ubuntu'), set(['web1', 'web2', 'db1']))
+        self.assertEqual(self._matched('grains', 'roles:db'), set(['web1']))
+        self.index.remove('web1', 'web2')
+        self.assertEqual(self._matched('grains', 'os:Ubuntu'), set(['db1']))
+        self.assertEqual(self.index.indexed_minions(), ['db1'])
+
+    def test_check_cache_minions(self):
+        pki_dir = os.path.join(self.cachedir, 'pki')
+        os.makedirs(os.path.join(pki_dir, 'minions'))
+        for id_ in ('web1', 'web2', 'db1', 'new'):
+            with salt.utils.files.fopen(os.path.join(pki_dir, 'minions', id_), 'w'):
+                pass
+        opts = {'cachedir': self.cachedir,
+                'pki_dir': pki_dir,
+                'minion_data_cache': True,
+                'minion_data_index': True}
+        fetch = MagicMock(side_effect=lambda bank, key: MINION_DATA.get(bank.split('/')[1]))
+        with patch('salt.cache.factory', MagicMock()) as factory:
+            factory.return_value.list.return_value = ['web1', 'web2', 'db1']
+            factory.return_value.fetch = fetch
+            ckminions = salt.utils.minions.CkMinions(opts)
+            ret = ckminions._check_grain_minions('os:Ubuntu', ':', False)
+            self.assertEqual(sorted(ret['minions']), ['web1', 'web2'])
+            ret = ckminions._check_grain_minions('os:Ubuntu', ':', True)
+            self.assertEqual(sorted(ret['minions']), ['new', 'web1', 'web2'])
+            # Plain values are resolved without touching the cached data
+            fetch.assert_not_called()
+            ret = ckminions._check_pillar_minions('users:name:bob', ':', False)
+            self.assertEqual(ret['minions'], ['db1'])
+
+
 @skipIf(sys.version_info < (2, 7), 'Python 2.7 needed for dictionary equality assertions')
 class TargetParseTestCase(TestCase):
 
@@ -447,6 +626,54 @@ class TargetParseTestCase(TestCase):
         self.assertEqual(ret['pattern'], 'a:b c')
 
 
+class KeyCacheTestCase(TestCase):
+    '''
+    TestCase for the key lists shared by the master processes
+    '''
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pki_dir)
+        for name in ('minions', 'minions_pre', 'minions_rejected'):
+            os.makedirs(os.path.join(self.pki_dir, name))
+        self.opts = {'pki_dir': self.pki_dir, 'transport': 'zeromq',
+                     'key_cache': 'shared', 'minion_data_cache': False,
+                     'cache': 'localfs', 'cachedir': self.pki_dir}
+
+    def _add_key(self, name, id_):
+        with salt.utils.files.fopen(os.path.join(self.pki_dir, name, id_), 'w') as fp_:
+            fp_.write('key')
+
+    def test_key_cache(self):
+        '''
+        Test that the processes read the key lists again only when their
+        generation changed, and never list the key directories
+        '''
+        self._add_key('minions', 'web1')
+        self._add_key('minions_pre', 'db1')
+        owner = salt.utils.minions.KeyCache(self.opts)
+        ckminions = salt.utils.minions.CkMinions(self.opts)
+
+        # Nothing is published yet, the PKI dir is listed
+        self.assertIsNone(ckminions.key_cache.keys('minions'))
+        self.assertEqual(ckminions._pki_minions(), ['web1'])
+
+        self.assertTrue(owner.refresh())
+        with patch('os.listdir', MagicMock(side_effect=OSError)):
+            self.assertEqual(ckminions._pki_minions(), ['web1'])
+            self.assertEqual(ckminions.key_cache.keys('minions_pre'), ['db1'])
+            self.assertEqual(ckminions._check_list_minions('web1,web2', False),
+                             {'minions': ['web1'], 'missing': ['web2']})
+
+        self._add_key('minions', 'web2')
+        # The directory changed during the last second
+        self.assertTrue(owner.refresh())
+        with patch('os.listdir', MagicMock(side_effect=OSError)):
+            self.assertEqual(ckminions._pki_minions(), ['web1', 'web2'])
+        with patch.object(salt.utils.minions.KeyCache, 'RACY_DELAY', 0):
+            self.assertTrue(owner.refresh())
+            self.assertFalse(owner.refresh())
+
+
 class NodegroupCompTest(TestCase):
     '''
     Test nodegroup comparisons found in